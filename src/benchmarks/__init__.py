@@ -0,0 +1,3 @@
+"""
+Benchmarks on synthetic essay corpora, run from src/ with python -m benchmarks.
+"""
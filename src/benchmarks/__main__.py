@@ -0,0 +1,137 @@
+from argparse import ArgumentParser
+from benchmarks.scaling import DEFAULT_SIZES
+from datetime import datetime, timezone
+from os import cpu_count, makedirs, path
+import json
+import platform
+import sys
+
+
+def environment() -> dict:
+    import numpy
+    import scipy
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "numpy": numpy.__version__,
+        "scipy": scipy.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": cpu_count()
+    }
+
+
+def compare(baseline_path: str, candidate_path: str):
+    """
+    Print the throughput of every benchmark in candidate relative to baseline.
+    """
+    with open(baseline_path, encoding="utf-8") as baseline_file, open(candidate_path, encoding="utf-8") as candidate_file:
+        baseline, candidate = json.load(baseline_file), json.load(candidate_file)
+    print(f"{'benchmark':<40} {'baseline/s':>14} {'candidate/s':>14} {'speedup':>8}")
+    rows = []
+    old_micro = {result["name"]: result for result in baseline.get("micro", [])}
+    for result in candidate.get("micro", []):
+        if result["name"] in old_micro:
+            rows.append((result["name"], old_micro[result["name"]]["items_per_second"], result["items_per_second"]))
+    old_scaling = {(result["essays"], result["workers"]): result for result in baseline.get("scaling", [])}
+    for result in candidate.get("scaling", []):
+        key = (result["essays"], result["workers"])
+        if key in old_scaling:
+            rows.append((f"ingest/{key[0]} essays/{key[1]} workers", old_scaling[key]["essays_per_second"],
+                         result["essays_per_second"]))
+    for name, old, new in rows:
+        print(f"{name:<40} {old:>14.1f} {new:>14.1f} {new / old:>7.2f}x")
+
+
+def main(argv: list[str] | None = None):
+    parser = ArgumentParser(prog="python -m benchmarks", description="Benchmarks on synthetic essay corpora")
+    parser.add_argument("--work-dir", default="data/benchmarks",
+                        help="directory for the synthetic corpora and pipeline output (default: data/benchmarks)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic corpora (default: 0)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate", help="write a synthetic essay CSV and word frequency list")
+    generate.add_argument("--essays", type=int, default=10000, help="number of essays (default: 10000)")
+    generate.add_argument("--ai-fraction", type=float, default=0.5, help="fraction of AI essays (default: 0.5)")
+    generate.add_argument("--mean-words", type=float, default=None,
+                          help="mean essay length of both authors, instead of their separate defaults")
+    generate.add_argument("--punctuation-rate", type=float, default=None,
+                          help="fraction of words followed by punctuation for both authors")
+    generate.add_argument("--output-dir", default=None,
+                          help="directory to write essay_data.csv and word_frequency.txt to (default: the work dir)")
+
+    run = subparsers.add_parser("run", help="run the benchmarks and write a JSON result file")
+    run.add_argument("--skip-micro", action="store_true", help="only run the scaling benchmarks")
+    run.add_argument("--skip-scaling", action="store_true", help="only run the microbenchmarks")
+    run.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                     help=f"comma-separated corpus sizes of the scaling runs (default: {','.join(map(str, DEFAULT_SIZES))})")
+    run.add_argument("--workers", type=int, default=1, help="ingest workers of the scaling runs (default: 1)")
+    run.add_argument("--output-format", default="npz",
+                     help="per-essay dump format of the scaling runs (default: npz)")
+    run.add_argument("--output", default=None,
+                     help="result file (default: benchmark_<timestamp>.json in the work dir)")
+
+    load_test = subparsers.add_parser("load-test", help="measure the latency of the scoring service")
+    load_test.add_argument("--requests", type=int, default=2000, help="micro-batches to send (default: 2000)")
+    load_test.add_argument("--batch-size", type=int, default=8, help="essays per micro-batch (default: 8)")
+    load_test.add_argument("--http", action="store_true", help="use the HTTP endpoint instead of stdin/stdout")
+    load_test.add_argument("--port", type=int, default=8765, help="port of the HTTP endpoint (default: 8765)")
+    load_test.add_argument("--distinct-tokens", action="store_true",
+                           help="add never seen words to every essay and check that the service memory stays flat")
+    load_test.add_argument("--output", default=None,
+                           help="result file (default: load_test_<timestamp>.json in the work dir)")
+
+    comparison = subparsers.add_parser("compare", help="compare two result files")
+    comparison.add_argument("baseline")
+    comparison.add_argument("candidate")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        from benchmarks.synthetic import SyntheticCorpus
+        corpus = SyntheticCorpus(essays=args.essays, ai_fraction=args.ai_fraction, seed=args.seed)
+        for style in (corpus.human, corpus.ai):
+            if args.mean_words is not None:
+                style.mean_words = args.mean_words
+            if args.punctuation_rate is not None:
+                style.punctuation_rate = args.punctuation_rate
+        csv_path, list_path, dictionary_path = corpus.write(args.output_dir or args.work_dir)
+        print(f"Wrote {csv_path}, {list_path} and {dictionary_path}")
+
+    elif args.command == "run":
+        makedirs(args.work_dir, exist_ok=True)
+        results = {"environment": environment(), "seed": args.seed}
+        if not args.skip_micro:
+            from benchmarks.micro import run_micro
+            results["micro"] = run_micro(path.join(args.work_dir, "micro"), seed=args.seed)
+            for result in results["micro"]:
+                print(f"{result['name']:<40} {result['items_per_second']:>14.1f} items/sec")
+        if not args.skip_scaling:
+            from benchmarks.scaling import run_scaling
+            sizes = [int(size) for size in args.sizes.split(",")]
+            results["scaling"] = run_scaling(args.work_dir, sizes, args.workers, args.output_format, args.seed)
+        output = args.output or path.join(args.work_dir, f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+        with open(output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"Results written to {output}")
+
+    elif args.command == "load-test":
+        from benchmarks.load_test import run_load_test
+        result = run_load_test(path.join(args.work_dir, "service"), args.requests, args.batch_size, args.http,
+                               args.port, args.seed, args.distinct_tokens)
+        for name in ("request_ms", "essay_ms"):
+            latencies = ", ".join(f"{key} {value:.2f}" for key, value in result[name].items())
+            print(f"{name:<12} {latencies}")
+        print(f"{result['essays_per_second']:.0f} essays/sec, {result['errors']} errors")
+        if result["rss_mb"]["end"] is not None:
+            print("service RSS MB " + ", ".join(f"{key} {value:.1f}" for key, value in result["rss_mb"].items()))
+        output = args.output or path.join(args.work_dir, f"load_test_{datetime.now():%Y%m%d_%H%M%S}.json")
+        with open(output, "w", encoding="utf-8") as output_file:
+            json.dump({"environment": environment(), **result}, output_file, indent=2)
+        print(f"Results written to {output}")
+
+    elif args.command == "compare":
+        compare(args.baseline, args.candidate)
+
+
+if __name__ == "__main__":
+    main()
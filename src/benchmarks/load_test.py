@@ -0,0 +1,154 @@
+from benchmarks.scaling import SRC_DIR
+from benchmarks.synthetic import SyntheticCorpus
+from config import PipelineConfig
+from http.client import HTTPConnection
+from itertools import cycle, islice
+from os import makedirs, path
+from time import perf_counter
+from opted_reader import prepare_dictionary_data
+from word_frequency import prepare_frequency_data
+import json
+import numpy as np
+import subprocess
+import sys
+
+# Distinct synthetic essays the requests are drawn from
+ESSAY_POOL = 2000
+WARM_UP_REQUESTS = 20
+LATENCY_PERCENTILES = (50, 90, 99)
+# With distinct_tokens: never seen words added to each essay, the service's vocabulary limit, and
+# how much its resident memory may grow over the second half of the requests
+DISTINCT_WORDS_PER_ESSAY = 20
+DISTINCT_VOCABULARY_LIMIT = 20_000
+RSS_GROWTH_LIMIT_MB = 8.0
+
+
+def start_service(data_dir: str, http: bool, port: int, vocabulary_limit: int | None = None) -> subprocess.Popen:
+    """
+    Start the scoring service and wait until it reports that it is ready.
+    """
+    command = [sys.executable, "-m", "cli", "--data-dir", data_dir, "serve"]
+    if http:
+        command += ["--http", "--port", str(port)]
+    if vocabulary_limit is not None:
+        command += ["--vocabulary-limit", str(vocabulary_limit)]
+    service = subprocess.Popen(command, cwd=SRC_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, text=True, encoding="utf-8")
+    ready = service.stderr.readline()
+    if "ready" not in ready:
+        service.kill()
+        raise RuntimeError(f"Scoring service did not start: {ready}{service.stderr.read()}")
+    return service
+
+
+def resident_mb(pid: int) -> float | None:
+    """
+    Resident memory of a process in megabytes, or None where /proc is not available.
+    """
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+def distinct_words(request: int, essay: int) -> str:
+    """
+    A sentence of words no other essay of the load test contains.
+    """
+    return " ".join(f"zq{request}x{essay}x{word}" for word in range(DISTINCT_WORDS_PER_ESSAY)) + "."
+
+
+def latency_summary(milliseconds: list[float]) -> dict:
+    values = np.asarray(milliseconds)
+    summary = {f"p{percentile}": float(np.percentile(values, percentile)) for percentile in LATENCY_PERCENTILES}
+    summary["mean"] = float(values.mean())
+    summary["max"] = float(values.max())
+    return summary
+
+
+def run_load_test(work_dir: str, requests: int = 2000, batch_size: int = 8, http: bool = False, port: int = 8765,
+                  seed: int = 0, distinct_tokens: bool = False) -> dict:
+    """
+    Send requests micro-batches of batch_size synthetic essays to a freshly started scoring
+    service, one at a time, and measure the latency of each as seen by the client. The service
+    scores against the frequency list of a synthetic corpus prepared in work_dir.
+
+    With distinct_tokens every essay also gets words never sent before, and the service runs with
+    a small vocabulary limit. Its resident memory must then stay flat: an AssertionError is raised
+    when it grows by more than RSS_GROWTH_LIMIT_MB between the middle and the end of the test.
+    """
+    corpus = SyntheticCorpus(essays=ESSAY_POOL, seed=seed)
+    _, list_path, dictionary_path = corpus.write(work_dir)
+    config = PipelineConfig(data_dir=path.abspath(path.join(work_dir, "data")))
+    makedirs(config.data_dir, exist_ok=True)
+    if not path.exists(config.frequency_index_path):
+        prepare_frequency_data(list_path, config.frequency_csv_path, config.frequency_index_path)
+    if not path.exists(config.dictionary_index_path):
+        prepare_dictionary_data(dictionary_path, config.dictionary_csv_path, config.dictionary_index_path)
+    essays = cycle({"id": i, "text": text, "ai_author": label == "1.0"}
+                   for i, (text, label) in enumerate(corpus.essay_rows()))
+    batches = []
+    for request in range(requests + WARM_UP_REQUESTS):
+        batch = list(islice(essays, batch_size))
+        if distinct_tokens:
+            batch = [{**essay, "text": f"{essay['text']} {distinct_words(request, i)}"} for i, essay in enumerate(batch)]
+        batches.append(json.dumps({"essays": batch}))
+
+    service = start_service(config.data_dir, http, port, DISTINCT_VOCABULARY_LIMIT if distinct_tokens else None)
+    connection = HTTPConnection("127.0.0.1", port) if http else None
+
+    def send(body: str) -> dict:
+        if connection is not None:
+            connection.request("POST", "/score", body.encode("utf-8"), {"Content-Type": "application/json"})
+            return json.loads(connection.getresponse().read())
+        service.stdin.write(body + "\n")
+        service.stdin.flush()
+        return json.loads(service.stdout.readline())
+
+    client_ms = []
+    server_ms = []
+    errors = 0
+    rss_mb = {}
+    try:
+        for body in batches[:WARM_UP_REQUESTS]:
+            send(body)
+        rss_mb["start"] = resident_mb(service.pid)
+        start = perf_counter()
+        for request, body in enumerate(batches[WARM_UP_REQUESTS:]):
+            if request == requests // 2:
+                rss_mb["middle"] = resident_mb(service.pid)
+            sent = perf_counter()
+            response = send(body)
+            client_ms.append((perf_counter() - sent) * 1000.0)
+            server_ms.append(response["milliseconds"])
+            errors += sum("error" in result for result in response["results"])
+        elapsed = perf_counter() - start
+        rss_mb["end"] = resident_mb(service.pid)
+    finally:
+        if connection is not None:
+            connection.close()
+        service.stdin.close()
+        service.terminate()
+        service.wait()
+
+    if distinct_tokens and rss_mb["end"] is not None:
+        growth = rss_mb["end"] - rss_mb["middle"]
+        assert growth <= RSS_GROWTH_LIMIT_MB, \
+            f"Service memory grew by {growth:.1f} MB over {requests - requests // 2} requests of new words"
+
+    return {
+        "transport": "http" if http else "stdio",
+        "requests": requests,
+        "batch_size": batch_size,
+        "distinct_tokens": distinct_tokens,
+        "errors": errors,
+        "rss_mb": rss_mb,
+        "essays_per_second": requests * batch_size / elapsed,
+        "request_ms": latency_summary(client_ms),
+        "server_ms": latency_summary(server_ms),
+        "essay_ms": latency_summary([milliseconds / batch_size for milliseconds in client_ms])
+    }
@@ -0,0 +1,120 @@
+from benchmarks.synthetic import SyntheticCorpus
+from contextlib import redirect_stdout
+from essay_reader import parse_essay
+from essay_stats import BatchManager, EssayBatchStats, EssayStats, word_totals
+from inference import METRIC_NAMES, compare_batches
+from io import StringIO
+from opted_reader import configure_default_dictionary, get_default_dictionary, prepare_dictionary_data
+from os import path
+from random import Random
+from time import perf_counter
+from tokenizer import legacy_parse_essay
+from warnings import catch_warnings, simplefilter
+from word_frequency import configure_default_manager, get_default_manager, prepare_frequency_data
+
+# Each measurement repeats its function until at least MIN_SECONDS have passed, REPEATS times,
+# and keeps the fastest repeat
+MIN_SECONDS = 0.2
+REPEATS = 3
+
+
+def measure(name: str, function, items_per_call: int = 1, **details) -> dict:
+    """
+    Best-of-REPEATS timing of function, which processes items_per_call items per call. Anything
+    function prints, and any warning it raises, is swallowed.
+    """
+    best = float("inf")
+    calls = 0
+    with redirect_stdout(StringIO()), catch_warnings():
+        simplefilter("ignore")
+        function()
+        for _ in range(REPEATS):
+            calls = 0
+            start = perf_counter()
+            while True:
+                function()
+                calls += 1
+                elapsed = perf_counter() - start
+                if elapsed >= MIN_SECONDS:
+                    break
+            best = min(best, elapsed / calls)
+    return {
+        "name": name,
+        "seconds_per_call": best,
+        "items_per_call": items_per_call,
+        "items_per_second": items_per_call / best,
+        "calls_per_repeat": calls,
+        **details
+    }
+
+
+def run_micro(work_dir: str, essays: int = 500, batch_essays: int = 300000, seed: int = 0) -> list[dict]:
+    """
+    Microbenchmarks of the hot functions on a synthetic corpus written to work_dir: essays essays
+    for parsing and scoring, and batch_essays essays per author, built from their features, for
+    sampling and inference.
+    """
+    corpus = SyntheticCorpus(essays=essays, seed=seed)
+    _, list_path, dictionary_path = corpus.write(work_dir)
+    csv_path = path.join(work_dir, "word_frequency.csv")
+    index_path = path.join(work_dir, "word_frequency.idx")
+    prepare_frequency_data(list_path, csv_path, index_path)
+    configure_default_manager(index_path, csv_path)
+    dictionary_csv_path = path.join(work_dir, "opted_words.csv")
+    dictionary_index_path = path.join(work_dir, "opted_words.idx")
+    prepare_dictionary_data(dictionary_path, dictionary_csv_path, dictionary_index_path)
+    configure_default_dictionary(dictionary_index_path, dictionary_csv_path)
+    manager = get_default_manager()
+
+    rows = list(corpus.essay_rows())
+    texts = [(text, label == "1.0") for text, label in rows]
+    parsed = [parse_essay(text, ai_author) for text, ai_author in texts]
+    words = [word for essay in parsed for sentence in essay.sentences for word in sentence.words]
+    results = [
+        # The original parser and data classes, unchanged, as the baseline of the two tokenizers
+        measure("parse_essay/legacy", lambda: [legacy_parse_essay(text, ai_author) for text, ai_author in texts],
+                len(texts)),
+        measure("parse_essay/strict", lambda: [parse_essay(text, ai_author, True) for text, ai_author in texts],
+                len(texts)),
+        measure("parse_essay/standard", lambda: [parse_essay(text, ai_author, False) for text, ai_author in texts],
+                len(texts)),
+        measure("EssayStats", lambda: [EssayStats(essay) for essay in parsed], len(parsed)),
+    ]
+
+    def cold_scores():
+        manager.word_score.cache_clear()
+        for word in words:
+            manager.word_score(word)
+
+    def warm_scores():
+        for word in words:
+            manager.word_score(word)
+
+    results.append(measure("word_score/cold", cold_scores, len(words)))
+    results.append(measure("word_score/warm", warm_scores, len(words)))
+    results.append(measure("word_totals", lambda: word_totals(parsed), len(words)))
+    dictionary = get_default_dictionary()
+    distinct_words = sorted(set(words))
+    results.append(measure("DictionaryLookup.contains", lambda: dictionary.contains(distinct_words),
+                           len(distinct_words)))
+
+    features = [EssayStats(essay).features for essay in parsed]
+    ai_batches = BatchManager(True)
+    human_batches = BatchManager(False)
+    for i in range(batch_essays):
+        ai_batches.add_features(features[i % len(features)])
+        human_batches.add_features(features[(i * 7) % len(features)])
+    batch: EssayBatchStats = max((batch for _, batch in ai_batches.get_batches()), key=lambda batch: batch.essay_count)
+    rng = Random(seed)
+    results.append(measure("EssayBatchStats.get_random_sample", lambda: batch.get_random_sample(1000, rng), 1000,
+                           population=batch.essay_count))
+    results_path = path.join(work_dir, "inference_results.json")
+    # One test per metric and bucket
+    tests = len(ai_batches.batches) * len(METRIC_NAMES)
+    results.append(measure("compare_batches", lambda: compare_batches(ai_batches, human_batches, seed=seed,
+                                                                      results_path=results_path), tests,
+                           essays_per_side=batch_essays))
+    results.append(measure("compare_batches/full_population",
+                           lambda: compare_batches(ai_batches, human_batches, results_path=results_path,
+                                                   full_population=True), tests, essays_per_side=batch_essays))
+    return results
@@ -0,0 +1,54 @@
+from benchmarks.synthetic import SyntheticCorpus
+from os import makedirs, path
+from time import perf_counter
+import json
+import subprocess
+import sys
+
+SRC_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+DEFAULT_SIZES = (10000, 100000, 1000000)
+
+
+def run_cli(data_dir: str, *args: str):
+    """
+    Run one pipeline command in a fresh interpreter with the timer profile on, so every size gets
+    its own peak RSS, and return the profile report.
+    """
+    subprocess.run([sys.executable, "-m", "cli", "--data-dir", data_dir, "--profile", "timers", *args],
+                   cwd=SRC_DIR, check=True, stdout=subprocess.DEVNULL)
+    with open(path.join(data_dir, "profile.json"), encoding="utf-8") as report_file:
+        return json.load(report_file)
+
+
+def run_scaling(work_dir: str, sizes=DEFAULT_SIZES, workers: int = 1, output_format: str = "npz",
+                seed: int = 0) -> list[dict]:
+    """
+    End-to-end ingest, inference included, of synthetic corpora of each size. Corpora are cached in
+    work_dir, so only the first run of a size pays for generating it.
+    """
+    results = []
+    for size in sizes:
+        corpus_dir = path.abspath(path.join(work_dir, f"corpus_{size}"))
+        start = perf_counter()
+        csv_path, list_path, dictionary_path = SyntheticCorpus(essays=size, seed=seed).write(corpus_dir)
+        generate_seconds = perf_counter() - start
+        data_dir = path.join(corpus_dir, "data")
+        for folder in ("ai", "human", "batches"):
+            makedirs(path.join(data_dir, folder), exist_ok=True)
+        run_cli(data_dir, "prepare", "--raw-frequency", list_path, "--raw-dictionary", dictionary_path)
+        report = run_cli(data_dir, "ingest", "--essays", csv_path, "--workers", str(workers),
+                         "--output-format", output_format, "--seed", str(seed))
+        results.append({
+            "essays": size,
+            "workers": workers,
+            "output_format": output_format,
+            "csv_bytes": path.getsize(csv_path),
+            "generate_seconds": generate_seconds,
+            "wall_seconds": report["wall_seconds"],
+            "essays_per_second": report["essays_per_second"],
+            "peak_rss_mb": report["peak_rss_mb"],
+            "stages": report["stages"],
+            "counters": report["counters"]
+        })
+        print(f"{size} essays: {report['wall_seconds']:.1f} s, {report['essays_per_second']:.0f} essays/sec")
+    return results
@@ -0,0 +1,163 @@
+from csv import writer
+from dataclasses import dataclass, field
+from os import makedirs, path
+import numpy as np
+
+# Relative frequency of each punctuation mark attached to a word. The sentence endings also end
+# the sentence: the next word is capitalised.
+DEFAULT_PUNCTUATION_MIX = {
+    ",": 0.40, ".": 0.34, "?": 0.03, "!": 0.02, ";": 0.02, ":": 0.02, "\"": 0.05, "'": 0.03,
+    "(": 0.02, ")": 0.02, "-": 0.02, "…": 0.01, "“": 0.01, "”": 0.01
+}
+SENTENCE_ENDINGS = frozenset(".?!…")
+SYLLABLES = ["ba", "ce", "di", "fo", "gu", "ha", "je", "ki", "lo", "mu", "na", "pe", "qui", "ro", "su",
+             "ta", "ve", "wi", "xo", "yu", "za", "an", "el", "in", "or", "un", "st", "tr", "ph", "sh"]
+# Essays generated per vectorised draw
+CHUNK_ESSAYS = 2000
+
+
+@dataclass
+class AuthorStyle:
+    """
+    How one author class writes: essay lengths are log-normal around mean_words, words are drawn
+    from a Zipf distribution over the vocabulary and punctuation_rate of them carry a mark.
+    """
+    mean_words: float = 380.0
+    length_sigma: float = 0.7
+    punctuation_rate: float = 0.12
+    zipf_exponent: float = 1.05
+    paragraph_rate: float = 0.08
+
+
+@dataclass
+class SyntheticCorpus:
+    """
+    Settings of a synthetic essay corpus. The same settings and seed always give the same files.
+    """
+    essays: int = 10000
+    ai_fraction: float = 0.5
+    vocabulary_size: int = 20000
+    # Fraction of the vocabulary left out of the frequency list, to exercise the out-of-vocabulary path
+    unlisted_fraction: float = 0.02
+    # Fraction of the vocabulary in the dictionary, the rest counting as misspelled when also unlisted
+    dictionary_fraction: float = 0.85
+    seed: int = 0
+    human: AuthorStyle = field(default_factory=AuthorStyle)
+    ai: AuthorStyle = field(default_factory=lambda: AuthorStyle(mean_words=340.0, length_sigma=0.6,
+                                                                 punctuation_rate=0.10, zipf_exponent=1.0))
+    punctuation_mix: dict[str, float] = field(default_factory=lambda: dict(DEFAULT_PUNCTUATION_MIX))
+
+    def vocabulary(self) -> list[str]:
+        """
+        vocabulary_size distinct pseudo-words, most frequent first.
+        """
+        rng = np.random.default_rng([self.seed, 1])
+        words = []
+        seen = set()
+        while len(words) < self.vocabulary_size:
+            syllables = rng.integers(0, len(SYLLABLES), size=int(rng.integers(1, 5)))
+            word = "".join(SYLLABLES[syllable] for syllable in syllables)
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+        return words
+
+    def essay_rows(self):
+        """
+        Yield (text, label) rows, label "1.0" for AI essays and "0.0" for human ones, as in the
+        Kaggle essay CSV.
+        """
+        vocabulary = np.array(self.vocabulary(), dtype=object)
+        marks = np.array(list(self.punctuation_mix), dtype=object)
+        mark_weights = np.array(list(self.punctuation_mix.values()), dtype=np.float64)
+        mark_weights /= mark_weights.sum()
+        ends_sentence = np.array([mark in SENTENCE_ENDINGS for mark in marks])
+        ranks = np.arange(1, len(vocabulary) + 1, dtype=np.float64)
+        word_cdfs = {}
+        for style in (self.human, self.ai):
+            weights = ranks ** -style.zipf_exponent
+            word_cdfs[id(style)] = np.cumsum(weights) / weights.sum()
+
+        rng = np.random.default_rng(self.seed)
+        for chunk_start in range(0, self.essays, CHUNK_ESSAYS):
+            chunk = min(CHUNK_ESSAYS, self.essays - chunk_start)
+            is_ai = rng.random(chunk) < self.ai_fraction
+            rows: list[tuple[str, str]] = [None] * chunk
+            for ai_author in (True, False):
+                # Each author class draws its chunk in one go, then the rows are put back in order
+                style = self.ai if ai_author else self.human
+                indices = np.flatnonzero(is_ai == ai_author)
+                if len(indices) == 0:
+                    continue
+                lengths = np.maximum(1, rng.lognormal(np.log(style.mean_words), style.length_sigma, len(indices))
+                                     .astype(np.int64))
+                total = int(lengths.sum())
+                tokens = vocabulary[np.searchsorted(word_cdfs[id(style)], rng.random(total))]
+                punctuated = np.flatnonzero(rng.random(total) < style.punctuation_rate)
+                mark_ids = np.searchsorted(np.cumsum(mark_weights), rng.random(len(punctuated)))
+                mark_ids = np.minimum(mark_ids, len(marks) - 1)
+                tokens[punctuated] = tokens[punctuated] + marks[mark_ids]
+                # Capitalise the word after every sentence ending and break some sentences into paragraphs
+                ending = punctuated[ends_sentence[mark_ids]]
+                after = ending[ending + 1 < total] + 1
+                tokens[after] = [token.capitalize() for token in tokens[after]]
+                breaks = ending[rng.random(len(ending)) < style.paragraph_rate]
+                tokens[breaks] = tokens[breaks] + "\n\n"
+                bounds = np.concatenate(([0], np.cumsum(lengths)))
+                label = "1.0" if ai_author else "0.0"
+                for essay, row in enumerate(indices.tolist()):
+                    text = " ".join(tokens[bounds[essay]:bounds[essay + 1]]).replace("\n\n ", "\n\n")
+                    rows[row] = (text, label)
+            yield from rows
+
+    def write_essays(self, csv_path: str):
+        with open(csv_path, "w", encoding="utf-8", newline="") as file:
+            csv_writer = writer(file)
+            csv_writer.writerow(["text", "generated"])
+            csv_writer.writerows(self.essay_rows())
+
+    def write_frequency_list(self, list_path: str):
+        """
+        Raw frequency list in the "word count" line format prepare_frequency_data reads, with Zipf
+        counts from about 2e10 down, so every digit-count multiplier is used.
+        """
+        vocabulary = self.vocabulary()
+        listed = vocabulary[:max(1, int(len(vocabulary) * (1 - self.unlisted_fraction)))]
+        with open(list_path, "w", encoding="utf-8") as file:
+            for rank, word in enumerate(listed, start=1):
+                file.write(f"{word} {max(1, int(2e10 / rank ** 1.4))}\n")
+
+    def write_dictionary(self, dictionary_path: str):
+        """
+        Dictionary CSV in the OPTED layout prepare_dictionary_data reads, holding a random
+        dictionary_fraction of the vocabulary as capitalised headwords.
+        """
+        vocabulary = self.vocabulary()
+        rng = np.random.default_rng([self.seed, 2])
+        listed = np.flatnonzero(rng.random(len(vocabulary)) < self.dictionary_fraction)
+        with open(dictionary_path, "w", encoding="utf-8", newline="") as file:
+            csv_writer = writer(file)
+            csv_writer.writerow(["Word", "Count", "POS", "Definition"])
+            csv_writer.writerows((vocabulary[i].capitalize(), "1", "n.", "A synthetic entry.") for i in listed)
+
+    def write(self, directory: str) -> tuple[str, str, str]:
+        """
+        Write essay_data.csv, word_frequency.txt and OPTED-Dictionary.csv into directory, unless
+        files made with these settings are already there. Returns their paths.
+        """
+        makedirs(directory, exist_ok=True)
+        csv_path = path.join(directory, "essay_data.csv")
+        list_path = path.join(directory, "word_frequency.txt")
+        dictionary_path = path.join(directory, "OPTED-Dictionary.csv")
+        settings_path = path.join(directory, "corpus_settings.txt")
+        settings = repr(self)
+        if all(path.exists(file_path) for file_path in (settings_path, csv_path, list_path, dictionary_path)):
+            with open(settings_path, encoding="utf-8") as settings_file:
+                if settings_file.read() == settings:
+                    return csv_path, list_path, dictionary_path
+        self.write_frequency_list(list_path)
+        self.write_dictionary(dictionary_path)
+        self.write_essays(csv_path)
+        with open(settings_path, "w", encoding="utf-8") as settings_file:
+            settings_file.write(settings)
+        return csv_path, list_path, dictionary_path
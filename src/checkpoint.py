@@ -0,0 +1,163 @@
+from essay_stats import BatchManager, EssayFeatures
+from hashlib import blake2b
+from io import SEEK_END
+from os import path, replace
+from token_stats import CorpusTokenStats
+import pickle
+
+FINGERPRINT_BYTES = 1 << 16
+
+
+def file_fingerprint(file_path: str, end: int) -> bytes:
+    """
+    Hash of the FINGERPRINT_BYTES bytes before end, used to tell whether the part of a file that has
+    already been processed changed since.
+    """
+    with open(file_path, "rb") as file:
+        start = max(0, end - FINGERPRINT_BYTES)
+        file.seek(start)
+        return blake2b(file.read(end - start), digest_size=16).digest()
+
+
+class IngestCheckpoint:
+    """
+    Everything needed to continue an interrupted ingest: how far into the CSV it got, the batch
+    statistics so far, the per-essay dump counters, the number of rows in the feature store and,
+    when they are collected, the corpus token stats.
+    """
+    def __init__(self, essay_path: str, strict: bool, stats_mode: str, ai_batches: BatchManager,
+                 human_batches: BatchManager, token_stats: CorpusTokenStats | None = None):
+        self.essay_path = essay_path
+        self.strict = strict
+        self.stats_mode = stats_mode
+        self.offset = 0
+        self.fingerprint = b""
+        self.essay_count = 0
+        self.shards_done = 0
+        self.dump_counters: dict[str, tuple[int, int]] = {"ai": (0, 0), "human": (0, 0)}
+        self.feature_rows = 0
+        self.ai_batches = ai_batches
+        self.human_batches = human_batches
+        self.token_stats = token_stats
+        self.features = EssayFeatures._fields
+        # Size of every NDJSON dump when the checkpoint was saved, by path relative to the data directory
+        self.dump_sizes: dict[str, int] = {}
+
+    def save(self, checkpoint_path: str, offset: int):
+        self.offset = offset
+        self.fingerprint = file_fingerprint(self.essay_path, offset)
+        temp_path = checkpoint_path + ".tmp"
+        with open(temp_path, "wb") as checkpoint_file:
+            pickle.dump(self, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+        replace(temp_path, checkpoint_path)
+
+    @staticmethod
+    def load(checkpoint_path: str, essay_path: str, strict: bool, stats_mode: str,
+             token_stats: bool = False) -> "IngestCheckpoint | None":
+        """
+        The checkpoint at checkpoint_path, or None (with the reason printed) if there is none or it
+        cannot be continued with the given CSV and options.
+        """
+        if not path.exists(checkpoint_path):
+            return None
+        with open(checkpoint_path, "rb") as checkpoint_file:
+            checkpoint: IngestCheckpoint = pickle.load(checkpoint_file)
+        if not hasattr(checkpoint, "feature_rows"):
+            print("Checkpoint was made before the feature store existed, starting over")
+            return None
+        if getattr(checkpoint, "features", None) != EssayFeatures._fields:
+            print("Checkpoint was made with a different set of features, starting over")
+            return None
+        if ((checkpoint.essay_path, checkpoint.strict, checkpoint.stats_mode) != (essay_path, strict, stats_mode)
+                or (getattr(checkpoint, "token_stats", None) is not None) != token_stats):
+            print("Checkpoint was made with a different essay file or options, starting over")
+            return None
+        if path.getsize(essay_path) < checkpoint.offset or file_fingerprint(essay_path, checkpoint.offset) != checkpoint.fingerprint:
+            print("Essay file changed before the checkpoint, starting over")
+            return None
+        with open(essay_path, "rb") as file:
+            file.seek(max(0, checkpoint.offset - 1))
+            if checkpoint.offset > 0 and file.read(1) != b"\n" and path.getsize(essay_path) > checkpoint.offset:
+                print("Checkpoint does not end on a row boundary, starting over")
+                return None
+        return checkpoint
+
+
+class FeatureCache:
+    """
+    Features of every essay parsed so far, keyed by a hash of the essay text, so reruns only parse
+    new or changed essays. The file is an append-only sequence of pickled dicts: the first holds the
+    fingerprint of the settings the features depend on, each later one the entries added by a save.
+    """
+    def __init__(self, cache_path: str, fingerprint: tuple):
+        self.cache_path = cache_path
+        self.fingerprint = fingerprint
+        self.entries: dict[bytes, EssayFeatures] = {}
+        self.added: dict[bytes, EssayFeatures] = {}
+        # True until the file on disk is known to hold a cache with this fingerprint
+        self.stale = True
+        self.valid_bytes: int | None = None
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, key: bytes) -> EssayFeatures | None:
+        return self.entries.get(key)
+
+    def put(self, key: bytes, features: EssayFeatures):
+        self.entries[key] = features
+        self.added[key] = features
+
+    def update(self, entries: dict[bytes, EssayFeatures]):
+        self.entries.update(entries)
+        self.added.update(entries)
+
+    def load(self) -> "FeatureCache":
+        if not path.exists(self.cache_path):
+            return self
+        with open(self.cache_path, "rb") as cache_file:
+            try:
+                if pickle.load(cache_file) != {"fingerprint": self.fingerprint}:
+                    print("Feature cache was built with different settings, ignoring it")
+                    return self
+                self.stale = False
+                while True:
+                    self.valid_bytes = cache_file.tell()
+                    self.entries.update(pickle.load(cache_file))
+            except (EOFError, pickle.UnpicklingError):
+                # End of file, or a save cut short by a crash: keep everything read up to there and
+                # let the next save overwrite the damaged tail
+                pass
+        return self
+
+    def save(self):
+        """
+        Append the entries added since the last save, or rewrite the whole file if it held a cache
+        built with different settings.
+        """
+        if self.stale:
+            with open(self.cache_path, "wb") as cache_file:
+                pickle.dump({"fingerprint": self.fingerprint}, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(self.entries, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.stale = False
+        elif self.added:
+            with open(self.cache_path, "r+b") as cache_file:
+                if self.valid_bytes is not None:
+                    cache_file.truncate(self.valid_bytes)
+                    self.valid_bytes = None
+                cache_file.seek(0, SEEK_END)
+                pickle.dump(self.added, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.added = {}
+
+
+def feature_cache_fingerprint(strict: bool, frequency_index_path: str, dictionary_index_path: str) -> tuple:
+    """
+    Settings the cached features depend on: the feature set, the tokenizer mode, the word frequency
+    index and the dictionary index.
+    """
+    digests = []
+    for index_path in (frequency_index_path, dictionary_index_path):
+        with open(index_path, "rb") as index_file:
+            digests.append(blake2b(index_file.read(), digest_size=16).hexdigest())
+    return ("v2", EssayFeatures._fields, strict, *digests)
@@ -0,0 +1,244 @@
+from argparse import ArgumentParser, ArgumentTypeError
+from config import PipelineConfig, STAT_MODES, OUTPUT_FORMATS, SENTENCE_DATA_MODES, CORRECTIONS, RESAMPLING_METHODS, \
+    FEATURE_COLUMNS, WORD_COUNT_EDGES, DEDUPE_MODES, VOCABULARY_LIMIT
+from instrumentation import PROFILE_MODES, run_profiled
+from time import time
+
+
+def parse_edges(text: str) -> list[float]:
+    try:
+        edges = [float(edge) for edge in text.split(",")]
+    except ValueError:
+        raise ArgumentTypeError(f"expected comma-separated numbers, got {text}")
+    if any(low >= high for low, high in zip(edges, edges[1:])):
+        raise ArgumentTypeError("edges must be increasing")
+    return edges
+
+
+def build_parser() -> ArgumentParser:
+    defaults = PipelineConfig()
+    parser = ArgumentParser(prog="python -m cli", description="AI versus human essay analysis pipeline")
+    parser.add_argument("--data-dir", default=defaults.data_dir,
+                        help=f"directory holding the ai/, human/ and batches/ output folders (default: {defaults.data_dir})")
+    parser.add_argument("--profile", choices=list(PROFILE_MODES),
+                        help="write a JSON report of per-stage timings, counters, throughput and peak RSS to "
+                             "profile.json in the data directory, optionally with the top functions under cProfile "
+                             "or the top allocation sites under tracemalloc (both slow the run down)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prepare = subparsers.add_parser("prepare", help="compile the word frequency data and the dictionary")
+    prepare.add_argument("--raw-frequency", default=defaults.raw_frequency_path,
+                         help=f"word frequency list to compile (default: {defaults.raw_frequency_path})")
+    prepare.add_argument("--raw-dictionary", default=defaults.raw_dictionary_path,
+                         help=f"OPTED dictionary CSV to compile (default: {defaults.raw_dictionary_path})")
+
+    ingest = subparsers.add_parser("ingest", help="parse essays and write per-essay and batch statistics")
+    ingest.add_argument("--essays", default=defaults.essay_path,
+                        help=f"essay CSV to parse (default: {defaults.essay_path})")
+    ingest.add_argument("--batch-size", type=int, default=defaults.batch_size,
+                        help=f"essays per per-essay dump file (default: {defaults.batch_size})")
+    ingest.add_argument("--workers", type=int, default=defaults.workers,
+                        help=f"number of worker processes (default: {defaults.workers})")
+    ingest.add_argument("--tokenizer", choices=["strict", "standard"], default="strict",
+                        help="strict reproduces the original word and punctuation counts, standard splits sentences on "
+                             "any terminal punctuation and counts every mark once (default: strict)")
+    ingest.add_argument("--stats", choices=list(STAT_MODES), default=defaults.stats_mode,
+                        help="exact keeps every per-essay value, sketch keeps bounded-memory running moments and "
+                             f"an approximate median (default: {defaults.stats_mode})")
+    ingest.add_argument("--output-format", choices=list(OUTPUT_FORMATS), default=defaults.output_format,
+                        help="per-essay dump format: pretty-printed json batches, one streamed ndjson file per author, "
+                             f"or npz batches of the scalar features only (default: {defaults.output_format})")
+    ingest.add_argument("--sentence-data", choices=list(SENTENCE_DATA_MODES), default=defaults.sentence_data,
+                        help="per-sentence detail in json/ndjson dumps: full word and punctuation maps, summary counts, "
+                             f"or none (default: {defaults.sentence_data})")
+    ingest.add_argument("--writer-queue", type=int, default=defaults.writer_queue_size,
+                        help="batches buffered for the background writer thread, 0 writes on the parsing thread "
+                             f"(default: {defaults.writer_queue_size})")
+    ingest.add_argument("--resume", action="store_true",
+                        help="save checkpoints while parsing and continue from the last one left by an earlier run "
+                             "with the same options, e.g. after a crash or after rows were appended to the CSV")
+    ingest.add_argument("--feature-cache", action="store_true",
+                        help="cache every essay's features by a hash of its text and only parse essays that are "
+                             "not in the cache yet")
+    ingest.add_argument("--skip-inference", action="store_true",
+                        help="only write the batch statistics, run the inference tests later with the infer command")
+    ingest.add_argument("--seed", type=int, default=defaults.seed,
+                        help="seed for the inference samples, makes inference_results.json reproducible")
+    ingest.add_argument("--correction", choices=list(CORRECTIONS), default=defaults.correction,
+                        help="multiple-comparison correction across all bucket and metric tests: holm (family-wise "
+                             f"error rate), bh (false discovery rate) or none (default: {defaults.correction})")
+    ingest.add_argument("--full-population", action="store_true",
+                        help="test every essay in each stratification instead of a random sample of 1000 per side")
+    ingest.add_argument("--dedupe", choices=list(DEDUPE_MODES), default=defaults.dedupe,
+                        help="drop duplicate essays before parsing: exact drops repeated texts, near also drops "
+                             "essays whose word shingles are near-identical to an earlier essay's, found with "
+                             f"MinHash and LSH (default: {defaults.dedupe})")
+    ingest.add_argument("--near-threshold", type=float, default=defaults.near_duplicate_threshold,
+                        help="estimated Jaccard similarity of word shingles from which --dedupe near drops an essay "
+                             f"(default: {defaults.near_duplicate_threshold})")
+    ingest.add_argument("--token-stats", action="store_true",
+                        help="count the words and punctuation of all essays per author and bucket in bounded "
+                             "memory and write the tokens that best separate AI from human essays to "
+                             "distinguishing_tokens.json in the data directory")
+
+    infer = subparsers.add_parser("infer", help="run the inference tests on the batches saved by ingest")
+    infer.add_argument("--alpha", type=float, default=0.01, help="significance level (default: 0.01)")
+    infer.add_argument("--seed", type=int, default=defaults.seed,
+                       help="seed for the inference samples, makes inference_results.json reproducible")
+    infer.add_argument("--workers", type=int, default=defaults.workers,
+                       help=f"number of processes running the tests (default: {defaults.workers})")
+    infer.add_argument("--correction", choices=list(CORRECTIONS), default=defaults.correction,
+                       help="multiple-comparison correction across all bucket and metric tests: holm (family-wise "
+                            f"error rate), bh (false discovery rate) or none (default: {defaults.correction})")
+    infer.add_argument("--full-population", action="store_true",
+                       help="test every essay in each stratification instead of a random sample of 1000 per side")
+
+    resample = subparsers.add_parser("resample", help="bootstrap or permutation tests on the batches saved by ingest")
+    resample.add_argument("--method", choices=list(RESAMPLING_METHODS), default="bootstrap",
+                          help="bootstrap reports the spread of t-test p-values over many subsamples and a confidence "
+                               "interval for the mean difference, permutation a permutation test p-value (default: bootstrap)")
+    resample.add_argument("--replicates", type=int, default=10000,
+                          help="replicates per stratification and metric (default: 10000)")
+    resample.add_argument("--sample-size", type=int, default=1000,
+                          help="essays drawn from each side per replicate (default: 1000)")
+    resample.add_argument("--confidence", type=float, default=0.95,
+                          help="confidence level of the mean difference intervals (default: 0.95)")
+    resample.add_argument("--alpha", type=float, default=0.01, help="significance level (default: 0.01)")
+    resample.add_argument("--seed", type=int, default=defaults.seed,
+                          help="seed for the replicates, makes resampling_results.json reproducible")
+    resample.add_argument("--workers", type=int, default=defaults.workers,
+                          help=f"number of processes, one stratification each at a time (default: {defaults.workers})")
+    resample.add_argument("--correction", choices=list(CORRECTIONS), default=defaults.correction,
+                          help=f"multiple-comparison correction of permutation p-values (default: {defaults.correction})")
+
+    stratify = subparsers.add_parser("stratify", help="bucket the essays in the feature store saved by ingest by any "
+                                                      "feature and run the inference tests on the new buckets")
+    stratify.add_argument("--column", choices=list(FEATURE_COLUMNS), default="word_count",
+                          help="feature to bucket the essays by (default: word_count)")
+    stratify.add_argument("--edges", type=parse_edges, default=list(WORD_COUNT_EDGES),
+                          help="comma-separated inclusive upper bounds of the buckets, a last bucket holds everything "
+                               f"above the final edge (default: {','.join(map(str, WORD_COUNT_EDGES))})")
+    stratify.add_argument("--alpha", type=float, default=0.01, help="significance level (default: 0.01)")
+    stratify.add_argument("--seed", type=int, default=defaults.seed,
+                          help="seed for the inference samples, makes stratified_results.json reproducible")
+    stratify.add_argument("--workers", type=int, default=defaults.workers,
+                          help=f"number of processes running the tests (default: {defaults.workers})")
+    stratify.add_argument("--correction", choices=list(CORRECTIONS), default=defaults.correction,
+                          help=f"multiple-comparison correction across all tests (default: {defaults.correction})")
+    stratify.add_argument("--full-population", action="store_true",
+                          help="test every essay in each bucket instead of a random sample of 1000 per side")
+
+    serve = subparsers.add_parser("serve", help="keep the word frequency index and tokenizer loaded and score new "
+                                                "essays on request")
+    serve.add_argument("--http", action="store_true",
+                       help="answer POST /score on a localhost HTTP port instead of JSON lines on stdin/stdout")
+    serve.add_argument("--host", default="127.0.0.1", help="address to listen on with --http (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8765, help="port to listen on with --http (default: 8765)")
+    serve.add_argument("--tokenizer", choices=["strict", "standard"], default="strict",
+                       help="tokenizer the essays are parsed with, as in ingest (default: strict)")
+    serve.add_argument("--column", choices=list(FEATURE_COLUMNS), default="word_count",
+                       help="feature the returned bucket is chosen by (default: word_count)")
+    serve.add_argument("--edges", type=parse_edges, default=list(WORD_COUNT_EDGES),
+                       help="comma-separated inclusive upper bounds of the buckets "
+                            f"(default: {','.join(map(str, WORD_COUNT_EDGES))})")
+    serve.add_argument("--vocabulary-limit", type=int, default=VOCABULARY_LIMIT,
+                       help="distinct tokens kept between requests, newer words are scored per request "
+                            f"(default: {VOCABULARY_LIMIT})")
+
+    rows = subparsers.add_parser("rows", help="index the essay CSV by row and print rows by number or at random")
+    rows.add_argument("row_numbers", type=int, nargs="*",
+                      help="rows to print, counted from 0 after the header")
+    rows.add_argument("--essays", default=defaults.essay_path,
+                      help=f"path to the essay CSV (default: {defaults.essay_path})")
+    rows.add_argument("--sample", type=int, default=0, help="print this many rows drawn at random")
+    rows.add_argument("--label", choices=["ai", "human"], help="only draw AI or only human essays with --sample")
+    rows.add_argument("--seed", type=int, default=defaults.seed,
+                      help=f"random seed for --sample (default: {defaults.seed})")
+    return parser
+
+
+def main(argv: list[str] | None = None):
+    args = build_parser().parse_args(argv)
+    config = PipelineConfig(data_dir=args.data_dir)
+    start_time = time()
+    if args.profile is None:
+        run_command(args, config)
+    else:
+        run_profiled(args.profile, lambda: run_command(args, config), config.profile_path, args.command)
+    end_time = time()
+    # The serve command's stdout carries its responses only
+    if args.command != "serve":
+        print(f"Execution time: {end_time - start_time} seconds")
+
+
+def run_command(args, config: PipelineConfig):
+    if args.command == "prepare":
+        from opted_reader import prepare_dictionary_data
+        from word_frequency import prepare_frequency_data
+        config.raw_frequency_path = args.raw_frequency
+        config.raw_dictionary_path = args.raw_dictionary
+        prepare_frequency_data(config.raw_frequency_path, config.frequency_csv_path, config.frequency_index_path)
+        prepare_dictionary_data(config.raw_dictionary_path, config.dictionary_csv_path, config.dictionary_index_path)
+
+    elif args.command == "ingest":
+        from essay_reader import read_essays
+        config.essay_path = args.essays
+        config.batch_size = args.batch_size
+        config.workers = args.workers
+        config.strict = args.tokenizer == "strict"
+        config.stats_mode = args.stats
+        config.seed = args.seed
+        config.output_format = args.output_format
+        config.sentence_data = args.sentence_data
+        config.writer_queue_size = args.writer_queue
+        config.resume = args.resume
+        config.feature_cache = args.feature_cache
+        config.correction = args.correction
+        config.full_population = args.full_population
+        config.dedupe = args.dedupe
+        config.near_duplicate_threshold = args.near_threshold
+        config.token_stats = args.token_stats
+        read_essays(config, run_inference=not args.skip_inference)
+
+    elif args.command == "infer":
+        from essay_stats import BatchManager
+        from inference import compare_batches
+        ai_batches = BatchManager.load(config.batch_state_path(True))
+        human_batches = BatchManager.load(config.batch_state_path(False))
+        compare_batches(ai_batches, human_batches, args.alpha, args.seed, config.results_path,
+                        args.workers, args.correction, args.full_population)
+
+    elif args.command == "resample":
+        from essay_stats import BatchManager
+        from resampling import resample_batches
+        ai_batches = BatchManager.load(config.batch_state_path(True))
+        human_batches = BatchManager.load(config.batch_state_path(False))
+        resample_batches(ai_batches, human_batches, args.method, args.replicates, args.alpha, args.seed,
+                         config.resampling_results_path, args.workers, args.correction, args.sample_size,
+                         args.confidence)
+
+    elif args.command == "stratify":
+        from feature_store import FeatureStore
+        from inference import compare_batches
+        ai_batches, human_batches = FeatureStore(config.feature_store_path).stratify(args.column, args.edges)
+        compare_batches(ai_batches, human_batches, args.alpha, args.seed, config.stratified_results_path,
+                        args.workers, args.correction, args.full_population)
+
+    elif args.command == "rows":
+        from csv_index import print_rows
+        config.essay_path = args.essays
+        label = None if args.label is None else args.label == "ai"
+        print_rows(config, args.row_numbers, args.sample, label, args.seed)
+
+    elif args.command == "serve":
+        from service import EssayScorer, serve_http, serve_stdio
+        config.strict = args.tokenizer == "strict"
+        scorer = EssayScorer(config, args.column, args.edges, args.vocabulary_limit)
+        if args.http:
+            serve_http(scorer, args.host, args.port)
+        else:
+            serve_stdio(scorer)
+
+
+if __name__ == "__main__":
+    main()
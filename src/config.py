@@ -0,0 +1,113 @@
+from dataclasses import dataclass
+from os import path
+
+STAT_MODES = ("exact", "sketch")
+OUTPUT_FORMATS = ("json", "ndjson", "npz")
+SENTENCE_DATA_MODES = ("full", "summary", "none")
+CORRECTIONS = ("holm", "bh", "none")
+RESAMPLING_METHODS = ("bootstrap", "permutation")
+# none keeps every row, exact drops repeated essay texts, near also drops MinHash near-duplicates
+DEDUPE_MODES = ("none", "exact", "near")
+# Names of the EssayFeatures fields, the columns of the feature store
+FEATURE_COLUMNS = ("word_count", "unique_word_count", "punctuation_count", "word_rarity_score",
+                   "average_sentence_length", "punctuation_per_word_ratio", "lexical_diversity",
+                   "dictionary_word_fraction", "misspelling_rate")
+# Upper bounds of the original word count stratifications: 0-50, 51-100, ..., 1001-plus
+WORD_COUNT_EDGES = (50, 100, 200, 500, 1000)
+# Distinct tokens serve keeps between requests; words first seen after that are scored per request
+VOCABULARY_LIMIT = 500_000
+
+
+@dataclass
+class PipelineConfig:
+    """
+    Paths and options shared by every stage of the pipeline. The defaults match the directory
+    layout described in the README, relative to src/.
+    """
+    essay_path: str = "../essay_data.csv"
+    data_dir: str = "data"
+    raw_frequency_path: str = "../word_frequency.txt"
+    raw_dictionary_path: str = "../OPTED-Dictionary.csv"
+    batch_size: int = 1000
+    workers: int = 1
+    strict: bool = True
+    stats_mode: str = "exact"
+    seed: int | None = None
+    output_format: str = "json"
+    sentence_data: str = "full"
+    writer_queue_size: int = 4
+    resume: bool = False
+    feature_cache: bool = False
+    correction: str = "none"
+    full_population: bool = False
+    dedupe: str = "none"
+    near_duplicate_threshold: float = 0.8
+    token_stats: bool = False
+    # Set by ingest when it continues an earlier run, so the NDJSON dumps are appended to
+    append_dumps: bool = False
+
+    def data_path(self, *parts: str) -> str:
+        return path.join(self.data_dir, *parts)
+
+    @property
+    def frequency_csv_path(self) -> str:
+        return self.data_path("word_frequency.csv")
+
+    @property
+    def frequency_index_path(self) -> str:
+        return self.data_path("word_frequency.idx")
+
+    @property
+    def dictionary_csv_path(self) -> str:
+        return self.data_path("opted_words.csv")
+
+    @property
+    def dictionary_index_path(self) -> str:
+        return self.data_path("opted_words.idx")
+
+    @property
+    def row_index_path(self) -> str:
+        return self.data_path("essay_rows.idx")
+
+    @property
+    def checkpoint_path(self) -> str:
+        return self.data_path("checkpoint.pkl")
+
+    @property
+    def feature_cache_path(self) -> str:
+        return self.data_path("feature_cache.pkl")
+
+    @property
+    def feature_store_path(self) -> str:
+        return self.data_path("features")
+
+    @property
+    def deduplicated_path(self) -> str:
+        return self.data_path("essays_deduplicated.csv")
+
+    @property
+    def dedupe_report_path(self) -> str:
+        return self.data_path("dedupe_report.json")
+
+    @property
+    def stratified_results_path(self) -> str:
+        return self.data_path("stratified_results.json")
+
+    @property
+    def profile_path(self) -> str:
+        return self.data_path("profile.json")
+
+    @property
+    def results_path(self) -> str:
+        return self.data_path("inference_results.json")
+
+    @property
+    def token_report_path(self) -> str:
+        return self.data_path("distinguishing_tokens.json")
+
+    @property
+    def resampling_results_path(self) -> str:
+        return self.data_path("resampling_results.json")
+
+    def batch_state_path(self, ai_author: bool) -> str:
+        return self.data_path("batches", f"{'ai' if ai_author else 'human'}_state.pkl")
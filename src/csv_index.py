@@ -0,0 +1,267 @@
+from checkpoint import file_fingerprint
+from config import PipelineConfig
+from csv import reader
+from io import StringIO
+from mmap import mmap, ACCESS_READ
+from os import path, replace
+from typing import Iterator
+import json
+import numpy as np
+import struct
+
+# Index layout: header, uint64 byte offset of every row plus the end of the last one, then an int8
+# label per row: 1 for an AI essay ("1.0"), 0 for a human one ("0.0") and -1 for anything else,
+# such as a blank line. The header records the size and a fingerprint of the CSV it was built from.
+ROW_INDEX_MAGIC = b"ROWIDX01"
+ROW_INDEX_HEADER = struct.Struct("<8sQQ16s")
+SCAN_CHUNK = 64 << 20
+QUOTE, NEWLINE, CARRIAGE_RETURN = ord('"'), ord("\n"), ord("\r")
+LABEL_PATTERNS = ((b",1.0", 1), (b',"1.0"', 1), (b",0.0", 0), (b',"0.0"', 0))
+
+
+def scan_row_starts(data: np.ndarray, start: int) -> np.ndarray:
+    """
+    Byte offsets of every row boundary after start, which must be one itself: each newline
+    preceded by an even number of quote characters, so quoted essays spanning several lines stay
+    whole. The end of the data counts as a boundary.
+    """
+    boundaries = []
+    quotes = 0
+    for chunk_start in range(start, len(data), SCAN_CHUNK):
+        chunk = data[chunk_start:chunk_start + SCAN_CHUNK]
+        quote_positions = np.flatnonzero(chunk == QUOTE)
+        newlines = np.flatnonzero(chunk == NEWLINE)
+        outside = (quotes + np.searchsorted(quote_positions, newlines)) % 2 == 0
+        boundaries.append(newlines[outside].astype(np.uint64) + np.uint64(chunk_start + 1))
+        quotes += len(quote_positions)
+    starts = np.concatenate(boundaries) if boundaries else np.empty(0, dtype=np.uint64)
+    if len(data) > start and (len(starts) == 0 or starts[-1] != len(data)):
+        starts = np.append(starts, np.uint64(len(data)))
+    return starts
+
+
+def row_labels(data: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Label of every row between consecutive offsets, read from the end of the row.
+    """
+    starts = offsets[:-1].astype(np.int64)
+    ends = offsets[1:].astype(np.int64)
+    for strip in (NEWLINE, CARRIAGE_RETURN):
+        last = np.maximum(ends - 1, 0)
+        ends = np.where((ends > starts) & (data[last] == strip), ends - 1, ends)
+    labels = np.full(len(starts), -1, dtype=np.int8)
+    for pattern, label in LABEL_PATTERNS:
+        matches = ends - starts >= len(pattern)
+        first = np.maximum(ends - len(pattern), 0)
+        for position, byte in enumerate(pattern):
+            matches &= data[first + position] == byte
+        labels[matches & (labels == -1)] = label
+    return labels
+
+
+def build_row_index(csv_path: str, index_path: str, previous: "CsvRows | None" = None):
+    """
+    Write the row offset index of the CSV at csv_path to index_path. When previous indexes an
+    earlier, shorter state of the same file, only the rows after it are scanned.
+    """
+    with open(csv_path, "rb") as file:
+        size = path.getsize(csv_path)
+        mapped = mmap(file.fileno(), 0, access=ACCESS_READ) if size else None
+    try:
+        data = np.frombuffer(mapped, dtype=np.uint8) if mapped is not None else np.empty(0, dtype=np.uint8)
+        if previous is not None and len(previous):
+            # The old last row may have been cut short by the end of the file, scan again from its start
+            kept = previous.offsets[:-1]
+            offsets = np.concatenate((kept, scan_row_starts(data, int(kept[-1]))))
+            labels = np.concatenate((previous.labels[:-1], row_labels(data, offsets[len(kept) - 1:])))
+        else:
+            # The first boundary ends the header
+            offsets = scan_row_starts(data, 0)
+            if len(offsets) == 0:
+                offsets = np.zeros(1, dtype=np.uint64)
+            labels = row_labels(data, offsets)
+        fingerprint = file_fingerprint(csv_path, size)
+        temp_path = index_path + ".tmp"
+        with open(temp_path, "wb") as index_file:
+            index_file.write(ROW_INDEX_HEADER.pack(ROW_INDEX_MAGIC, len(labels), size, fingerprint))
+            index_file.write(offsets.astype("<u8").tobytes())
+            index_file.write(labels.tobytes())
+        replace(temp_path, index_path)
+    finally:
+        # Drop the view of the map first, also when writing failed
+        data = None
+        if mapped is not None:
+            mapped.close()
+
+
+class CsvRows:
+    """
+    Random access to the rows of an essay CSV through its row offset index, which is built on first
+    use, extended when rows were appended and rebuilt when the file changed otherwise. Both files
+    are memory-mapped, so opening costs no parsing and any row is read in O(1). Row numbers count
+    from the first row after the header, like ingest. With build=False the index is never written:
+    unless it is current, FileNotFoundError is raised.
+    """
+    def __init__(self, csv_path: str, index_path: str, build: bool = True):
+        self.csv_path = csv_path
+        self.index_path = index_path
+        state = self.index_state()
+        if state != "current" and not build:
+            raise FileNotFoundError(f"No current row index of {csv_path} at {index_path}")
+        if state != "current":
+            previous = self.load_index() if state == "appended" else None
+            build_row_index(csv_path, index_path, previous)
+            if previous is not None:
+                previous.close()
+        self.load_index(self)
+
+    @classmethod
+    def existing(cls, csv_path: str, index_path: str) -> "CsvRows | None":
+        """
+        The rows of csv_path if index_path indexes it as it is now, else None rather than scanning
+        or extending the index.
+        """
+        try:
+            return cls(csv_path, index_path, build=False)
+        except FileNotFoundError:
+            return None
+
+    def index_state(self) -> str:
+        """
+        "current" when the index matches the CSV, "appended" when the CSV only grew since, else "stale".
+        """
+        if not path.exists(self.index_path):
+            return "stale"
+        with open(self.index_path, "rb") as index_file:
+            header = index_file.read(ROW_INDEX_HEADER.size)
+        if len(header) < ROW_INDEX_HEADER.size:
+            return "stale"
+        magic, _, size, fingerprint = ROW_INDEX_HEADER.unpack(header)
+        csv_size = path.getsize(self.csv_path)
+        if magic != ROW_INDEX_MAGIC or csv_size < size or file_fingerprint(self.csv_path, size) != fingerprint:
+            return "stale"
+        return "current" if csv_size == size else "appended"
+
+    def load_index(self, target: "CsvRows | None" = None) -> "CsvRows":
+        """
+        Map the index into target, by default a bare instance that only holds the index.
+        """
+        if target is None:
+            target = CsvRows.__new__(CsvRows)
+            target.csv_path, target.index_path = self.csv_path, self.index_path
+            target.data = None
+        with open(self.index_path, "rb") as index_file:
+            target.index_map = mmap(index_file.fileno(), 0, access=ACCESS_READ)
+        _, rows, size, _ = ROW_INDEX_HEADER.unpack_from(target.index_map, 0)
+        offsets_start = ROW_INDEX_HEADER.size
+        labels_start = offsets_start + (rows + 1) * 8
+        target.offsets = np.frombuffer(target.index_map, dtype="<u8", count=rows + 1, offset=offsets_start)
+        target.labels = np.frombuffer(target.index_map, dtype=np.int8, count=rows, offset=labels_start)
+        if target is self:
+            with open(self.csv_path, "rb") as file:
+                self.data = mmap(file.fileno(), 0, access=ACCESS_READ) if size else b""
+        return target
+
+    def close(self):
+        # The arrays are views of the maps, drop them first
+        self.offsets = self.labels = None
+        self.index_map.close()
+        if isinstance(self.data, mmap):
+            self.data.close()
+
+    def __len__(self):
+        return len(self.labels)
+
+    def body_offset(self) -> int:
+        return int(self.offsets[0])
+
+    def byte_range(self, row: int) -> tuple[int, int]:
+        return int(self.offsets[row]), int(self.offsets[row + 1])
+
+    def raw_row(self, row: int) -> bytes:
+        start, end = self.byte_range(row)
+        return self.data[start:end]
+
+    def row(self, row: int) -> list[str]:
+        """
+        The fields of a row, decoded like ingest decodes them. A blank row has none.
+        """
+        text = self.raw_row(row).decode("utf-8", errors="ignore")
+        return next(reader(StringIO(text)), [])
+
+    def rows(self, row_numbers) -> Iterator[tuple[int, list[str]]]:
+        for row in row_numbers:
+            yield int(row), self.row(int(row))
+
+    def with_label(self, ai_author: bool) -> np.ndarray:
+        """
+        Numbers of the rows labelled as AI or as human essays.
+        """
+        return np.flatnonzero(self.labels == (1 if ai_author else 0))
+
+    def iter_label(self, ai_author: bool):
+        """
+        (row number, fields) of every AI or every human essay, in file order.
+        """
+        return self.rows(self.with_label(ai_author))
+
+    def sample(self, count: int, seed: int | None = None, ai_author: bool | None = None) -> list[tuple[int, list[str]]]:
+        """
+        count distinct rows drawn at random, from all rows or from one label only, in file order.
+        """
+        population = np.arange(len(self)) if ai_author is None else self.with_label(ai_author)
+        chosen = np.random.default_rng(seed).choice(population, size=min(count, len(population)), replace=False)
+        return list(self.rows(np.sort(chosen)))
+
+    def row_at(self, offset: int) -> int:
+        """
+        Number of the row starting at offset, or of the first row after it.
+        """
+        return int(np.searchsorted(self.offsets, offset, side="left"))
+
+    def split(self, chunk_bytes: int, start: int | None = None) -> list[tuple[int, int]]:
+        """
+        Byte ranges of roughly chunk_bytes from start (by default the first row) to the end of the
+        file, each starting and ending on a row boundary, found by binary search in the index. The
+        same ranges as essay_reader.split_rows finds by scanning the file.
+        """
+        if start is None:
+            start = self.body_offset()
+        end = int(self.offsets[-1])
+        targets = np.arange(start + chunk_bytes, end, chunk_bytes, dtype=np.uint64)
+        cuts = self.offsets[np.minimum(np.searchsorted(self.offsets, targets, side="right"), len(self.offsets) - 1)]
+        boundaries = np.unique(np.concatenate(([start], cuts, [end])).astype(np.int64)).tolist()
+        return [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1)
+                if boundaries[i + 1] > boundaries[i]]
+
+    def partition(self, parts: int, start: int | None = None) -> list[tuple[int, int]]:
+        """
+        Split the rows from start on into parts byte ranges of about equal size.
+        """
+        if start is None:
+            start = self.body_offset()
+        return self.split(max(1, (int(self.offsets[-1]) - start) // parts), start)
+
+
+def print_rows(config: PipelineConfig, row_numbers: list[int], sample: int = 0, ai_author: bool | None = None,
+               seed: int | None = None):
+    """
+    Print the given rows of the essay CSV and sample rows drawn at random as JSON lines, building
+    or updating the row index first. Exits with an error message when a row number is out of range.
+    """
+    rows = CsvRows(config.essay_path, config.row_index_path)
+    try:
+        invalid = [row for row in row_numbers if not 0 <= row < len(rows)]
+        if invalid:
+            raise SystemExit(f"Row numbers out of range: {', '.join(map(str, invalid))} "
+                             f"({config.essay_path} has rows 0 to {len(rows) - 1})")
+        counts = np.bincount(rows.labels + 1, minlength=3)
+        print(f"{len(rows)} rows indexed: {counts[2]} AI, {counts[1]} human, {counts[0]} unlabelled")
+        selected = list(rows.rows(row_numbers))
+        if sample:
+            selected += rows.sample(sample, seed, ai_author)
+        for row, fields in selected:
+            start, end = rows.byte_range(row)
+            print(json.dumps({"row": row, "bytes": [start, end], "fields": fields}, ensure_ascii=False))
+    finally:
+        rows.close()
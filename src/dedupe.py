@@ -0,0 +1,225 @@
+from bisect import bisect_left
+from checkpoint import FeatureCache, file_fingerprint
+from config import PipelineConfig, WORD_COUNT_EDGES
+from csv import reader, writer
+from essay_stats import bucket_labels
+from os import path, replace
+from tokenizer import tokenize_essay
+from zlib import crc32
+import json
+import numpy as np
+import re
+
+# 64 MinHash values in 8 bands of 8: two essays share a band, and become candidates, with
+# probability 1 - (1 - J^8)^8 for Jaccard similarity J, 0.5 at J = 0.77 and 0.97 at J = 0.9
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 8
+# Essays are compared as sets of overlapping runs of this many words
+SHINGLE_WORDS = 3
+WORD_RE = re.compile(rb"\w+")
+SHINGLE_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9], dtype=np.uint64)
+
+
+class MinHasher:
+    """
+    MinHash signatures of essays over their word shingles, from MINHASH_PERMUTATIONS multiply-shift
+    hash functions. Words are lower-cased runs of ASCII letters, digits and underscores, so
+    punctuation and spacing changes do not matter. The fraction of equal signature values of two
+    essays estimates the Jaccard similarity of their shingle sets. Signatures only depend on the
+    seed, so they are the same in every run.
+    """
+    def __init__(self, permutations: int = MINHASH_PERMUTATIONS, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.multipliers = (rng.integers(0, 1 << 63, size=(permutations, 1), dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+        self.offsets = rng.integers(0, 1 << 63, size=(permutations, 1), dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        words = WORD_RE.findall(text.encode("utf-8").lower())
+        hashes = np.fromiter(map(crc32, words), dtype=np.uint64, count=len(words))
+        if len(hashes) > SHINGLE_WORDS:
+            windows = len(hashes) - SHINGLE_WORDS + 1
+            combined = np.zeros(windows, dtype=np.uint64)
+            for position in range(SHINGLE_WORDS):
+                combined += hashes[position:position + windows] * SHINGLE_MULTIPLIERS[position]
+            hashes = combined
+        return np.unique(hashes)
+
+    def signature(self, text: str) -> np.ndarray | None:
+        """
+        The essay's signature as uint32 values, or None for an essay without words.
+        """
+        shingles = self.shingles(text)
+        if len(shingles) == 0:
+            return None
+        hashes = self.multipliers * shingles
+        hashes += self.offsets
+        # The shift keeps the well-mixed high bits, and commutes with the minimum
+        return (hashes.min(axis=1) >> np.uint64(32)).astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """
+    LSH index of the signatures of the essays kept so far. An essay is a near-duplicate when it
+    shares at least one band with a kept essay whose signatures agree on at least threshold of
+    their values, so only essays in the same band buckets are ever compared.
+    """
+    def __init__(self, threshold: float, permutations: int = MINHASH_PERMUTATIONS, bands: int = LSH_BANDS):
+        if permutations % bands:
+            raise ValueError("permutations must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.band_rows = permutations // bands
+        self.band_multipliers = np.arange(1, 2 * self.band_rows, 2, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+        # band key -> position of the kept essay, or a list of positions once several share it
+        self.buckets: list[dict[int, int | list[int]]] = [{} for _ in range(bands)]
+        self.signatures = np.empty((1024, permutations), dtype=np.uint32)
+        self.count = 0
+
+    def band_keys(self, signature: np.ndarray) -> list[int]:
+        rows = signature.reshape(self.bands, self.band_rows).astype(np.uint64)
+        return (rows * self.band_multipliers).sum(axis=1).tolist()
+
+    def find(self, signature: np.ndarray, keys: list[int]) -> int | None:
+        """
+        Position of a kept essay that signature is a near-duplicate of, or None.
+        """
+        checked = set()
+        for bucket, key in zip(self.buckets, keys):
+            found = bucket.get(key)
+            if found is None:
+                continue
+            for position in (found if isinstance(found, list) else (found,)):
+                if position in checked:
+                    continue
+                checked.add(position)
+                if np.count_nonzero(self.signatures[position] == signature) >= self.threshold * len(signature):
+                    return position
+        return None
+
+    def add(self, signature: np.ndarray, keys: list[int]):
+        if self.count == len(self.signatures):
+            self.signatures = np.concatenate((self.signatures, np.empty_like(self.signatures)))
+        self.signatures[self.count] = signature
+        for bucket, key in zip(self.buckets, keys):
+            found = bucket.get(key)
+            if found is None:
+                bucket[key] = self.count
+            elif isinstance(found, list):
+                found.append(self.count)
+            else:
+                bucket[key] = [found, self.count]
+        self.count += 1
+
+
+class DedupeReport:
+    """
+    Rows read and dropped by a dedupe pass, per author and word count bucket.
+    """
+    def __init__(self):
+        self.essays = 0
+        self.kept = 0
+        self.labels = bucket_labels(WORD_COUNT_EDGES)
+        self.dropped = {author: {kind: [0] * len(self.labels) for kind in ("exact", "near")}
+                        for author in ("ai", "human")}
+
+    def drop(self, author: str, kind: str, word_count: int):
+        self.dropped[author][kind][bisect_left(WORD_COUNT_EDGES, word_count)] += 1
+
+    def to_json(self):
+        by_author = {}
+        for author, kinds in self.dropped.items():
+            by_author[author] = {
+                "exact": sum(kinds["exact"]),
+                "near": sum(kinds["near"]),
+                "by_bucket": {label: {"exact": exact, "near": near}
+                              for label, exact, near in zip(self.labels, kinds["exact"], kinds["near"])}
+            }
+        return {
+            "essays": self.essays,
+            "kept": self.kept,
+            "dropped": self.essays - self.kept,
+            "by_author": by_author
+        }
+
+
+def deduplicate(source_path: str, output_path: str, mode: str = "near", threshold: float = 0.8,
+                strict: bool = True, seed: int = 0) -> DedupeReport:
+    """
+    Copy the essay CSV at source_path to output_path without its duplicate rows, keeping the first
+    occurrence of each essay. exact mode drops rows whose text has the same content hash as an
+    earlier row, near mode also drops rows whose MinHash signature matches an earlier kept row's on
+    at least threshold of its values. The word count bucket of each dropped essay is found by
+    tokenizing it the way ingest would.
+    """
+    report = DedupeReport()
+    seen: set[bytes] = set()
+    hasher = MinHasher(seed=seed) if mode == "near" else None
+    index = NearDuplicateIndex(threshold) if mode == "near" else None
+    temp_path = output_path + ".tmp"
+    with open(source_path, "r", encoding="utf-8", errors="ignore", newline="") as source, \
+            open(temp_path, "w", encoding="utf-8", newline="") as output:
+        csv_reader = reader(source)
+        csv_writer = writer(output, lineterminator="\n")
+        csv_writer.writerow(next(csv_reader))
+        for row in csv_reader:
+            report.essays += 1
+            kind = None
+            keys = signature = None
+            if row:
+                key = FeatureCache.key(row[0])
+                if key in seen:
+                    kind = "exact"
+                else:
+                    seen.add(key)
+                    if index is not None:
+                        signature = hasher.signature(row[0])
+                        if signature is not None:
+                            keys = index.band_keys(signature)
+                            if index.find(signature, keys) is not None:
+                                kind = "near"
+            if kind is None:
+                if signature is not None:
+                    index.add(signature, keys)
+                csv_writer.writerow(row)
+                report.kept += 1
+            else:
+                ai_author = len(row) > 1 and row[1] == "1.0"
+                word_count = tokenize_essay(row[0], ai_author, strict).word_count()
+                report.drop("ai" if ai_author else "human", kind, word_count)
+    replace(temp_path, output_path)
+    return report
+
+
+def deduplicate_essays(config: PipelineConfig) -> str:
+    """
+    Run the dedupe pass configured by config.dedupe over config.essay_path, unless the output of a
+    pass with the same options over the same file is already in the data directory, and return the
+    path of the deduplicated CSV. The report is written next to it.
+    """
+    size = path.getsize(config.essay_path)
+    source = {
+        "path": path.abspath(config.essay_path),
+        "size": size,
+        "fingerprint": file_fingerprint(config.essay_path, size).hex(),
+        "mode": config.dedupe,
+        "threshold": config.near_duplicate_threshold,
+        "strict": config.strict
+    }
+    if path.exists(config.deduplicated_path) and path.exists(config.dedupe_report_path):
+        with open(config.dedupe_report_path, encoding="utf-8") as report_file:
+            previous = json.load(report_file)
+        if previous.get("source") == source:
+            print(f"Reusing the deduplicated essays in {config.deduplicated_path}")
+            return config.deduplicated_path
+
+    report = deduplicate(config.essay_path, config.deduplicated_path, config.dedupe,
+                         config.near_duplicate_threshold, config.strict)
+    results = {"source": source, **report.to_json()}
+    temp_path = config.dedupe_report_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as report_file:
+        json.dump(results, report_file, indent=2)
+    replace(temp_path, config.dedupe_report_path)
+    print(f"Dropped {results['dropped']} of {results['essays']} essays as duplicates "
+          f"(AI: {results['by_author']['ai']['exact']} exact, {results['by_author']['ai']['near']} near; "
+          f"human: {results['by_author']['human']['exact']} exact, {results['by_author']['human']['near']} near)")
+    return config.deduplicated_path
@@ -1,27 +1,103 @@
+from array import array
+from itertools import chain
+
+
+class Vocabulary:
+    """
+    Integer IDs for every word and punctuation mark seen by this process, so sentences can store
+    IDs instead of their own copies of each string. IDs are handed out in order of first sight and
+    are only meaningful within the process that assigned them.
+
+    With a limit, only the first limit tokens are kept for good. Tokens first seen after that get
+    overflow IDs from limit on, which stay valid until release_overflow hands them back, so a
+    long-running process scoring ever new words does not grow without bound.
+    """
+    __slots__ = ("ids", "tokens", "limit")
+
+    def __init__(self, limit: int | None = None):
+        self.ids: TokenIds = TokenIds(self)
+        self.tokens: list[str] = []
+        self.limit = limit
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def token_id(self, token: str) -> int:
+        return self.ids[token]
+
+    def release_overflow(self) -> int:
+        """
+        Forget every token past the limit and return the number of tokens kept. Their IDs are handed
+        out again, so nothing holding an overflow ID may outlive this call.
+        """
+        if self.limit is None or len(self.tokens) <= self.limit:
+            return len(self.tokens)
+        ids = self.ids
+        for token in self.tokens[self.limit:]:
+            del ids[token]
+        del self.tokens[self.limit:]
+        return self.limit
+
+
+class TokenIds(dict):
+    """
+    Token to ID map that assigns the next ID to a token it has not seen.
+    """
+    __slots__ = ("vocabulary",)
+
+    def __init__(self, vocabulary: Vocabulary):
+        super().__init__()
+        self.vocabulary = vocabulary
+
+    def __missing__(self, token: str) -> int:
+        token_id = len(self.vocabulary.tokens)
+        self.vocabulary.tokens.append(token)
+        self[token] = token_id
+        return token_id
+
+
+_vocabulary = Vocabulary()
+
+
+def get_vocabulary() -> Vocabulary:
+    return _vocabulary
+
 
 class Words:
-    def __init__(self):
-        self.word_count = 0
-        self.unique_word_count = 0
-        self.words: dict[str,int] = {}
-        self.punctuation: dict[str,int] = {}
-    
-    def add_word(self, word:str):
-        if self.words.get(word) == None:
-            self.words[word] = 1
-            self.unique_word_count += 1
-        else:
-            self.words[word] = self.words[word] + 1
-        self.word_count += 1
-    
-    def add_punctuation(self, punctuation:str):
-        if self.punctuation.get(punctuation) == None:
-            self.punctuation[punctuation] = 1
-        self.punctuation[punctuation] = self.punctuation[punctuation] + 1
+    """
+    One sentence: the vocabulary IDs of its distinct words and punctuation marks in order of first
+    appearance, with the count of each, in compact typed arrays. The words and punctuation dicts
+    are only built on request, e.g. for to_json. EssayData keeps the arrays of all its sentences
+    and hands out Words on request.
+    """
+    __slots__ = ("word_count", "unique_word_count", "word_ids", "word_counts", "punctuation_ids",
+                 "punctuation_counts")
+
+    def __init__(self, word_count: int = 0, word_ids: array | None = None, word_counts: array | None = None,
+                 punctuation_ids: array | None = None, punctuation_counts: array | None = None):
+        self.word_count = word_count
+        self.word_ids = word_ids if word_ids is not None else array("I")
+        self.word_counts = word_counts if word_counts is not None else array("I")
+        self.unique_word_count = len(self.word_ids)
+        self.punctuation_ids = punctuation_ids if punctuation_ids is not None else array("I")
+        self.punctuation_counts = punctuation_counts if punctuation_counts is not None else array("I")
+
+    @property
+    def words(self) -> dict[str, int]:
+        tokens = _vocabulary.tokens
+        return {tokens[token_id]: count for token_id, count in zip(self.word_ids, self.word_counts)}
+
+    @property
+    def punctuation(self) -> dict[str, int]:
+        tokens = _vocabulary.tokens
+        return {tokens[token_id]: count for token_id, count in zip(self.punctuation_ids, self.punctuation_counts)}
+
+    def punctuation_count(self) -> int:
+        return sum(self.punctuation_counts)
 
     def __str__(self):
         return f"Words( word count: {self.word_count}, unique_word_count: {self.unique_word_count}, data: {self.words}, punctuation: {self.punctuation} )"
-    
+
     def to_json(self):
         return {
             "word_count": self.word_count,
@@ -30,19 +106,74 @@ class Words:
             "punctuation": self.punctuation
         }
 
+    def summary_json(self):
+        return {
+            "word_count": self.word_count,
+            "unique_word_count": self.unique_word_count,
+            "punctuation_count": self.punctuation_count()
+        }
+
+
 class EssayData:
+    """
+    A parsed essay. The distinct word and punctuation IDs of every sentence and their counts are
+    stored back to back in four typed arrays for the whole essay, with the word count and the
+    number of distinct words and punctuation marks of each sentence alongside, so a sentence costs
+    no objects of its own. sentences builds a Words per sentence on request.
+    """
+    __slots__ = ("ai_author", "word_ids", "word_counts", "punctuation_ids", "punctuation_counts",
+                 "sentence_word_counts", "sentence_unique_words", "sentence_punctuation_marks")
+
     def __init__(self, ai_author: bool):
         self.ai_author: bool = ai_author
-        self.sentences: list[Words] = []
+        self.word_ids = array("I")
+        self.word_counts = array("I")
+        self.punctuation_ids = array("I")
+        self.punctuation_counts = array("I")
+        self.sentence_word_counts = array("I")
+        self.sentence_unique_words = array("I")
+        self.sentence_punctuation_marks = array("I")
+
+    def set_sentences(self, sentences: list[tuple[int, dict[str, int], dict[str, int]]]):
+        """
+        Store the essay's sentences, each given as its word count, the count of each distinct word
+        in order of first appearance and the punctuation counts. Every token is looked up in the
+        vocabulary in one go for the whole essay.
+        """
+        token_id = _vocabulary.ids.__getitem__
+        self.word_ids = array("I", map(token_id, chain.from_iterable(words for _, words, _ in sentences)))
+        self.word_counts = array("I", chain.from_iterable(words.values() for _, words, _ in sentences))
+        self.punctuation_ids = array("I", map(token_id, chain.from_iterable(marks for _, _, marks in sentences)))
+        self.punctuation_counts = array("I", chain.from_iterable(marks.values() for _, _, marks in sentences))
+        self.sentence_word_counts = array("I", [word_count for word_count, _, _ in sentences])
+        self.sentence_unique_words = array("I", [len(words) for _, words, _ in sentences])
+        self.sentence_punctuation_marks = array("I", [len(marks) for _, _, marks in sentences])
+
+    @property
+    def sentences(self) -> list[Words]:
+        sentences = []
+        word_start = punctuation_start = 0
+        for word_count, unique_words, punctuation_marks in zip(self.sentence_word_counts, self.sentence_unique_words,
+                                                               self.sentence_punctuation_marks):
+            word_end = word_start + unique_words
+            punctuation_end = punctuation_start + punctuation_marks
+            sentences.append(Words(word_count, self.word_ids[word_start:word_end], self.word_counts[word_start:word_end],
+                                   self.punctuation_ids[punctuation_start:punctuation_end],
+                                   self.punctuation_counts[punctuation_start:punctuation_end]))
+            word_start, punctuation_start = word_end, punctuation_end
+        return sentences
+
+    def sentence_count(self) -> int:
+        return len(self.sentence_word_counts)
+
+    def word_count(self) -> int:
+        return sum(self.sentence_word_counts)
 
     def __str__(self):
-        return f"EssayData( word count: {self.words.word_count}, unique_word_count: {self.words.unique_word_count}, sentence_count: {len(self.sentences)}, sentences: {self.sentences}, words: {self.words} )"
+        return f"EssayData( word count: {self.word_count()}, sentence_count: {self.sentence_count()}, sentences: {self.sentences} )"
 
     def to_json(self):
         return {
             "ai_author": self.ai_author,
             "sentence_data": [sentence.to_json() for sentence in self.sentences]
         }
-
-
-
@@ -1,105 +1,467 @@
 from csv import reader
-from essay_data import EssayData, Words
-from essay_stats import EssayStats, EssayBatchStats, BatchManager
-from time import time
+from io import StringIO, SEEK_END
+from itertools import islice
+from multiprocessing import Pool
+from checkpoint import FeatureCache, IngestCheckpoint, feature_cache_fingerprint
+from config import PipelineConfig
+from csv_index import CsvRows
+from dataclasses import replace
+from dedupe import deduplicate_essays
+from essay_data import EssayData
+from feature_store import FeatureRows, FeatureStoreWriter
+from instrumentation import get_timers, peak_rss_mb
+from essay_stats import EssayFeatures, EssayStats, BatchManager, word_totals
+from time import time, perf_counter
 from inference import compare_batches
-import json
-
-PATH = "../essay_data.csv"
-BATCH_SIZE = 1000
-
-PUNCTUATION = [
-    "\"", "'", ",", ".", "!", "?", "/", "-", ":", ";", "(", ")", "[", "]", "{", "}", "<", ">", "@", "#", "$", "%", "^", "&", "*",
-    "_", "+", "=", "~", "`", "|", "\\", "«", "»", "“", "”", "‘", "’", "•", "…"
-]
-
-def read_essays(file_path):
-    with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
-        csv_reader = reader(file)
-        next(csv_reader)
-        ai_start = 0
-        ai_end = 0
-        human_start = 0
-        human_end = 0
-        essay_count = 0
-        ai_dump: list[EssayStats] = []
-        ai_batches = BatchManager(True)
-        human_dump: list[EssayStats] = []
-        human_batches = BatchManager(False)
-        for row in csv_reader:
+from opted_reader import configure_default_dictionary, get_default_dictionary
+from token_stats import CorpusTokenStats
+from tokenizer import tokenize_essay
+from word_frequency import configure_default_manager, get_default_manager
+from writers import make_writer, ndjson_sizes, next_dump_counters, truncate_ndjson
+import sys
+
+SHARDS_PER_WORKER = 4
+SHARD_SCAN_CHUNK = 1 << 20
+SEGMENT_BYTES = 32 << 20
+# Essays parsed before their words are scored together
+SCORING_CHUNK = 512
+
+# Loaded by read_essays before any worker pool is created, so forked workers share it
+_feature_cache: FeatureCache | None = None
+
+def read_essays(config: PipelineConfig | None = None, run_inference: bool = True) -> tuple[BatchManager, BatchManager]:
+    """
+    Parse and score every essay in config.essay_path, write the per-essay dumps, batch files and
+    saved batch state under config.data_dir and, unless run_inference is False, run the inference
+    tests. Returns the AI and human BatchManagers.
+
+    The scalar features of every essay are also appended to the feature store under
+    config.data_dir, so the essays can be stratified again later without another ingest.
+
+    With config.resume a checkpoint is saved as the CSV is worked through, and a later run with the
+    same options continues after the last one. With config.feature_cache the features of every essay
+    are cached by a hash of its text, and only essays missing from the cache are parsed again.
+    With config.token_stats the words and punctuation of every essay are counted per author and
+    bucket, and the tokens that distinguish AI from human essays are written to a report.
+
+    Unless config.dedupe is "none", duplicate essays are dropped first and everything else works on
+    the deduplicated copy of the CSV in config.data_dir.
+    """
+    global _feature_cache
+    if config is None:
+        config = PipelineConfig()
+    configure_default_manager(config.frequency_index_path, config.frequency_csv_path)
+    configure_default_dictionary(config.dictionary_index_path, config.dictionary_csv_path)
+    if config.dedupe != "none":
+        with get_timers().stage("dedupe"):
+            config = replace(config, essay_path=deduplicate_essays(config))
+    _feature_cache = None
+    if config.feature_cache:
+        # Opening the manager and the dictionary builds their indexes if they do not exist yet
+        get_default_manager()
+        get_default_dictionary()
+        fingerprint = feature_cache_fingerprint(config.strict, config.frequency_index_path,
+                                                config.dictionary_index_path)
+        _feature_cache = FeatureCache(config.feature_cache_path, fingerprint).load()
+        if config.token_stats:
+            print("Token stats need every essay parsed, so the feature cache is only added to in this run")
+
+    checkpoint = None
+    start_offset = None
+    if config.resume:
+        checkpoint = IngestCheckpoint.load(config.checkpoint_path, config.essay_path, config.strict, config.stats_mode,
+                                           config.token_stats)
+    if checkpoint is None:
+        checkpoint = IngestCheckpoint(config.essay_path, config.strict, config.stats_mode,
+                                      BatchManager(True, config.stats_mode, seed=config.seed),
+                                      BatchManager(False, config.stats_mode, seed=config.seed),
+                                      CorpusTokenStats() if config.token_stats else None)
+    else:
+        print(f"Resuming after {checkpoint.essay_count} essays")
+        start_offset = checkpoint.offset
+        # Records streamed after the checkpoint was saved are written again by this run
+        if getattr(checkpoint, "dump_sizes", None) is not None:
+            truncate_ndjson(config.data_dir, checkpoint.dump_sizes)
+    # Essays dumped by an earlier run are not dumped again when resuming or found in the feature cache,
+    # so their NDJSON records are kept
+    config = replace(config, append_dumps=start_offset is not None
+                     or (_feature_cache is not None and len(_feature_cache.entries) > 0))
+    if start_offset is None and config.append_dumps:
+        # A feature cache rerun numbers its JSON and NPZ dumps, and its shards, after the earlier ones
+        checkpoint.dump_counters, checkpoint.shards_done = next_dump_counters(config.data_dir)
+
+    start = time()
+    store = FeatureStoreWriter(config.feature_store_path, checkpoint.feature_rows)
+    try:
+        if config.workers > 1:
+            essay_count = read_essays_parallel(config, checkpoint, start_offset, store)
+        else:
+            essay_count = read_essays_serial(config, checkpoint, start_offset, store)
+    finally:
+        store.close()
+    elapsed = time() - start
+    if _feature_cache is not None:
+        _feature_cache.save()
+
+    ai_batches = checkpoint.ai_batches
+    human_batches = checkpoint.human_batches
+    with get_timers().stage("batch_files"):
+        ai_batches.write_files(config.data_dir)
+        human_batches.write_files(config.data_dir)
+        ai_batches.save(config.batch_state_path(True))
+        human_batches.save(config.batch_state_path(False))
+    if checkpoint.token_stats is not None:
+        with get_timers().stage("token_report"):
+            checkpoint.token_stats.write_report(config.token_report_path)
+    rss = peak_rss_mb()
+    rss_note = f", peak RSS {rss['self']:.0f} MB (workers {rss['children']:.0f} MB)" if rss else ""
+    print(f"Processed {essay_count} essays with {config.workers} worker(s) ({essay_count / max(elapsed, 1e-9):.1f} essays/sec), "
+          f"{checkpoint.essay_count} in total{rss_note}")
+    if run_inference:
+        compare_batches(ai_batches, human_batches, seed=config.seed, results_path=config.results_path,
+                        workers=config.workers, correction=config.correction,
+                        full_population=config.full_population)
+    return ai_batches, human_batches
+
+
+class EssayIngester:
+    """
+    Parses CSV rows into a pair of BatchManagers and hands the per-essay stats to the configured
+    writer every config.batch_size essays. Essays found in the feature cache are added to the
+    batches without being parsed or dumped again, unless token stats are collected, which need
+    every essay parsed.
+    """
+    def __init__(self, config: PipelineConfig, ai_batches: BatchManager, human_batches: BatchManager,
+                 dump_prefix: str = "", dump_counters: dict[str, tuple[int, int]] | None = None,
+                 cache: FeatureCache | None = None, token_stats: CorpusTokenStats | None = None):
+        self.config = config
+        self.batches = {"ai": ai_batches, "human": human_batches}
+        self.dump_prefix = dump_prefix
+        self.essay_count = 0
+        # author -> (number of the first essay in the pending dump, number of the last essay parsed)
+        self.dump_counters = dict(dump_counters) if dump_counters else {"ai": (0, 0), "human": (0, 0)}
+        self.dumps: dict[str, list[EssayStats]] = {"ai": [], "human": []}
+        self.cache = cache
+        self.token_stats = token_stats
+        self.new_features = {}
+        self.feature_rows = FeatureRows()
+        self.writer = make_writer(config.data_dir, config.output_format, config.sentence_data,
+                                  config.writer_queue_size, dump_prefix, config.append_dumps)
+
+    def ingest(self, csv_rows):
+        rows = get_timers().iterate("csv_read", csv_rows)
+        while chunk := list(islice(rows, SCORING_CHUNK)):
+            self.ingest_chunk(chunk)
+
+    def ingest_chunk(self, rows: list[list[str]]):
+        """
+        Parse a chunk of rows, score the words of all its new essays in one go, then route and
+        dump them in row order. An error in any step skips only its own row.
+        """
+        timers = get_timers()
+        # (ai_author, cache key, cached features, parsed essay, error) per row
+        parsed = []
+        essays: list[EssayData] = []
+        for row in rows:
             try:
                 ai_author = row[1] == "1.0"
-                parsed_essay = parse_essay(row[0], ai_author)
-                essay_stats = EssayStats(parsed_essay)
-                essay_count += 1
-                if ai_author:
-                    ai_end += 1
-                    ai_dump.append(essay_stats)
-                    ai_batches.add_essay(essay_stats)
+                key = None
+                features = None
+                essay = None
+                if self.cache is not None:
+                    start = perf_counter()
+                    key = FeatureCache.key(row[0])
+                    if self.token_stats is None:
+                        features = self.cache.get(key)
+                    timers.add("feature_cache_lookup", perf_counter() - start)
+                if features is None:
+                    start = perf_counter()
+                    essay = parse_essay(row[0], ai_author, self.config.strict)
+                    timers.add("parse_essay", perf_counter() - start)
+                    essays.append(essay)
+                parsed.append((ai_author, key, features, essay, None))
+            except Exception as e:
+                parsed.append((None, None, None, None, e))
+        with timers.stage("word_scoring"):
+            totals = iter(word_totals(essays).tolist())
+        # Essays that made it through parsing and scoring, with their features, for the token stats
+        scored: list[EssayData] = []
+        scored_features: list[EssayFeatures] = []
+
+        for ai_author, key, features, essay, error in parsed:
+            try:
+                if error is not None:
+                    raise error
+                author = "ai" if ai_author else "human"
+                if features is None:
+                    start = perf_counter()
+                    essay_stats = EssayStats(essay, next(totals))
+                    timers.add("essay_stats", perf_counter() - start)
+                    features = essay_stats.features
+                    scored.append(essay)
+                    scored_features.append(features)
+                    if key is not None:
+                        self.new_features[key] = features
+                    dump_start, dump_end = self.dump_counters[author]
+                    self.dump_counters[author] = (dump_start, dump_end + 1)
+                    self.dumps[author].append(essay_stats)
                 else:
-                    human_end += 1
-                    human_dump.append(essay_stats)
-                    human_batches.add_essay(essay_stats)
+                    timers.count("feature_cache_hits")
+                self.essay_count += 1
+                timers.count("essays")
+                start = perf_counter()
+                self.batches[author].add_features(features)
+                timers.add("bucket_routing", perf_counter() - start)
+                self.feature_rows.add(features, ai_author)
             except Exception as e:
-                print(f"Error parsing row {essay_count}: {e.with_traceback(None)}")
-                essay_count += 1
+                print(f"Error parsing row {self.dump_prefix}{self.essay_count}: {e.with_traceback(None)}")
+                self.essay_count += 1
+                timers.count("essays")
+                timers.count("parse_errors")
                 continue
-            
-            if len(ai_dump) >= BATCH_SIZE:
-                dump_data = [{"ai_author": ai_author, "essay": current.to_json()} for current in ai_dump]
-                with open(f"data/ai/essay_{ai_start}_{ai_end}.json", "w", encoding="utf-8") as essay_dump_file:
-                    json.dump(dump_data, essay_dump_file, ensure_ascii=False, indent=2)
-                ai_start = ai_end + 1
-                ai_dump = []
-            if len(human_dump) >= BATCH_SIZE:
-                dump_data = [{"ai_author": ai_author, "essay": current.to_json()} for current in human_dump]
-                with open(f"data/human/essay_{human_start}_{human_end}.json", "w", encoding="utf-8") as essay_dump_file:
-                    json.dump(dump_data, essay_dump_file, ensure_ascii=False, indent=2)
-                human_start = human_end + 1
-                human_dump = []
-        ai_batches.write_files()
-        human_batches.write_files()
-        compare_batches(ai_batches, human_batches)
-        print(f"Processed {essay_count} essays")
-                
-
-
-def parse_essay(essay: str, ai_author: bool) -> EssayData:
-    sentences = essay.split(".")
-    essay_data = EssayData(ai_author)
-    skipped = 0
-    for sentence in sentences:
-        essay_sentence = Words()
-        words = sentence.split()
-        for word in words:
-            word = word.lower()
-            if word in PUNCTUATION:
-                essay_sentence.add_punctuation(word)
-            elif word.isalpha():
-                # Word is a word
-                essay_sentence.add_word(word)
-            elif word.isnumeric():
-                # Word is a number
-                essay_sentence.add_word(word)
-            else:
-                # Unidentified case
-                for punc in PUNCTUATION:
-                    if punc in word:
-                        essay_sentence.add_punctuation(punc)
-                        word = word.replace(punc, "")
-                essay_sentence.add_word(word)
-        if essay_sentence.word_count > 0:
-            essay_sentence.add_punctuation(".")
-            if skipped > 0:
-                for _ in range(skipped):
-                    essay_sentence.add_punctuation(".")
-            essay_data.sentences.append(essay_sentence)
-            skipped = 0
-        else:
-            skipped += 1
-    return essay_data
 
-start_time = time()
-read_essays(PATH)
-end_time = time()
-print(f"Execution time: {end_time - start_time} seconds")
+            if len(self.dumps[author]) >= self.config.batch_size:
+                self.write_dump(author)
+        if self.token_stats is not None:
+            with timers.stage("token_stats"):
+                self.token_stats.add_essays(scored, scored_features)
+
+    def write_dump(self, author: str):
+        dump_start, dump_end = self.dump_counters[author]
+        # With a background writer this is only the time spent waiting for room in its queue
+        with get_timers().stage("dump_handoff"):
+            self.writer.write_batch(author, dump_start, dump_end, self.dumps[author])
+        self.dump_counters[author] = (dump_end + 1, dump_end)
+        self.dumps[author] = []
+
+    def flush(self):
+        """
+        Write out the partially filled dumps and wait until everything handed to the writer is on disk.
+        """
+        for author, dump in self.dumps.items():
+            if dump:
+                self.write_dump(author)
+        self.writer.sync()
+
+    def close(self):
+        self.writer.close()
+
+
+def read_rows(file_path, start: int, end: int):
+    """
+    CSV rows in bytes [start, end) of the file, which must both fall on row boundaries.
+    """
+    with get_timers().stage("csv_read"), open(file_path, "rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode("utf-8", errors="ignore")
+    return reader(StringIO(text))
+
+
+def read_essays_serial(config: PipelineConfig, checkpoint: IngestCheckpoint, start_offset: int | None,
+                       store: FeatureStoreWriter) -> int:
+    """
+    Parse the CSV from start_offset on in this process, SEGMENT_BYTES at a time, appending to the
+    feature store and, when config.resume is set, checkpointing after every segment. Returns the
+    number of essays processed.
+    """
+    ingester = EssayIngester(config, checkpoint.ai_batches, checkpoint.human_batches,
+                             dump_counters=checkpoint.dump_counters, cache=_feature_cache,
+                             token_stats=checkpoint.token_stats)
+    base_count = checkpoint.essay_count
+    try:
+        for start, end in split_essay_rows(config, SEGMENT_BYTES, start_offset):
+            ingester.ingest(read_rows(config.essay_path, start, end))
+            with get_timers().stage("feature_store_append"):
+                store.append(ingester.feature_rows)
+            ingester.feature_rows = FeatureRows()
+            if config.resume:
+                ingester.flush()
+                if _feature_cache is not None:
+                    _feature_cache.update(ingester.new_features)
+                    _feature_cache.save()
+                    ingester.new_features = {}
+                checkpoint.essay_count = base_count + ingester.essay_count
+                checkpoint.dump_counters = dict(ingester.dump_counters)
+                checkpoint.feature_rows = store.rows
+                checkpoint.dump_sizes = ndjson_sizes(config.data_dir)
+                checkpoint.save(config.checkpoint_path, end)
+        ingester.flush()
+    finally:
+        ingester.close()
+    if _feature_cache is not None:
+        _feature_cache.update(ingester.new_features)
+    checkpoint.essay_count = base_count + ingester.essay_count
+    checkpoint.feature_rows = store.rows
+    return ingester.essay_count
+
+
+def split_essay_rows(config: PipelineConfig, chunk_bytes: int, start: int | None = None) -> list[tuple[int, int]]:
+    """
+    split_rows on the essay CSV, through its row index when one was built with the rows command.
+    """
+    index = CsvRows.existing(config.essay_path, config.row_index_path)
+    try:
+        return split_rows(config.essay_path, chunk_bytes, start, index)
+    finally:
+        if index is not None:
+            index.close()
+
+
+def find_shard_offsets(file_path, shard_count: int, start: int | None = None,
+                       index: CsvRows | None = None) -> list[tuple[int, int]]:
+    """
+    Split the CSV body from start (by default everything after the header) into shard_count roughly
+    equal byte ranges that start and end on row boundaries.
+    """
+    if index is not None:
+        return index.partition(shard_count, start)
+    if start is None:
+        start = body_offset(file_path)
+    with open(file_path, "rb") as file:
+        file.seek(0, SEEK_END)
+        file_size = file.tell()
+    return split_rows(file_path, max(1, (file_size - start) // shard_count), start)
+
+
+def body_offset(file_path) -> int:
+    """
+    Byte offset of the first row after the CSV header.
+    """
+    with open(file_path, "rb") as file:
+        file.readline()
+        return file.tell()
+
+
+def split_rows(file_path, chunk_bytes: int, start: int | None = None,
+               index: CsvRows | None = None) -> list[tuple[int, int]]:
+    """
+    Split the CSV from start (by default everything after the header) to the end of the file into
+    byte ranges of roughly chunk_bytes each. Every range starts and ends on a row boundary: a newline
+    preceded by an even number of quote characters, so quoted essays that span several lines are
+    never cut in half. start itself must be a row boundary. With the row index of the file, the
+    boundaries are looked up in it instead of scanning the file.
+    """
+    if index is not None:
+        return index.split(chunk_bytes, start)
+    if start is None:
+        start = body_offset(file_path)
+    with open(file_path, "rb") as file:
+        file.seek(0, SEEK_END)
+        file_size = file.tell()
+        targets = list(range(start + chunk_bytes, file_size, chunk_bytes))
+
+        boundaries = [start]
+        quotes = 0
+        position = start
+        file.seek(start)
+        target_index = 0
+        while target_index < len(targets):
+            chunk = file.read(SHARD_SCAN_CHUNK)
+            if not chunk:
+                break
+            chunk_start = position
+            position += len(chunk)
+            offset = 0
+            while target_index < len(targets):
+                search_from = max(offset, targets[target_index] - chunk_start)
+                if search_from >= len(chunk):
+                    break
+                newline = chunk.find(b"\n", search_from)
+                if newline == -1:
+                    break
+                quotes += chunk.count(b'"', offset, newline)
+                offset = newline
+                if quotes % 2 == 0:
+                    boundaries.append(chunk_start + newline + 1)
+                    while target_index < len(targets) and targets[target_index] <= chunk_start + newline:
+                        target_index += 1
+                else:
+                    offset = newline + 1
+            quotes += chunk.count(b'"', offset)
+        boundaries.append(file_size)
+
+    return [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1)
+            if boundaries[i + 1] > boundaries[i]]
+
+
+def read_shard(config: PipelineConfig, shard_index: int, start: int, end: int):
+    """
+    Worker entry point for read_essays_parallel. Parses the rows in bytes [start, end) of the CSV
+    into a fresh pair of BatchManagers, and returns them with the essay count, the features of
+    essays that were not in the feature cache, the rows for the feature store and the shard's
+    stage timers.
+    """
+    configure_default_manager(config.frequency_index_path, config.frequency_csv_path)
+    configure_default_dictionary(config.dictionary_index_path, config.dictionary_csv_path)
+    # A worker handles several shards and starts out with a copy of the parent's timers
+    get_timers().reset()
+    ai_batches = BatchManager(True, config.stats_mode, seed=config.seed)
+    human_batches = BatchManager(False, config.stats_mode, seed=config.seed)
+    token_stats = CorpusTokenStats() if config.token_stats else None
+    ingester = EssayIngester(config, ai_batches, human_batches, f"shard{shard_index}_", cache=_feature_cache,
+                             token_stats=token_stats)
+    try:
+        ingester.ingest(read_rows(config.essay_path, start, end))
+        ingester.flush()
+    finally:
+        ingester.close()
+    return ai_batches, human_batches, ingester.essay_count, ingester.new_features, ingester.feature_rows, \
+        token_stats, get_timers().snapshot()
+
+
+def read_shard_job(job: tuple):
+    return read_shard(*job)
+
+
+def read_essays_parallel(config: PipelineConfig, checkpoint: IngestCheckpoint, start_offset: int | None,
+                         store: FeatureStoreWriter) -> int:
+    """
+    Parse and score the CSV from start_offset on in byte-range shards across a pool of config.workers
+    processes. Shard results are merged back in file order, so the batches and the feature store
+    match a serial run, and
+    a checkpoint is saved after each merged shard when config.resume is set. Returns the number of
+    essays processed.
+    """
+    index = CsvRows.existing(config.essay_path, config.row_index_path)
+    try:
+        shards = find_shard_offsets(config.essay_path, config.workers * SHARDS_PER_WORKER, start_offset, index)
+    finally:
+        if index is not None:
+            index.close()
+    essay_count = 0
+    timers = get_timers()
+    with Pool(config.workers) as pool:
+        jobs = [(config, checkpoint.shards_done + i, shard_start, shard_end)
+                for i, (shard_start, shard_end) in enumerate(shards)]
+        for (_, shard_end), result in zip(shards, pool.imap(read_shard_job, jobs)):
+            shard_ai, shard_human, shard_count, new_features, feature_rows, token_stats, shard_timers = result
+            timers.merge(shard_timers)
+            start = perf_counter()
+            checkpoint.ai_batches.merge(shard_ai)
+            checkpoint.human_batches.merge(shard_human)
+            if token_stats is not None:
+                checkpoint.token_stats.merge(token_stats)
+            timers.add("shard_merge", perf_counter() - start)
+            with timers.stage("feature_store_append"):
+                store.append(feature_rows)
+            checkpoint.feature_rows = store.rows
+            checkpoint.essay_count += shard_count
+            checkpoint.shards_done += 1
+            essay_count += shard_count
+            if _feature_cache is not None:
+                _feature_cache.update(new_features)
+            if config.resume:
+                if _feature_cache is not None:
+                    _feature_cache.save()
+                checkpoint.dump_sizes = ndjson_sizes(config.data_dir, checkpoint.shards_done)
+                checkpoint.save(config.checkpoint_path, shard_end)
+    return essay_count
+
+
+def parse_essay(essay: str, ai_author: bool, strict: bool = True) -> EssayData:
+    return tokenize_essay(essay, ai_author, strict)
+
+
+if __name__ == "__main__":
+    from cli import main
+    main(["ingest", *sys.argv[1:]])
@@ -1,88 +1,135 @@
-from essay_data import EssayData
-from word_frequency import WordFrequencyDataManager
+from config import STAT_MODES, WORD_COUNT_EDGES
+from essay_data import EssayData, get_vocabulary
+from opted_reader import ALPHABETIC, IN_DICTIONARY, get_default_dictionary
+from word_frequency import get_default_manager
+from sketches import QuantileSketch, derived_seed
+from sampling import Reservoir, sample_indices
 from statistics import fmean
-from math import floor
-from random import randint
+from typing import NamedTuple
+from array import array
+from bisect import bisect_left
+from random import Random
 import json
+import pickle
+import numpy as np
 
-WORD_FREQ_MGR = WordFrequencyDataManager()
+RESERVOIR_SIZE = 5000
 
-class IntegerStat:
-    def __init__(self, name:str):
-        self.name = name
-        self.num_counts: int = 0
-        self.counts: list[int] = []
-        self.cumulative: int = 0
-        self.min: int = -1
-        self.max: int = -1
-    
-    def add_value(self, val: int):
-        self.num_counts += 1
-        self.counts.append(val)
-        self.cumulative += val
-        if val > self.max:
-            self.max = val
-        if val < self.min or self.min == -1.0:
-            self.min = val
 
-    def get_median(self):
-        return self.counts[floor(float(self.num_counts) / 2.0)]
-    
-    def get_average(self):
-        return float(self.cumulative) / float(self.num_counts)
-    
-    def get_std_dev(self):
-        avg = self.get_average()
-        sum_sq = 0.0
-        for val in self.counts:
-            sum_sq += (float(val) - avg) ** 2
-        return (sum_sq / float(self.num_counts - 1)) ** 0.5
-    
-    def __str__(self):
-        return f"{self.name}\n avg: {self.get_average()}\n median: {self.get_median()}\n min: {self.min}\n max: {self.max}"
-        
-    def to_json(self):
-        return {
-            f"{self.name}": {
-                "avg": self.get_average(),
-                "median": self.get_median(),
-                "std_dev": self.get_std_dev(),
-                "min": self.min,
-                "max": self.max
-            }
-        }
+class NumericStat:
+    """
+    Summary statistics for one per-essay metric.
 
+    In "exact" mode every value is kept in a typed array, so medians are exact and the values can be
+    handed to SciPy. In "sketch" mode memory stays bounded: mean and variance are kept with Welford's
+    algorithm and the median comes from a QuantileSketch. Either way two stats of the same mode can
+    be merged, e.g. results from separate workers or runs.
+    """
+    typecode = "d"
+    dtype = np.float64
 
-class FloatStat:
-    def __init__(self, name:str):
+    def __init__(self, name:str, mode: str = "exact", seed: int = 0):
+        if mode not in STAT_MODES:
+            raise ValueError(f"Unknown stat mode {mode}, expected one of {STAT_MODES}")
         self.name = name
+        self.mode = mode
         self.num_counts: int = 0
-        self.counts: list[float] = []
-        self.cumulative: float = 0
-        self.min: float = -1
-        self.max: float = -1
-    
-    def add_value(self, val: float):
+        self.counts: array | None = array(self.typecode) if mode == "exact" else None
+        self.cumulative = 0
+        self.min = -1
+        self.max = -1
+        # Welford running mean and sum of squared deviations, only used in sketch mode
+        self.mean: float = 0.0
+        self.m2: float = 0.0
+        self.sketch: QuantileSketch | None = QuantileSketch(seed=derived_seed(seed, name)) if mode == "sketch" else None
+
+    def add_value(self, val):
         self.num_counts += 1
-        self.counts.append(val)
         self.cumulative += val
         if val > self.max:
             self.max = val
         if val < self.min or self.min == -1.0:
             self.min = val
+        if self.counts is not None:
+            self.counts.append(val)
+        else:
+            delta = val - self.mean
+            self.mean += delta / self.num_counts
+            self.m2 += delta * (val - self.mean)
+            self.sketch.add_value(val)
+
+    def add_values(self, vals: np.ndarray):
+        """
+        Add a whole array of values at once. Exact mode only.
+        """
+        if len(vals) == 0:
+            return
+        vals = vals.astype(self.dtype, copy=False)
+        low = vals.min().item()
+        high = vals.max().item()
+        if self.num_counts == 0 or low < self.min:
+            self.min = low
+        if high > self.max:
+            self.max = high
+        self.num_counts += len(vals)
+        self.counts.frombytes(vals.tobytes())
+        self.cumulative += vals.sum().item()
+
+    def merge(self, other: "NumericStat"):
+        """
+        Fold every value recorded by other into this stat. In exact mode this is the same as adding
+        other's values in order; in sketch mode the moments are combined with Chan's formula.
+        """
+        if other.mode != self.mode:
+            raise ValueError(f"Cannot merge {other.mode} stat {other.name} into {self.mode} stat {self.name}")
+        if other.num_counts == 0:
+            return
+        if self.num_counts == 0 or other.min < self.min:
+            self.min = other.min
+        if other.max > self.max:
+            self.max = other.max
+        if self.counts is not None:
+            self.counts.extend(other.counts)
+            self.cumulative += other.cumulative
+        else:
+            total = self.num_counts + other.num_counts
+            delta = other.mean - self.mean
+            self.m2 += other.m2 + delta * delta * self.num_counts * other.num_counts / total
+            self.mean += delta * other.num_counts / total
+            self.cumulative += other.cumulative
+            self.sketch.merge(other.sketch)
+        self.num_counts += other.num_counts
+
+    def values(self) -> np.ndarray:
+        """
+        Zero-copy view of the recorded values. No values can be added while a view is alive.
+        """
+        if self.counts is None:
+            raise ValueError(f"{self.name} is a sketch stat and does not keep per-essay values")
+        return np.frombuffer(self.counts, dtype=self.dtype)
 
     def get_median(self):
-        return self.counts[floor(float(self.num_counts) / 2.0)]
+        if self.num_counts == 0:
+            return float("nan")
+        if self.counts is None:
+            return float(self.sketch.quantile(0.5))
+        return float(np.median(self.values()))
     
     def get_average(self):
+        if self.num_counts == 0:
+            return float("nan")
+        if self.counts is not None:
+            # Summed from the values, so the mean only depends on the values in order, not on how
+            # they were added or merged: --workers runs write the same averages as serial ones
+            return float(self.values().sum()) / float(self.num_counts)
         return float(self.cumulative) / float(self.num_counts)
     
     def get_std_dev(self):
-        avg = self.get_average()
-        sum_sq = 0.0
-        for val in self.counts:
-            sum_sq += (val - avg) ** 2
-        return (sum_sq / float(self.num_counts - 1)) ** 0.5
+        if self.num_counts < 2:
+            return float("nan")
+        if self.counts is None:
+            return (self.m2 / float(self.num_counts - 1)) ** 0.5
+        return float(np.std(self.values(), ddof=1))
     
     def __str__(self):
         return f"{self.name}\n avg: {self.get_average()}\n median: {self.get_median()}\n min: {self.min}\n max: {self.max}"
@@ -99,45 +146,128 @@ class FloatStat:
         }
 
 
+class IntegerStat(NumericStat):
+    typecode = "q"
+    dtype = np.int64
+
+
+class FloatStat(NumericStat):
+    typecode = "d"
+    dtype = np.float64
+
+
+class EssayFeatures(NamedTuple):
+    """
+    Every scalar feature of one essay, in the same order as EssayBatchStats.stats().
+    """
+    word_count: int
+    unique_word_count: int
+    punctuation_count: int
+    word_rarity_score: float
+    average_sentence_length: float
+    punctuation_per_word_ratio: float
+    lexical_diversity: float
+    dictionary_word_fraction: float
+    misspelling_rate: float
+
+
+def word_totals(essays: list[EssayData]) -> np.ndarray:
+    """
+    (essays, 3) totals over every word of each essay, for a whole chunk of essays at once: the sum
+    of word score times count, the number of words in the dictionary and the number of misspelled
+    words, those with letters that are neither in the dictionary nor in the word frequency list.
+    Each is one gather of a per-token-ID array and one weighted bincount by essay. The score sums
+    are added up in the same order as a word-by-word loop would.
+    """
+    manager = get_default_manager()
+    tokens = get_vocabulary().tokens
+    scores = manager.token_scores(tokens)
+    flags = get_default_dictionary().token_flags(tokens)
+    token_ids = array("I")
+    counts = array("I")
+    lengths = []
+    for essay in essays:
+        token_ids.extend(essay.word_ids)
+        counts.extend(essay.word_counts)
+        lengths.append(len(essay.word_ids))
+    ids = np.frombuffer(token_ids, dtype=np.uint32)
+    word_counts = np.frombuffer(counts, dtype=np.uint32)
+    word_scores = np.take(scores, ids)
+    word_flags = np.take(flags, ids)
+    misspelled = (word_flags == ALPHABETIC) & (word_scores == manager.oov_score)
+    owners = np.repeat(np.arange(len(essays)), lengths)
+    totals = np.empty((len(essays), 3))
+    totals[:, 0] = np.bincount(owners, weights=word_scores * word_counts, minlength=len(essays))
+    totals[:, 1] = np.bincount(owners, weights=np.where(word_flags & IN_DICTIONARY, word_counts, 0),
+                               minlength=len(essays))
+    totals[:, 2] = np.bincount(owners, weights=np.where(misspelled, word_counts, 0), minlength=len(essays))
+    return totals
+
+
+def release_overflow_tokens():
+    """
+    Hand back the vocabulary's overflow token IDs, and the scores and flags cached for them, once
+    nothing parsed with them is used any more.
+    """
+    vocabulary = get_vocabulary()
+    if vocabulary.limit is not None and len(vocabulary) > vocabulary.limit:
+        kept = vocabulary.release_overflow()
+        get_default_manager().forget_tokens(kept)
+        get_default_dictionary().forget_tokens(kept)
+
+
 class EssayStats:
-    def __init__(self, essay: EssayData):
+    def __init__(self, essay: EssayData, totals: tuple[float, float, float] | None = None):
         self.essay = essay
-        self.word_count = sum([sentence.word_count for sentence in essay.sentences])
-        self.average_sentence_length = self.word_count / len(self.essay.sentences)
+        self.features = self.compute_features(totals)
+        self.word_count = self.features.word_count
+        self.average_sentence_length = self.features.average_sentence_length
+
+    def compute_features(self, totals: tuple[float, float, float] | None = None) -> EssayFeatures:
+        """
+        Compute every scalar feature from the essay's sentences. totals is the essay's row of
+        word_totals, when it was already scored along with others.
+        """
+        if totals is None:
+            totals = word_totals([self.essay])[0].tolist()
+        rarity, dictionary_words, misspelled_words = totals
+        word_count = self.essay.word_count()
+        punctuation_count = sum(self.essay.punctuation_counts)
+        unique_words = set(self.essay.word_ids)
+        average_sentence_length = word_count / self.essay.sentence_count()
+        return EssayFeatures(
+            word_count,
+            len(unique_words),
+            punctuation_count,
+            rarity / float(word_count),
+            average_sentence_length,
+            float(punctuation_count) / float(word_count),
+            float(len(unique_words)) / float(word_count),
+            dictionary_words / float(word_count),
+            misspelled_words / float(word_count)
+        )
         
     def count_unique_words(self) -> int:
         """
         Count the number of unique words in the essay.
         """
-        unique_words = set()
-        for sentence in self.essay.sentences:
-            for word in sentence.words.keys():
-                unique_words.add(word)
-        return len(unique_words)
+        return self.features.unique_word_count
     
     def count_punctuation(self) -> int:
         """
         Count the number of punctuation marks in the essay.
         """
-        punctuation_count = 0
-        for sentence in self.essay.sentences:
-            for punctuation in sentence.punctuation.keys():
-                punctuation_count += sentence.punctuation[punctuation]
-        return punctuation_count
+        return self.features.punctuation_count
     
     def word_rarity_score(self) -> float:
-        score = 0.0
-        for sentence in self.essay.sentences:
-            for word, count in sentence.words.items():
-                score += (WORD_FREQ_MGR.word_score(word) * float(count))
-        return score / float(self.word_count)
+        return self.features.word_rarity_score
     
     def punctuation_per_word_ratio(self, punctuation_count: int|None = None):
         """
         Calculate the ratio of punctuation to words in the essay.
         """
         if punctuation_count is None:
-            punctuation_count = self.count_punctuation()
+            return self.features.punctuation_per_word_ratio
         return float(punctuation_count) / float(self.word_count)
     
 
@@ -146,73 +276,128 @@ class EssayStats:
         Calculate the lexical diversity of the essay as the ratio of unique words to total words.
         """
         if unique_word_count is None:
-            unique_word_count = self.count_unique_words()
+            return self.features.lexical_diversity
         return float(unique_word_count) / float(self.word_count)
         
     
-    def to_json(self):
-        punct_count = self.count_punctuation()
-        unique_word_count = self.count_unique_words()
+    def to_json(self, sentence_data: str = "full"):
+        """
+        Every feature of the essay. sentence_data controls the per-sentence detail: "full" includes
+        each sentence's word and punctuation maps, "summary" only each sentence's counts and "none"
+        leaves it out.
+        """
+        features = self.features
         jsonified = {
             "ai_author": self.essay.ai_author,
-            "word_count": self.word_count,
-            "unique_word_count": unique_word_count,
-            "punctuation_count": punct_count,
-            "word_rarity_score": self.word_rarity_score(),
-            "punctuation_per_word_ratio": self.punctuation_per_word_ratio(punct_count),
-            "lexical_diversity": self.lexical_diversity(unique_word_count),
-            "average_sentence_length": self.average_sentence_length,
-            "sentence_data": [sentence.to_json() for sentence in self.essay.sentences]
+            "word_count": features.word_count,
+            "unique_word_count": features.unique_word_count,
+            "punctuation_count": features.punctuation_count,
+            "word_rarity_score": features.word_rarity_score,
+            "punctuation_per_word_ratio": features.punctuation_per_word_ratio,
+            "lexical_diversity": features.lexical_diversity,
+            "average_sentence_length": features.average_sentence_length,
+            "dictionary_word_fraction": features.dictionary_word_fraction,
+            "misspelling_rate": features.misspelling_rate
         }
+        if sentence_data == "full":
+            jsonified["sentence_data"] = [sentence.to_json() for sentence in self.essay.sentences]
+        elif sentence_data == "summary":
+            jsonified["sentence_data"] = [sentence.summary_json() for sentence in self.essay.sentences]
         return jsonified
 
 
 
 class EssayBatchStats:
-    def __init__(self, ai_author: bool):
+    def __init__(self, ai_author: bool, mode: str = "exact", seed: int = 0):
 
         self.ai_author = ai_author
+        self.mode = mode
         self.essay_count = 0
-        self.word_counts = IntegerStat("word_counts")
-        self.unique_word_counts = IntegerStat("unique_word_counts")
-        self.punc_counts = IntegerStat("punctuation_counts")
-        self.rarity_scores = FloatStat("rarity_scores")
-        self.sentence_lengths = FloatStat("average_sentence_lengths")
-        self.ppw_ratios = FloatStat("punctuation_per_word_ratios")
-        self.lexical_diversities = FloatStat("lexical_diversities")
+        self.word_counts = IntegerStat("word_counts", mode, seed)
+        self.unique_word_counts = IntegerStat("unique_word_counts", mode, seed)
+        self.punc_counts = IntegerStat("punctuation_counts", mode, seed)
+        self.rarity_scores = FloatStat("rarity_scores", mode, seed)
+        self.sentence_lengths = FloatStat("average_sentence_lengths", mode, seed)
+        self.ppw_ratios = FloatStat("punctuation_per_word_ratios", mode, seed)
+        self.lexical_diversities = FloatStat("lexical_diversities", mode, seed)
+        self.dictionary_fractions = FloatStat("dictionary_word_fractions", mode, seed)
+        self.misspelling_rates = FloatStat("misspelling_rates", mode, seed)
+        # Sketch mode keeps no per-essay values, so a bounded uniform sample is kept for inference
+        self.reservoir: Reservoir | None = \
+            Reservoir(RESERVOIR_SIZE, derived_seed(seed, "reservoir")) if mode == "sketch" else None
+
+    def stats(self) -> list[NumericStat]:
+        """
+        Every per-essay metric, in the same order as the rows stored in the reservoir.
+        """
+        return [self.word_counts, self.unique_word_counts, self.punc_counts, self.rarity_scores,
+                self.sentence_lengths, self.ppw_ratios, self.lexical_diversities, self.dictionary_fractions,
+                self.misspelling_rates]
 
     def add_essay(self, essay: EssayStats):
+        self.add_row(essay.features)
+
+    def add_row(self, row: tuple):
         self.essay_count += 1
-        self.word_counts.add_value(essay.word_count)
-        self.unique_word_counts.add_value(essay.count_unique_words())
-        self.punc_counts.add_value(essay.count_punctuation())
-        self.rarity_scores.add_value(essay.word_rarity_score())
-        self.sentence_lengths.add_value(essay.average_sentence_length)
-        self.ppw_ratios.add_value(essay.punctuation_per_word_ratio())
-        self.lexical_diversities.add_value(essay.lexical_diversity())
-
-
-    def get_random_sample(self, sample_size: int):
-        if sample_size > self.essay_count * 5:
-            return self
+        for stat, val in zip(self.stats(), row):
+            stat.add_value(val)
+        if self.reservoir is not None:
+            self.reservoir.add(row)
+
+    def add_columns(self, columns: list[np.ndarray]):
+        """
+        Add many essays at once, given as one array per metric in stats() order.
+        """
+        self.essay_count += len(columns[0])
+        if self.reservoir is None:
+            for stat, column in zip(self.stats(), columns):
+                stat.add_values(column)
+        else:
+            for row in zip(*(column.tolist() for column in columns)):
+                for stat, val in zip(self.stats(), row):
+                    stat.add_value(val)
+                self.reservoir.add(row)
+
+    def merge(self, other: "EssayBatchStats"):
+        for stat, other_stat in zip(self.stats(), other.stats()):
+            stat.merge(other_stat)
+        self.essay_count += other.essay_count
+        if self.reservoir is not None:
+            self.reservoir.merge(other.reservoir)
+
+    def get_random_sample(self, sample_size: int, rng: Random | None = None) -> "EssayBatchStats":
+        """
+        Random subset of sample_size essays drawn without replacement, or this batch itself if it does
+        not hold more essays than that. In sketch mode the sample is drawn from the batch's reservoir.
+        Pass a seeded rng to make the sample reproducible.
+        """
+        if rng is None:
+            rng = Random()
+        sample_batch = EssayBatchStats(self.ai_author)
+        if self.mode == "exact":
+            if sample_size >= self.essay_count:
+                return self
+            indices = np.array(sample_indices(rng, self.essay_count, sample_size), dtype=np.intp)
+            sample_batch.essay_count = len(indices)
+            for sample_stat, stat in zip(sample_batch.stats(), self.stats()):
+                sample_stat.add_values(stat.values()[indices])
         else:
-            sample_indices: list[int] = []
-            sample_batch = EssayBatchStats(self.ai_author)
-            while len(sample_indices) < sample_size:
-                index = randint(0, self.essay_count - 1)
-                if index in sample_indices:
-                    continue
-                sample_indices.append(index)
-            for index in sample_indices:
-                sample_batch.word_counts.add_value(self.word_counts.counts[index])
-                sample_batch.unique_word_counts.add_value(self.unique_word_counts.counts[index])
-                sample_batch.punc_counts.add_value(self.punc_counts.counts[index])
-                sample_batch.rarity_scores.add_value(self.rarity_scores.counts[index])
-                sample_batch.sentence_lengths.add_value(self.sentence_lengths.counts[index])
-                sample_batch.ppw_ratios.add_value(self.ppw_ratios.counts[index])
-                sample_batch.lexical_diversities.add_value(self.lexical_diversities.counts[index])
+            for row in self.reservoir.sample(rng, sample_size):
+                sample_batch.add_row(row)
         return sample_batch
 
+    def feature_matrix(self) -> np.ndarray:
+        """
+        Per-essay values as an (essays, metrics) float64 array with columns in stats() order. In
+        sketch mode only the reservoir rows are available.
+        """
+        if self.mode == "exact":
+            columns = [stat.values() for stat in self.stats()]
+            if self.essay_count == 0:
+                return np.empty((0, len(columns)))
+            return np.column_stack(columns).astype(np.float64, copy=False)
+        return np.array(self.reservoir.rows, dtype=np.float64).reshape(-1, len(self.stats()))
+
     def __str__(self):
         return f"Essays: {self.essay_count}\n{self.word_counts}\n{self.unique_word_counts}\n{self.punc_counts}\n{self.rarity_scores}\n{self.sentence_lengths}"
     
@@ -226,50 +411,89 @@ class EssayBatchStats:
             **self.rarity_scores.to_json(),
             **self.sentence_lengths.to_json(),
             **self.ppw_ratios.to_json(),
-            **self.lexical_diversities.to_json()
+            **self.lexical_diversities.to_json(),
+            **self.dictionary_fractions.to_json(),
+            **self.misspelling_rates.to_json()
         }
 
 
+def bucket_labels(edges: list[float], integral: bool = True) -> list[str]:
+    """
+    Names of the buckets split at edges, each edge the inclusive upper bound of its bucket. Buckets
+    of an integral feature at whole edges are named by their first and last value: [50, 100] gives
+    "0-50", "51-100" and "101-plus". Otherwise the lower edge is exclusive: [2.5] gives "0-2.5" and
+    "2.5-plus".
+    """
+    integral = integral and all(float(edge).is_integer() for edge in edges)
+    labels = []
+    lower = "0"
+    for edge in edges:
+        labels.append(f"{lower}-{edge:g}")
+        lower = f"{edge + 1:g}" if integral else f"{edge:g}"
+    labels.append(f"{lower}-plus")
+    return labels
+
+
 class BatchManager:
-    def __init__(self, ai_author: bool):
+    """
+    Essay statistics of one author split into buckets by one feature, word count by default. Each
+    edge is the inclusive upper bound of a bucket, and a last bucket holds everything above the
+    final edge. In sketch mode every stat of every bucket seeds its sketch from seed, the author,
+    the bucket and the stat's name, so managers built with the same seed, in this or another
+    process, compact the same values the same way.
+    """
+    def __init__(self, ai_author: bool, mode: str = "exact", edges: list[float] | None = None,
+                 column: str = "word_count", seed: int | None = None):
         self.ai_author = ai_author
+        self.mode = mode
+        self.edges = list(WORD_COUNT_EDGES if edges is None else edges)
+        self.column = column
+        self.column_index = EssayFeatures._fields.index(column)
         self.batches: dict[str, EssayBatchStats] = {
-            "0-50": EssayBatchStats(ai_author),
-            "51-100": EssayBatchStats(ai_author),
-            "101-200": EssayBatchStats(ai_author),
-            "201-500": EssayBatchStats(ai_author),
-            "501-1000": EssayBatchStats(ai_author),
-            "1001-plus": EssayBatchStats(ai_author)
+            label: EssayBatchStats(ai_author, mode, derived_seed(seed, ai_author, column, label))
+            for label in bucket_labels(self.edges, EssayFeatures.__annotations__[column] is int)
         }
+        self.batch_list = list(self.batches.values())
 
     def add_essay(self, essay: EssayStats):
-        if essay.word_count <= 50:
-            self.batches["0-50"].add_essay(essay)
-        elif essay.word_count <= 100:
-            self.batches["51-100"].add_essay(essay)
-        elif essay.word_count <= 200:
-            self.batches["101-200"].add_essay(essay)
-        elif essay.word_count <= 500:
-            self.batches["201-500"].add_essay(essay)
-        elif essay.word_count <= 1000:
-            self.batches["501-1000"].add_essay(essay)
-        else:
-            self.batches["1001-plus"].add_essay(essay)
+        self.add_features(essay.features)
+
+    def add_features(self, features: EssayFeatures):
+        self.batch_list[bisect_left(self.edges, features[self.column_index])].add_row(features)
+
+    def bucket_label(self, features: EssayFeatures) -> str:
+        """
+        Name of the bucket an essay with these features goes into.
+        """
+        return list(self.batches)[bisect_left(self.edges, features[self.column_index])]
 
-    def write_files(self):
+    def merge(self, other: "BatchManager"):
+        if other.ai_author != self.ai_author:
+            raise ValueError("Cannot merge AI and human batches")
+        if other.batches.keys() != self.batches.keys():
+            raise ValueError("Cannot merge batches split into different buckets")
+        for key, batch in other.batches.items():
+            self.batches[key].merge(batch)
+
+    def write_files(self, data_dir: str = "data"):
         author = "ai" if self.ai_author else "human"
         for key, batch in self.batches.items():
-            path = f"data/batches/{author}_{key}.json"
+            path = f"{data_dir}/batches/{author}_{key}.json"
             with open(path, "w", encoding="utf-8") as batch_file:
                 json.dump(batch.to_json(), batch_file, ensure_ascii=False, indent=2)
     
+    def save(self, path: str):
+        """
+        Write the full state of this manager (every bucket's statistics) so it can be reloaded later.
+        """
+        with open(path, "wb") as state_file:
+            pickle.dump(self, state_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path: str) -> "BatchManager":
+        with open(path, "rb") as state_file:
+            return pickle.load(state_file)
+
     def get_batches(self) -> list[tuple[str, EssayBatchStats]]:
-        return [
-            ("0-50", self.batches["0-50"]),
-            ("51-100", self.batches["51-100"]),
-            ("101-200", self.batches["101-200"]),
-            ("201-500", self.batches["201-500"]),
-            ("501-1000", self.batches["501-1000"]),
-            ("1001-plus", self.batches["1001-plus"]),
-        ]
+        return list(self.batches.items())
         
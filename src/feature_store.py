@@ -0,0 +1,126 @@
+from array import array
+from essay_stats import BatchManager, EssayFeatures, WORD_COUNT_EDGES
+from os import makedirs, path, replace
+import json
+import numpy as np
+
+# Array typecode of every column: the EssayFeatures fields, typed like their batch stats, then the author
+COLUMN_TYPES = {
+    "word_count": "q",
+    "unique_word_count": "q",
+    "punctuation_count": "q",
+    "word_rarity_score": "d",
+    "average_sentence_length": "d",
+    "punctuation_per_word_ratio": "d",
+    "lexical_diversity": "d",
+    "dictionary_word_fraction": "d",
+    "misspelling_rate": "d",
+    "ai_author": "b"
+}
+META_FILE = "meta.json"
+
+
+class FeatureRows:
+    """
+    Scalar features of essays parsed since the last append to the store, one typed array per column.
+    """
+    def __init__(self):
+        self.columns = {name: array(typecode) for name, typecode in COLUMN_TYPES.items()}
+        self.feature_columns = [self.columns[name] for name in EssayFeatures._fields]
+
+    def add(self, features: EssayFeatures, ai_author: bool):
+        for column, value in zip(self.feature_columns, features):
+            column.append(value)
+        self.columns["ai_author"].append(ai_author)
+
+    def __len__(self):
+        return len(self.columns["ai_author"])
+
+
+class FeatureStoreWriter:
+    """
+    Appends feature rows to a store directory holding one raw little-endian file per column and a
+    meta.json with the row count. Opening the writer cuts every column back to rows rows, so a run
+    resumed from a checkpoint drops whatever was appended after that checkpoint was saved.
+    """
+    def __init__(self, store_dir: str, rows: int = 0):
+        self.store_dir = store_dir
+        self.rows = rows
+        makedirs(store_dir, exist_ok=True)
+        self.files = {}
+        for name, typecode in COLUMN_TYPES.items():
+            column_path = path.join(store_dir, f"{name}.bin")
+            size = rows * array(typecode).itemsize
+            if path.exists(column_path) and path.getsize(column_path) < size:
+                raise ValueError(f"Feature store column {column_path} holds fewer than {rows} rows")
+            with open(column_path, "ab") as column_file:
+                column_file.truncate(size)
+            self.files[name] = open(column_path, "ab")
+        self.write_meta()
+
+    def append(self, feature_rows: FeatureRows):
+        if len(feature_rows) == 0:
+            return
+        for name, column in feature_rows.columns.items():
+            self.files[name].write(column.tobytes())
+            self.files[name].flush()
+        self.rows += len(feature_rows)
+        self.write_meta()
+
+    def write_meta(self):
+        meta = {"rows": self.rows, "columns": {name: np.dtype(typecode).str for name, typecode in COLUMN_TYPES.items()}}
+        meta_path = path.join(self.store_dir, META_FILE)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as meta_file:
+            json.dump(meta, meta_file, indent=2)
+        replace(meta_path + ".tmp", meta_path)
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+        self.files = {}
+
+
+class FeatureStore:
+    """
+    Read-only, memory-mapped view of a feature store written by ingest: one row of scalar features
+    per essay, so the essays can be stratified again without parsing the CSV.
+    """
+    def __init__(self, store_dir: str):
+        with open(path.join(store_dir, META_FILE), encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        self.rows: int = meta["rows"]
+        self.columns: dict[str, np.ndarray] = {}
+        for name, dtype in meta["columns"].items():
+            if self.rows == 0:
+                self.columns[name] = np.empty(0, dtype=dtype)
+            else:
+                self.columns[name] = np.memmap(path.join(store_dir, f"{name}.bin"), dtype=dtype, mode="r",
+                                               shape=(self.rows,))
+
+    def column(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def stratify(self, column: str = "word_count", edges: list[float] | None = None,
+                 mode: str = "exact") -> tuple[BatchManager, BatchManager]:
+        """
+        AI and human BatchManagers bucketing every essay in the store by column at edges, built
+        without touching the essays one at a time: the bucket of every row comes from one
+        searchsorted call, a stable sort groups the rows by author and bucket, and each group is
+        added to its batch as a slice of every feature column.
+        """
+        edges = list(WORD_COUNT_EDGES if edges is None else edges)
+        ai_batches = BatchManager(True, mode, edges, column)
+        human_batches = BatchManager(False, mode, edges, column)
+        bucket_count = len(edges) + 1
+        buckets = np.searchsorted(np.asarray(edges, dtype=np.float64), self.columns[column], side="left")
+        # Human rows go after the AI rows; a small integer key lets the stable sort use radix sort
+        key_type = np.int16 if 2 * bucket_count < 1 << 15 else np.int64
+        keys = ((1 - self.columns["ai_author"].astype(key_type)) * bucket_count + buckets).astype(key_type)
+        order = np.argsort(keys, kind="stable")
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(keys, minlength=2 * bucket_count))))
+        feature_columns = [self.columns[name][order] for name in EssayFeatures._fields]
+        for group, batch in enumerate(ai_batches.batch_list + human_batches.batch_list):
+            start, end = bounds[group], bounds[group + 1]
+            if end > start:
+                batch.add_columns([feature_column[start:end] for feature_column in feature_columns])
+        return ai_batches, human_batches
@@ -1,15 +1,30 @@
-from scipy.stats import shapiro, ttest_ind_from_stats as ttest, mannwhitneyu
+from concurrent.futures import ProcessPoolExecutor
+from config import CORRECTIONS
 from essay_stats import IntegerStat, FloatStat, BatchManager, EssayBatchStats
-from time import time
+from instrumentation import get_timers
+from time import time, perf_counter
+from random import Random
 import json
+import sys
+import numpy as np
 
 MAX_SAMPLE_SIZE = 1000
+SHAPIRO_MAX_SIZE = 5000
+RESULTS_PATH = "data/inference_results.json"
+
+# Result names of the metrics, in the order of EssayBatchStats.stats()
+METRIC_NAMES = ["word_counts", "unique_word_counts", "punctuation_counts", "rarity_scores",
+                "average_sentence_lengths", "punctuations_per_word", "lexical_diversities",
+                "dictionary_word_fractions", "misspelling_rates"]
+
+# SciPy takes over a second to import, so it is only imported by the functions that need it
 
 def are_distributions_normal(one: IntegerStat|FloatStat, two: IntegerStat|FloatStat):
-    return shapiro(one.counts)[1] > 0.05 and shapiro(two.counts)[1] > 0.05
+    return are_samples_normal(one.values(), two.values())
 
 
 def conduct_t_test(one: IntegerStat|FloatStat, two: IntegerStat|FloatStat, alpha: float = 0.01):
+    from scipy.stats import ttest_ind_from_stats as ttest
     _, pval = ttest(one.get_average(), one.get_std_dev(), one.num_counts,
                     two.get_average(), two.get_std_dev(), two.num_counts,
                     False)
@@ -18,51 +33,198 @@ def conduct_t_test(one: IntegerStat|FloatStat, two: IntegerStat|FloatStat, alpha
 
 
 def conduct_mann_whitney_u(one: IntegerStat|FloatStat, two: IntegerStat|FloatStat, alpha: float = 0.01):
-    _, pval = mannwhitneyu(one.counts, two.counts, alternative="two-sided")
-    reject = "yes" if pval < alpha else "no"
-    return { "p-value": pval, "reject-null": reject, "test-type": "Mann Whitney U" }
+    return mann_whitney_u(one.values(), two.values(), alpha)
 
 
 def are_different_on_average(one: IntegerStat|FloatStat, two: IntegerStat|FloatStat, alpha: float = 0.01):
-    if are_distributions_normal(one, two):
-        return conduct_t_test(one, two, alpha)
+    return test_difference(one.values(), two.values(), alpha)
+
+
+def are_samples_normal(one: np.ndarray, two: np.ndarray):
+    return is_sample_normal(one) and is_sample_normal(two)
+
+
+def is_sample_normal(values: np.ndarray):
+    """
+    Shapiro-Wilk for up to SHAPIRO_MAX_SIZE values, past which its p-values are no longer accurate.
+    Larger samples use D'Agostino and Pearson's test, which only needs the sample's skewness and
+    kurtosis and so runs in linear time.
+    """
+    if len(values) > SHAPIRO_MAX_SIZE:
+        from scipy.stats import normaltest
+        return normaltest(values)[1] > 0.05
+    from scipy.stats import shapiro
+    return shapiro(values)[1] > 0.05
+
+
+def t_test(one: np.ndarray, two: np.ndarray, alpha: float = 0.01):
+    from scipy.stats import ttest_ind
+    _, pval = ttest_ind(one, two, equal_var=False)
+    reject = "yes" if pval < alpha else "no"
+    return { "p-value": float(pval), "reject-null": reject, "test-type": "2 Sample T-Test"}
+
+
+def mann_whitney_u(one: np.ndarray, two: np.ndarray, alpha: float = 0.01):
+    from scipy.stats import mannwhitneyu
+    _, pval = mannwhitneyu(one, two, alternative="two-sided")
+    reject = "yes" if pval < alpha else "no"
+    return { "p-value": float(pval), "reject-null": reject, "test-type": "Mann Whitney U" }
+
+
+def test_difference(one: np.ndarray, two: np.ndarray, alpha: float = 0.01):
+    """
+    Welch's t-test if both samples look normal (Shapiro-Wilk), otherwise Mann-Whitney U.
+    """
+    if are_samples_normal(one, two):
+        return t_test(one, two, alpha)
     else:
-        return conduct_mann_whitney_u(one, two, alpha)
+        return mann_whitney_u(one, two, alpha)
 
 
-def compare_batches(batch_one: BatchManager, batch_two: BatchManager, alpha: float = 0.01):
+def sorted_mann_whitney_u(one: np.ndarray, two: np.ndarray, alpha: float = 0.01):
+    """
+    Two-sided Mann-Whitney U test, normal approximation with tie and continuity correction, on two
+    samples that are already sorted. U comes from where each value of one falls in two, and the tie
+    groups from merging the two sorted arrays, so no ranks are computed and the test is dominated by
+    the O(n log n) sorts done beforehand. Gives the same p-value as SciPy's asymptotic method.
+    """
+    from scipy.stats import norm
+    n_one, n_two = len(one), len(two)
+    if n_one == 0 or n_two == 0:
+        # Like SciPy, an empty side has no p-value
+        return { "p-value": float("nan"), "reject-null": "no", "test-type": "Mann Whitney U" }
+    below = np.searchsorted(two, one, "left")
+    ties = np.searchsorted(two, one, "right") - below
+    u_one = float(below.sum()) + float(ties.sum()) / 2
+    # A stable sort of two concatenated sorted runs is a single merge
+    merged = np.sort(np.concatenate((one, two)), kind="stable")
+    group_sizes = np.diff(np.flatnonzero(np.r_[True, merged[1:] != merged[:-1], True])).astype(np.float64)
+    size = n_one + n_two
+    tie_term = float((group_sizes ** 3 - group_sizes).sum()) / (size * (size - 1))
+    sigma = np.sqrt(n_one * n_two / 12 * ((size + 1) - tie_term))
+    u = max(u_one, n_one * n_two - u_one)
+    pval = min(1.0, 2 * norm.sf((u - n_one * n_two / 2 - 0.5) / sigma)) if sigma > 0 else 1.0
+    reject = "yes" if pval < alpha else "no"
+    return { "p-value": float(pval), "reject-null": reject, "test-type": "Mann Whitney U" }
+
+
+def test_population_difference(one: np.ndarray, two: np.ndarray, alpha: float = 0.01):
+    """
+    test_difference for whole populations: each side is sorted once and the sorted values serve
+    both the normality checks and the Mann-Whitney U test.
+    """
+    one = np.sort(one)
+    two = np.sort(two)
+    if are_samples_normal(one, two):
+        return t_test(one, two, alpha)
+    else:
+        return sorted_mann_whitney_u(one, two, alpha)
+
+
+def run_test_job(job: tuple) -> tuple[dict, float]:
+    """
+    Run one test, returning its result and how long it took.
+    """
+    one, two, alpha, full_population = job
+    start = perf_counter()
+    if full_population:
+        outcome = test_population_difference(one, two, alpha)
+    else:
+        outcome = test_difference(one, two, alpha)
+    return outcome, perf_counter() - start
+
+
+def adjust_p_values(p_values: np.ndarray, correction: str = "holm") -> np.ndarray:
+    """
+    Adjust a family of p-values for multiple comparisons: Holm-Bonferroni (controls the family-wise
+    error rate), Benjamini-Hochberg ("bh", controls the false discovery rate) or "none". Tests
+    without a p-value (NaN, e.g. an empty side or a constant metric) are left out of the family and
+    stay NaN.
+    """
+    if correction not in CORRECTIONS:
+        raise ValueError(f"Unknown correction {correction}, expected one of {CORRECTIONS}")
+    p_values = np.asarray(p_values, dtype=np.float64)
+    finite = np.isfinite(p_values)
+    count = int(finite.sum())
+    if correction == "none" or count == 0:
+        return p_values
+    order = np.argsort(p_values[finite], kind="stable")
+    ranked = p_values[finite][order]
+    if correction == "holm":
+        adjusted = np.maximum.accumulate(ranked * (count - np.arange(count)))
+    else:
+        adjusted = np.minimum.accumulate((ranked * count / np.arange(1, count + 1))[::-1])[::-1]
+    family = np.empty(count)
+    family[order] = np.minimum(adjusted, 1.0)
+    result = np.full(len(p_values), np.nan)
+    result[finite] = family
+    return result
+
+
+def compare_batches(batch_one: BatchManager, batch_two: BatchManager, alpha: float = 0.01, seed: int | None = None,
+                    results_path: str = RESULTS_PATH, workers: int = 1, correction: str = "none",
+                    full_population: bool = False):
+    """
+    Test every metric of every word count stratification for a difference between the two batches,
+    on random samples of at most MAX_SAMPLE_SIZE essays per side. Passing a seed makes the samples,
+    and so inference_results.json, reproducible.
+
+    The samples for the whole grid are drawn first and every metric is gathered into one contiguous
+    array per side, then the tests run across a pool of workers processes (or in this process for
+    one worker) and their p-values are corrected for multiple comparisons across the grid. The
+    draws do not depend on the number of workers, so a seed gives the same results either way.
+
+    With full_population every essay in each stratification is tested instead of a sample (only
+    the reservoir in sketch mode), using test_population_difference.
+    """
+    # Imported up front so the pool workers, forked from this process, do not each import SciPy again
+    import scipy.stats
+    rng = Random(seed)
     one: list[tuple[str,EssayBatchStats]] = batch_one.get_batches()
     two: list[tuple[str,EssayBatchStats]] = batch_two.get_batches()
-    results: dict[str, dict[str, tuple[float, bool]]] = {}
     start = time()
+    grid: list[tuple[str, str]] = []
+    jobs: list[tuple[np.ndarray, np.ndarray, float, bool]] = []
     for i in range(len(one)):
         test_name: str = one[i][0]
-        one_data: EssayBatchStats = one[i][1].get_random_sample(MAX_SAMPLE_SIZE)
-        two_data: EssayBatchStats = two[i][1].get_random_sample(MAX_SAMPLE_SIZE)
-        results[test_name] = {}
-        results[test_name]["word_counts"] = are_different_on_average(one_data.word_counts,
-                                                                     two_data.word_counts,
-                                                                     alpha)
-        results[test_name]["unique_word_counts"] = are_different_on_average(one_data.unique_word_counts,
-                                                                            two_data.unique_word_counts,
-                                                                            alpha)
-        results[test_name]["punctuation_counts"] = are_different_on_average(one_data.punc_counts,
-                                                                            two_data.punc_counts,
-                                                                            alpha)
-        results[test_name]["rarity_scores"] = are_different_on_average(one_data.rarity_scores,
-                                                                       two_data.rarity_scores,
-                                                                       alpha)
-        results[test_name]["average_sentence_lengths"] = are_different_on_average(one_data.sentence_lengths,
-                                                                                  two_data.sentence_lengths,
-                                                                                  alpha)
-        results[test_name]["punctuations_per_word"] = are_different_on_average(one_data.ppw_ratios,
-                                                                               two_data.ppw_ratios,
-                                                                               alpha)
-        results[test_name]["lexical_diversities"] = are_different_on_average(one_data.lexical_diversities,
-                                                                             two_data.lexical_diversities,
-                                                                             alpha)
+        if full_population:
+            one_columns = one[i][1].feature_matrix().T
+            two_columns = two[i][1].feature_matrix().T
+        else:
+            one_data: EssayBatchStats = one[i][1].get_random_sample(MAX_SAMPLE_SIZE, rng)
+            two_data: EssayBatchStats = two[i][1].get_random_sample(MAX_SAMPLE_SIZE, rng)
+            one_columns = [stat.values() for stat in one_data.stats()]
+            two_columns = [stat.values() for stat in two_data.stats()]
+        for metric, one_values, two_values in zip(METRIC_NAMES, one_columns, two_columns):
+            grid.append((test_name, metric))
+            jobs.append((np.ascontiguousarray(one_values), np.ascontiguousarray(two_values), alpha, full_population))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(run_test_job, jobs))
+    else:
+        outcomes = [run_test_job(job) for job in jobs]
+
+    timers = get_timers()
+    for (test_name, metric), (_, seconds) in zip(grid, outcomes):
+        timers.add(f"test/{test_name}/{metric}", seconds)
+        timers.add("statistical_tests", seconds)
+    outcomes = [outcome for outcome, _ in outcomes]
+    adjusted = adjust_p_values(np.array([outcome["p-value"] for outcome in outcomes]), correction)
+    results: dict[str, dict[str, dict]] = {}
+    for (test_name, metric), outcome, adjusted_pval in zip(grid, outcomes, adjusted):
+        if correction != "none":
+            outcome["adjusted-p-value"] = float(adjusted_pval)
+            outcome["correction"] = correction
+            outcome["reject-null"] = "yes" if adjusted_pval < alpha else "no"
+        results.setdefault(test_name, {})[metric] = outcome
     end = time()
     print(f"Inference took {end - start} seconds")
-    with open("data/inference_results.json", "w", encoding="utf-8") as results_file:
+    with open(results_path, "w", encoding="utf-8") as results_file:
         json.dump(results, results_file, ensure_ascii=False, indent=2)
+    return results
+
 
+if __name__ == "__main__":
+    from cli import main
+    main(["infer", *sys.argv[1:]])
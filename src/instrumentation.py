@@ -0,0 +1,185 @@
+from time import perf_counter
+import json
+
+PROFILE_MODES = ("timers", "cprofile", "tracemalloc")
+# Functions and allocation sites listed in a profile report
+PROFILE_TOP = 50
+
+
+class StageTimers:
+    """
+    Wall time and call counts per pipeline stage, plus plain counters. Hot paths call add with a
+    perf_counter difference; coarser code can use stage() as a context manager. Worker processes
+    keep their own timers, which the parent merges.
+    """
+    def __init__(self):
+        self.stages: dict[str, list] = {}
+        self.counters: dict[str, int] = {}
+
+    def add(self, stage: str, seconds: float, calls: int = 1):
+        entry = self.stages.get(stage)
+        if entry is None:
+            self.stages[stage] = [seconds, calls]
+        else:
+            entry[0] += seconds
+            entry[1] += calls
+
+    def count(self, counter: str, amount: int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def stage(self, stage: str) -> "StageTimer":
+        return StageTimer(self, stage)
+
+    def iterate(self, stage: str, iterable):
+        """
+        Yield from iterable, adding the time spent producing each item to stage.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, perf_counter() - start, 0)
+                return
+            self.add(stage, perf_counter() - start)
+            yield item
+
+    def merge(self, other: "StageTimers"):
+        for stage, (seconds, calls) in other.stages.items():
+            self.add(stage, seconds, calls)
+        for counter, amount in other.counters.items():
+            self.count(counter, amount)
+
+    def reset(self):
+        self.stages = {}
+        self.counters = {}
+
+    def snapshot(self) -> "StageTimers":
+        copy = StageTimers()
+        copy.merge(self)
+        return copy
+
+    def to_json(self):
+        return {
+            "stages": {
+                stage: {"seconds": seconds, "calls": calls, "microseconds_per_call": seconds / calls * 1e6 if calls else None}
+                for stage, (seconds, calls) in self.stages.items()
+            },
+            "counters": dict(self.counters)
+        }
+
+    def summary(self) -> str:
+        """
+        Table of the stages by total time. Per-test and per-bucket stages, named like
+        "test/0-50/word_counts", are left to the JSON report.
+        """
+        lines = [f"{'stage':<30} {'seconds':>10} {'calls':>10} {'us/call':>10}"]
+        stages = [item for item in self.stages.items() if "/" not in item[0]]
+        for stage, (seconds, calls) in sorted(stages, key=lambda item: -item[1][0]):
+            per_call = f"{seconds / calls * 1e6:.1f}" if calls else "-"
+            lines.append(f"{stage:<30} {seconds:>10.3f} {calls:>10} {per_call:>10}")
+        return "\n".join(lines)
+
+
+class StageTimer:
+    def __init__(self, timers: StageTimers, stage: str):
+        self.timers = timers
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timers.add(self.stage, perf_counter() - self.start)
+
+
+_timers = StageTimers()
+
+
+def get_timers() -> StageTimers:
+    return _timers
+
+
+def peak_rss_mb() -> dict[str, float] | None:
+    """
+    Peak resident set size of this process and of its finished child processes (the ingest
+    workers), or None where the resource module is unavailable (Windows).
+    """
+    try:
+        import resource
+        from sys import platform
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 / (1024 * 1024) if platform == "darwin" else 1 / 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    }
+
+
+def cprofile_report(profile) -> list[dict]:
+    from pstats import Stats
+    stats = Stats(profile).stats
+    rows = sorted(stats.items(), key=lambda item: -item[1][3])[:PROFILE_TOP]
+    return [{
+        "function": f"{file}:{line}({name})",
+        "calls": calls,
+        "primitive_calls": primitive_calls,
+        "total_seconds": total,
+        "cumulative_seconds": cumulative
+    } for (file, line, name), (primitive_calls, calls, total, cumulative, _) in rows]
+
+
+def tracemalloc_report(snapshot, peak: int) -> dict:
+    return {
+        "peak_traced_mb": peak / (1024 * 1024),
+        "top_allocations": [{
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_kb": stat.size / 1024,
+            "count": stat.count
+        } for stat in snapshot.statistics("lineno")[:PROFILE_TOP]]
+    }
+
+
+def run_profiled(mode: str, function, report_path: str, command: str):
+    """
+    Run function under the given profiler and write a JSON report with the stage timers, the
+    counters, throughput, peak RSS and, for cprofile and tracemalloc, the top functions by
+    cumulative time or the top allocation sites. Returns what function returns.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode}, expected one of {PROFILE_MODES}")
+    timers = get_timers()
+    timers.reset()
+    report = {"command": command, "mode": mode}
+    start = perf_counter()
+    if mode == "cprofile":
+        from cProfile import Profile
+        profile = Profile()
+        result = profile.runcall(function)
+        report["cprofile"] = cprofile_report(profile)
+    elif mode == "tracemalloc":
+        import tracemalloc
+        tracemalloc.start()
+        try:
+            result = function()
+            _, peak = tracemalloc.get_traced_memory()
+            report["tracemalloc"] = tracemalloc_report(tracemalloc.take_snapshot(), peak)
+        finally:
+            tracemalloc.stop()
+    else:
+        result = function()
+    wall = perf_counter() - start
+    report["wall_seconds"] = wall
+    essays = timers.counters.get("essays", 0)
+    report["essays_per_second"] = essays / wall if essays else None
+    report["peak_rss_mb"] = peak_rss_mb()
+    report.update(timers.to_json())
+    with open(report_path, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
+    print(timers.summary())
+    print(f"Profile report written to {report_path}")
+    return result
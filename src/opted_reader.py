@@ -0,0 +1,190 @@
+from csv import writer, reader
+from hashlib import blake2b
+from mmap import mmap, ACCESS_READ
+import numpy as np
+import struct
+
+RAW_PATH = "../OPTED-Dictionary.csv"
+DATA_PATH = "data/opted_words.csv"
+INDEX_PATH = "data/opted_words.idx"
+
+# Bloom filter in front of the sorted hashes: about 0.8% false positives at 10 bits and 7 probes per word
+BLOOM_BITS_PER_WORD = 10
+BLOOM_PROBES = 7
+
+# Flags of a token in DictionaryLookup.token_flags
+IN_DICTIONARY = 1
+ALPHABETIC = 2
+
+# Index layout: header, Bloom filter of bloom_bits bits as uint64 words (none when bloom_bits is 0),
+# then the sorted uint64 hashes of every distinct lower-case dictionary word. Words are hashed with
+# blake2b so the index is stable across processes.
+INDEX_MAGIC = b"OPTED001"
+INDEX_HEADER = struct.Struct("<8sQQ")
+
+
+def prepare_dictionary_data(raw_path: str = RAW_PATH, data_path: str = DATA_PATH, index_path: str = INDEX_PATH):
+    """
+    Write the distinct lower-case headwords of the OPTED dictionary CSV to data_path, one per row,
+    and compile them into the index read by DictionaryLookup.
+    """
+    words: set[str] = set()
+    with open(raw_path, "r", encoding="utf-8", newline="") as file:
+        csv_reader = reader(file)
+        next(csv_reader)
+        for row in csv_reader:
+            if row and row[0].strip():
+                words.add(row[0].strip().lower())
+
+    with open(data_path, "w", encoding="utf-8", newline="") as file:
+        csv_writer = writer(file)
+        csv_writer.writerow(("Word",))
+        csv_writer.writerows((word,) for word in sorted(words))
+
+    build_dictionary_index(data_path, index_path)
+
+
+def build_dictionary_index(csv_path: str = DATA_PATH, index_path: str = INDEX_PATH,
+                           bloom_bits_per_word: int = BLOOM_BITS_PER_WORD):
+    """
+    Compile the dictionary word CSV into the memory-mappable index read by DictionaryLookup. Pass
+    bloom_bits_per_word=0 to leave the Bloom filter out.
+    """
+    with open(csv_path, "r", encoding="utf-8", newline="") as file:
+        csv_reader = reader(file)
+        next(csv_reader)
+        hashes = np.unique(word_hashes([row[0] for row in csv_reader if row]))
+
+    bloom_bits = 0
+    if bloom_bits_per_word:
+        bloom_bits = 64
+        while bloom_bits < len(hashes) * bloom_bits_per_word:
+            bloom_bits *= 2
+    bloom = np.zeros(bloom_bits // 64, dtype=np.uint64)
+    if bloom_bits:
+        positions = bloom_positions(hashes, bloom_bits).ravel()
+        np.bitwise_or.at(bloom, positions >> np.uint64(6), np.uint64(1) << (positions & np.uint64(63)))
+
+    with open(index_path, "wb") as file:
+        file.write(INDEX_HEADER.pack(INDEX_MAGIC, len(hashes), bloom_bits))
+        file.write(bloom.astype("<u8").tobytes())
+        file.write(hashes.astype("<u8").tobytes())
+
+
+def word_hashes(words: list[str]) -> np.ndarray:
+    return np.array([int.from_bytes(blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+                     for word in words], dtype=np.uint64)
+
+
+def bloom_positions(hashes: np.ndarray, bloom_bits: int) -> np.ndarray:
+    """
+    (words, BLOOM_PROBES) bit positions of each hash, by double hashing its two 32-bit halves.
+    """
+    first = hashes & np.uint64(0xFFFFFFFF)
+    step = (hashes >> np.uint64(32)) | np.uint64(1)
+    probes = np.arange(BLOOM_PROBES, dtype=np.uint64)
+    return (first[:, None] + probes[None, :] * step[:, None]) & np.uint64(bloom_bits - 1)
+
+
+_default_dictionary: "DictionaryLookup | None" = None
+_default_paths: tuple[str, str] = (INDEX_PATH, DATA_PATH)
+
+
+def configure_default_dictionary(index_path: str = INDEX_PATH, csv_path: str = DATA_PATH):
+    """
+    Point the shared dictionary at a different index. It is opened on first use, not here.
+    """
+    global _default_dictionary, _default_paths
+    if _default_paths != (index_path, csv_path):
+        _default_paths = (index_path, csv_path)
+        _default_dictionary = None
+
+
+def get_default_dictionary() -> "DictionaryLookup":
+    """
+    The dictionary shared by everything in this process, opened the first time it is needed.
+    """
+    global _default_dictionary
+    if _default_dictionary is None:
+        _default_dictionary = DictionaryLookup(*_default_paths)
+    return _default_dictionary
+
+
+class DictionaryLookup:
+    """
+    Read-only view of the compiled dictionary index. The file is memory-mapped, so opening it costs
+    no parsing. A batch of words is hashed, checked against the Bloom filter in one vectorised probe,
+    and only the words that pass it are binary-searched in the sorted hashes. Pass use_bloom=False
+    to search every word.
+    """
+    def __init__(self, index_path: str = INDEX_PATH, csv_path: str = DATA_PATH, use_bloom: bool = True):
+        try:
+            file = open(index_path, "rb")
+        except FileNotFoundError:
+            build_dictionary_index(csv_path, index_path)
+            file = open(index_path, "rb")
+        with file:
+            self.mapped = mmap(file.fileno(), 0, access=ACCESS_READ)
+        magic, entries, bloom_bits = INDEX_HEADER.unpack_from(self.mapped, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{index_path} is not a dictionary index, rerun prepare_dictionary_data")
+        bloom_start = INDEX_HEADER.size
+        hashes_start = bloom_start + bloom_bits // 8
+        self.bloom_bits = bloom_bits if use_bloom else 0
+        self.bloom = np.frombuffer(self.mapped, dtype="<u8", count=bloom_bits // 64, offset=bloom_start)
+        self.hashes = np.frombuffer(self.mapped, dtype="<u8", count=entries, offset=hashes_start)
+        # Flags of every vocabulary token looked up so far, indexed by token ID, see token_flags
+        self.id_flags = np.empty(0, dtype=np.uint8)
+        self.flagged_tokens = 0
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, word: str) -> bool:
+        return bool(self.contains([word])[0])
+
+    def contains(self, words: list[str]) -> np.ndarray:
+        """
+        Whether each of a batch of lower-case words is in the dictionary.
+        """
+        hashes = word_hashes(words)
+        found = np.zeros(len(hashes), dtype=bool)
+        candidates = np.arange(len(hashes))
+        if self.bloom_bits and len(hashes):
+            positions = bloom_positions(hashes, self.bloom_bits)
+            bits = (self.bloom[positions >> np.uint64(6)] >> (positions & np.uint64(63))) & np.uint64(1)
+            candidates = np.flatnonzero(bits.all(axis=1))
+        if len(candidates) and len(self.hashes):
+            wanted = hashes[candidates]
+            slots = np.minimum(np.searchsorted(self.hashes, wanted), len(self.hashes) - 1)
+            found[candidates] = self.hashes[slots] == wanted
+        return found
+
+    def token_flags(self, tokens: list[str]) -> np.ndarray:
+        """
+        IN_DICTIONARY and ALPHABETIC flags indexed by token ID for a vocabulary's token list.
+        Tokens are looked up once, the first time they are asked for; later calls only look up the
+        tokens added since.
+        """
+        if len(tokens) > self.flagged_tokens:
+            if len(tokens) > len(self.id_flags):
+                grown = np.empty(max(len(tokens), 2 * len(self.id_flags)), dtype=np.uint8)
+                grown[:self.flagged_tokens] = self.id_flags[:self.flagged_tokens]
+                self.id_flags = grown
+            new_tokens = tokens[self.flagged_tokens:]
+            flags = self.contains(new_tokens).astype(np.uint8) * np.uint8(IN_DICTIONARY)
+            flags |= np.array([any(char.isalpha() for char in token) for token in new_tokens], dtype=np.uint8) \
+                * np.uint8(ALPHABETIC)
+            self.id_flags[self.flagged_tokens:len(tokens)] = flags
+            self.flagged_tokens = len(tokens)
+        return self.id_flags[:len(tokens)]
+
+    def forget_tokens(self, kept: int):
+        """
+        Drop the flags of every token ID from kept on, after the vocabulary handed those IDs back.
+        """
+        self.flagged_tokens = min(self.flagged_tokens, kept)
+
+
+if __name__ == "__main__":
+    prepare_dictionary_data()
@@ -0,0 +1,200 @@
+from concurrent.futures import ProcessPoolExecutor
+from config import RESAMPLING_METHODS
+from essay_stats import BatchManager
+from inference import MAX_SAMPLE_SIZE, METRIC_NAMES, adjust_p_values
+from instrumentation import get_timers
+from time import time, perf_counter
+import json
+import numpy as np
+
+RESULTS_PATH = "data/resampling_results.json"
+# Upper bound on the number of values gathered at once, about 32MB of float64
+CHUNK_ELEMENTS = 1 << 22
+P_VALUE_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def chunk_sizes(replicates: int, row_elements: int):
+    """
+    Split replicates into chunks of replicate rows holding at most CHUNK_ELEMENTS values between them.
+    """
+    chunk = max(1, CHUNK_ELEMENTS // max(1, row_elements))
+    for start in range(0, replicates, chunk):
+        yield min(chunk, replicates - start)
+
+
+def welch_p_values(mean_one: np.ndarray, var_one: np.ndarray, n_one: int,
+                   mean_two: np.ndarray, var_two: np.ndarray, n_two: int) -> np.ndarray:
+    """
+    Two-sided Welch's t-test p-values for whole arrays of sample moments at once.
+    """
+    from scipy.stats import t
+    with np.errstate(divide="ignore", invalid="ignore"):
+        se_one = var_one / n_one
+        se_two = var_two / n_two
+        t_stat = (mean_one - mean_two) / np.sqrt(se_one + se_two)
+        df = (se_one + se_two) ** 2 / (se_one ** 2 / (n_one - 1) + se_two ** 2 / (n_two - 1))
+    return 2 * t.sf(np.abs(t_stat), df)
+
+
+def replicate_moments(column: np.ndarray, indices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Mean and sample variance of column over every row of the index matrix.
+    """
+    sample = np.take(column, indices)
+    size = indices.shape[1]
+    mean = sample.sum(axis=1) / size
+    squares = np.einsum("ij,ij->i", sample, sample)
+    return mean, np.maximum(squares - size * mean * mean, 0) / (size - 1)
+
+
+def bootstrap(one: np.ndarray, two: np.ndarray, replicates: int, rng: np.random.Generator,
+              resample_size: int = MAX_SAMPLE_SIZE, confidence: float = 0.95, alpha: float = 0.01) -> list[dict]:
+    """
+    Bootstrap every metric column of one against the same column of two.
+
+    Each replicate draws min(n, resample_size) essays with replacement from each side, the same
+    essays for every metric, as one row of an index matrix, and runs Welch's t-test on them. The
+    spread of those p-values shows how much a single subsample of that size can be trusted. The
+    confidence interval for the mean difference is the m-out-of-n percentile interval: each side's
+    replicate means are shrunk towards the full mean by sqrt(m/n), the variability of a mean of n.
+    """
+    n_one, n_two = len(one), len(two)
+    m_one, m_two = min(n_one, resample_size), min(n_two, resample_size)
+    # Each side's deviation is scaled by its own subsample fraction, both are 1 when nothing is subsampled
+    shrink_one, shrink_two = np.sqrt(m_one / n_one), np.sqrt(m_two / n_two)
+    mean_all_one, mean_all_two = one.mean(axis=0), two.mean(axis=0)
+    # Gathering from one contiguous column at a time is several times faster than gathering rows
+    columns_one, columns_two = np.ascontiguousarray(one.T), np.ascontiguousarray(two.T)
+    deviations = np.empty((replicates, one.shape[1]))
+    p_values = np.empty((replicates, one.shape[1]))
+    done = 0
+    for chunk in chunk_sizes(replicates, m_one + m_two):
+        indices_one = rng.integers(0, n_one, size=(chunk, m_one))
+        indices_two = rng.integers(0, n_two, size=(chunk, m_two))
+        rows = slice(done, done + chunk)
+        for column in range(one.shape[1]):
+            mean_one, var_one = replicate_moments(columns_one[column], indices_one)
+            mean_two, var_two = replicate_moments(columns_two[column], indices_two)
+            deviations[rows, column] = (mean_one - mean_all_one[column]) * shrink_one - \
+                (mean_two - mean_all_two[column]) * shrink_two
+            p_values[rows, column] = welch_p_values(mean_one, var_one, m_one, mean_two, var_two, m_two)
+        done += chunk
+
+    observed = mean_all_one - mean_all_two
+    tail = (1 - confidence) / 2
+    low, high = observed + np.quantile(deviations, [tail, 1 - tail], axis=0)
+    results = []
+    for column in range(one.shape[1]):
+        column_p = p_values[:, column]
+        column_p = column_p[~np.isnan(column_p)]
+        quantiles = np.quantile(column_p, P_VALUE_QUANTILES) if len(column_p) else [float("nan")] * len(P_VALUE_QUANTILES)
+        results.append({
+            "mean-difference": float(observed[column]),
+            "confidence-interval": [float(low[column]), float(high[column])],
+            "confidence": confidence,
+            "p-value-quantiles": {f"{q:g}": float(value) for q, value in zip(P_VALUE_QUANTILES, quantiles)},
+            "rejection-rate": float(np.mean(column_p < alpha)) if len(column_p) else float("nan"),
+            "resample-sizes": [m_one, m_two],
+            "replicates": replicates,
+            "test-type": "Bootstrap Welch T-Test"
+        })
+    return results
+
+
+def permutation(one: np.ndarray, two: np.ndarray, replicates: int, rng: np.random.Generator,
+                resample_size: int = MAX_SAMPLE_SIZE) -> list[dict]:
+    """
+    Permutation test for the difference in means of every metric column. Sides holding more than
+    resample_size essays are first subsampled without replacement. Each replicate is one row of a
+    matrix of shuffled pooled indices, whose first n_one entries make up the relabelled first side.
+    """
+    if len(one) > resample_size:
+        one = one[rng.choice(len(one), resample_size, replace=False)]
+    if len(two) > resample_size:
+        two = two[rng.choice(len(two), resample_size, replace=False)]
+    n_one, n_two = len(one), len(two)
+    pooled = np.ascontiguousarray(np.concatenate((one, two)).T)
+    total = pooled.sum(axis=1)
+    observed = one.mean(axis=0) - two.mean(axis=0)
+    # Compare with a little slack so permutations that tie the observed difference count despite rounding
+    threshold = np.abs(observed) * (1 - 1e-12)
+    extreme = np.zeros(one.shape[1], dtype=np.int64)
+    labels = np.arange(n_one + n_two)
+    for chunk in chunk_sizes(replicates, 2 * (n_one + n_two)):
+        first_indices = rng.permuted(np.broadcast_to(labels, (chunk, n_one + n_two)), axis=1)[:, :n_one]
+        for column in range(one.shape[1]):
+            first = np.take(pooled[column], first_indices).sum(axis=1)
+            differences = first / n_one - (total[column] - first) / n_two
+            extreme[column] += np.count_nonzero(np.abs(differences) >= threshold[column])
+    p_values = (extreme + 1) / (replicates + 1)
+    return [{
+        "mean-difference": float(observed[column]),
+        "p-value": float(p_values[column]),
+        "sample-sizes": [n_one, n_two],
+        "replicates": replicates,
+        "test-type": "Permutation Test"
+    } for column in range(one.shape[1])]
+
+
+def resample_job(job: tuple) -> tuple[list[dict], float]:
+    """
+    Resample one stratification, returning the results for every metric and how long they took.
+    """
+    method, one, two, replicates, seed_sequence, resample_size, confidence, alpha = job
+    start = perf_counter()
+    rng = np.random.default_rng(seed_sequence)
+    if len(one) < 2 or len(two) < 2:
+        results = [{"error": "fewer than two essays on a side"} for _ in range(one.shape[1])]
+    elif method == "bootstrap":
+        results = bootstrap(one, two, replicates, rng, resample_size, confidence, alpha)
+    else:
+        results = permutation(one, two, replicates, rng, resample_size)
+    return results, perf_counter() - start
+
+
+def resample_batches(batch_one: BatchManager, batch_two: BatchManager, method: str = "bootstrap",
+                     replicates: int = 10000, alpha: float = 0.01, seed: int | None = None,
+                     results_path: str = RESULTS_PATH, workers: int = 1, correction: str = "none",
+                     resample_size: int = MAX_SAMPLE_SIZE, confidence: float = 0.95):
+    """
+    Resampling counterpart of compare_batches: runs the given number of bootstrap or permutation
+    replicates for every metric of every word count stratification, written to results_path in the same layout as
+    inference_results.json. Each stratification gets its own random stream spawned from seed, so a
+    seed gives the same results with any number of workers.
+    """
+    if method not in RESAMPLING_METHODS:
+        raise ValueError(f"Unknown resampling method {method}, expected one of {RESAMPLING_METHODS}")
+    # Imported up front so the pool workers, forked from this process, do not each import SciPy again
+    import scipy.stats
+    one = batch_one.get_batches()
+    two = batch_two.get_batches()
+    start = time()
+    streams = np.random.SeedSequence(seed).spawn(len(one))
+    jobs = [(method, one[i][1].feature_matrix(), two[i][1].feature_matrix(), replicates, streams[i],
+             resample_size, confidence, alpha) for i in range(len(one))]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(resample_job, jobs))
+    else:
+        outcomes = [resample_job(job) for job in jobs]
+
+    timers = get_timers()
+    for (test_name, _), (_, seconds) in zip(one, outcomes):
+        timers.add(f"resample/{test_name}", seconds)
+    outcomes = [results for results, _ in outcomes]
+
+    if method == "permutation":
+        tests = [test for bucket in outcomes for test in bucket if "p-value" in test]
+        adjusted = adjust_p_values(np.array([test["p-value"] for test in tests]), correction)
+        for test, adjusted_pval in zip(tests, adjusted):
+            if correction != "none":
+                test["adjusted-p-value"] = float(adjusted_pval)
+                test["correction"] = correction
+            test["reject-null"] = "yes" if adjusted_pval < alpha else "no"
+
+    results = {one[i][0]: dict(zip(METRIC_NAMES, outcomes[i])) for i in range(len(one))}
+    end = time()
+    print(f"Resampling took {end - start} seconds")
+    with open(results_path, "w", encoding="utf-8") as results_file:
+        json.dump(results, results_file, ensure_ascii=False, indent=2)
+    return results
@@ -0,0 +1,57 @@
+from random import Random
+
+
+def sample_indices(rng: Random, population: int, sample_size: int) -> list[int]:
+    """
+    Draw sample_size distinct indices from range(population) in O(sample_size) time and memory.
+    """
+    if sample_size >= population:
+        return list(range(population))
+    return rng.sample(range(population), sample_size)
+
+
+class Reservoir:
+    """
+    Uniform random sample of at most `size` rows from a stream of unknown length (Algorithm R).
+    Reservoirs built over separate streams can be merged into a uniform sample of both.
+    """
+    def __init__(self, size: int, seed: int | None = 0):
+        self.size = size
+        self.seen = 0
+        self.rows: list[tuple] = []
+        self.rng = Random(seed)
+
+    def add(self, row: tuple):
+        self.seen += 1
+        if len(self.rows) < self.size:
+            self.rows.append(row)
+        else:
+            index = self.rng.randrange(self.seen)
+            if index < self.size:
+                self.rows[index] = row
+
+    def merge(self, other: "Reservoir"):
+        if other.seen == 0:
+            return
+        if self.seen + other.seen <= self.size:
+            self.rows.extend(other.rows)
+            self.seen += other.seen
+            return
+        # Decide draw by draw which stream each kept row comes from, weighted by how many rows of
+        # each stream are still unaccounted for, then take that many rows from each reservoir.
+        mine_left = self.seen
+        theirs_left = other.seen
+        from_mine = 0
+        for _ in range(min(self.size, self.seen + other.seen)):
+            if self.rng.randrange(mine_left + theirs_left) < mine_left:
+                from_mine += 1
+                mine_left -= 1
+            else:
+                theirs_left -= 1
+        from_theirs = min(self.size, self.seen + other.seen) - from_mine
+        self.rows = self.rng.sample(self.rows, min(from_mine, len(self.rows))) + \
+            self.rng.sample(other.rows, min(from_theirs, len(other.rows)))
+        self.seen += other.seen
+
+    def sample(self, rng: Random, sample_size: int) -> list[tuple]:
+        return [self.rows[index] for index in sample_indices(rng, len(self.rows), sample_size)]
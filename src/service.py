@@ -0,0 +1,141 @@
+from config import PipelineConfig, VOCABULARY_LIMIT
+from essay_reader import parse_essay
+from essay_data import get_vocabulary
+from essay_stats import BatchManager, EssayStats, release_overflow_tokens, word_totals
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from opted_reader import configure_default_dictionary, get_default_dictionary
+from time import perf_counter
+from word_frequency import configure_default_manager, get_default_manager
+import json
+import sys
+
+WARM_UP_ESSAY = "The service reads the word frequency index once. Then every essay is scored right away."
+
+
+class EssayScorer:
+    """
+    Parses and scores essays on request with the word frequency index, the dictionary, the
+    tokenizer and the per-token score and dictionary arrays kept warm between requests. Each essay
+    gets its EssayStats features and the name of the bucket BatchManager would put it in. Only the
+    first vocabulary_limit distinct tokens stay in the vocabulary; later new words get overflow IDs
+    that are released after each batch, so memory stays flat however many new words come in.
+    """
+    def __init__(self, config: PipelineConfig, column: str = "word_count", edges: list[float] | None = None,
+                 vocabulary_limit: int = VOCABULARY_LIMIT):
+        self.strict = config.strict
+        vocabulary = get_vocabulary()
+        vocabulary.limit = max(vocabulary_limit, len(vocabulary))
+        configure_default_manager(config.frequency_index_path, config.frequency_csv_path)
+        get_default_manager()
+        configure_default_dictionary(config.dictionary_index_path, config.dictionary_csv_path)
+        get_default_dictionary()
+        self.batches = BatchManager(False, edges=edges, column=column)
+        self.score_batch([{"text": WARM_UP_ESSAY}])
+
+    def score_batch(self, essays: list[dict]) -> list[dict]:
+        """
+        Features and bucket of each {"text": ..., "ai_author": ..., "id": ...} essay, "ai_author"
+        and "id" being optional. An essay that cannot be scored gets an "error" instead.
+        """
+        results: list[dict] = []
+        parsed = []
+        for essay in essays:
+            result = {"id": essay["id"]} if isinstance(essay, dict) and "id" in essay else {}
+            try:
+                parsed.append((result, parse_essay(essay["text"], bool(essay.get("ai_author", False)), self.strict)))
+            except Exception as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+            results.append(result)
+        try:
+            totals = word_totals([essay for _, essay in parsed]).tolist()
+            for (result, essay), essay_totals in zip(parsed, totals):
+                try:
+                    features = EssayStats(essay, essay_totals).features
+                except Exception as e:
+                    result["error"] = f"{type(e).__name__}: {e}"
+                    continue
+                result["features"] = features._asdict()
+                result["bucket"] = self.batches.bucket_label(features)
+        finally:
+            # Nothing parsed in this batch outlives it
+            release_overflow_tokens()
+        return results
+
+    def handle(self, request) -> dict:
+        """
+        Answer one request: a single essay object, or {"essays": [...], "id": ...} for a micro-batch.
+        """
+        if isinstance(request, dict) and "essays" in request:
+            start = perf_counter()
+            response = {"results": self.score_batch(request["essays"])}
+            response["milliseconds"] = (perf_counter() - start) * 1000.0
+            if "id" in request:
+                response["id"] = request["id"]
+            return response
+        return self.score_batch([request])[0]
+
+
+def serve_stdio(scorer: EssayScorer, input_stream=sys.stdin, output_stream=sys.stdout):
+    """
+    Answer one JSON request per input line with one JSON line, until the input ends.
+    """
+    print("Scoring service ready, reading JSON lines from stdin", file=sys.stderr)
+    for line in input_stream:
+        if not line.strip():
+            continue
+        try:
+            response = scorer.handle(json.loads(line))
+        except (ValueError, KeyError, TypeError) as e:
+            response = {"error": f"{type(e).__name__}: {e}"}
+        output_stream.write(json.dumps(response, ensure_ascii=False) + "\n")
+        output_stream.flush()
+
+
+def serve_http(scorer: EssayScorer, host: str = "127.0.0.1", port: int = 8765):
+    """
+    Answer POST /score requests with the same JSON bodies as serve_stdio, one request at a time.
+    GET /health answers once the scorer is warm.
+    """
+    class ScoringHandler(BaseHTTPRequestHandler):
+        # Keep-alive connections, so clients do not pay for a new connection per request, and no
+        # Nagle delay between the headers and the body of a response
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def send_json(self, status: int, body):
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self.send_json(200, {"status": "ok"})
+            else:
+                self.send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/score":
+                self.send_json(404, {"error": "not found"})
+                return
+            try:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                response = scorer.handle(json.loads(body))
+            except (ValueError, KeyError, TypeError) as e:
+                self.send_json(400, {"error": f"{type(e).__name__}: {e}"})
+                return
+            self.send_json(200, response)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = HTTPServer((host, port), ScoringHandler)
+    print(f"Scoring service ready on http://{host}:{server.server_port}/score", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,180 @@
+from hashlib import blake2b
+from heapq import nlargest
+from math import ceil
+from operator import itemgetter
+from random import Random
+import numpy as np
+
+
+def derived_seed(*parts) -> int:
+    """
+    Seed for one random generator out of many, derived from a run's seed and the generator's place
+    in the run, the same in every process and on every run.
+    """
+    return int.from_bytes(blake2b(repr(parts).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class QuantileSketch:
+    """
+    KLL quantile sketch. Keeps O(k log(n/k)) values no matter how many are added, answers rank
+    queries to within roughly 1.7/k of the true rank, and two sketches can be merged into one
+    that summarizes both streams. The compaction coin flips come from seed, so the same values added
+    and merged in the same order always give the same sketch.
+    """
+    def __init__(self, k: int = 200, seed: int = 0):
+        self.k = k
+        self.count = 0
+        self.compactors: list[list[float]] = []
+        self.size = 0
+        self.max_size = 0
+        self.rng = Random(seed)
+        self.grow()
+
+    def grow(self):
+        self.compactors.append([])
+        self.max_size = sum(self.capacity(height) for height in range(len(self.compactors)))
+
+    def capacity(self, height: int) -> int:
+        depth = len(self.compactors) - height - 1
+        return int(ceil(self.k * (2.0 / 3.0) ** depth)) + 1
+
+    def add_value(self, val: float):
+        self.compactors[0].append(val)
+        self.size += 1
+        self.count += 1
+        if self.size >= self.max_size:
+            self.compress()
+
+    def compress(self):
+        for height in range(len(self.compactors)):
+            compactor = self.compactors[height]
+            if len(compactor) >= self.capacity(height):
+                if height + 1 >= len(self.compactors):
+                    self.grow()
+                compactor.sort()
+                # An odd item out stays behind at this level
+                leftover = [compactor.pop()] if len(compactor) % 2 == 1 else []
+                self.compactors[height + 1].extend(compactor[self.rng.randint(0, 1)::2])
+                self.compactors[height] = leftover
+                self.size = sum(len(c) for c in self.compactors)
+                if self.size < self.max_size:
+                    break
+
+    def merge(self, other: "QuantileSketch"):
+        while len(self.compactors) < len(other.compactors):
+            self.grow()
+        for height, compactor in enumerate(other.compactors):
+            self.compactors[height].extend(compactor)
+        self.count += other.count
+        self.size = sum(len(c) for c in self.compactors)
+        while self.size >= self.max_size:
+            self.compress()
+
+    def quantile(self, q: float) -> float:
+        """
+        Approximate value at quantile q (0.0 - 1.0) of everything added so far.
+        """
+        weighted = sorted((val, 1 << height) for height, compactor in enumerate(self.compactors) for val in compactor)
+        if not weighted:
+            return float("nan")
+        total = sum(weight for _, weight in weighted)
+        target = q * total
+        cumulative = 0
+        for val, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return val
+        return weighted[-1][0]
+
+
+class CountMinSketch:
+    """
+    Count-min sketch: depth rows of width counters, each item adding its count to one counter per
+    row. An item's estimate is the smallest of its counters, never below its true count and above
+    it by at most 2.72 / width of the total with probability 1 - e^-depth. Items are given as
+    64-bit hashes, split into the two halves of a double hashing scheme. Sketches of the same shape
+    merge by adding their counters.
+    """
+    def __init__(self, width: int = 1 << 15, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.counters = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def columns(self, hashes: np.ndarray) -> np.ndarray:
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((low + rows * high) % np.uint64(self.width)).astype(np.intp)
+
+    def add(self, hashes: np.ndarray, counts: np.ndarray):
+        for row, columns in zip(self.counters, self.columns(hashes)):
+            np.add.at(row, columns, counts)
+        self.total += int(counts.sum())
+
+    def estimate(self, hashes: np.ndarray) -> np.ndarray:
+        columns = self.columns(hashes)
+        return np.take_along_axis(self.counters, columns, axis=1).min(axis=0)
+
+    def merge(self, other: "CountMinSketch"):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("Cannot merge count-min sketches of different shapes")
+        self.counters += other.counters
+        self.total += other.total
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-k summary: at most k monitored items with an overestimated count and the
+    most it can be over by. An item that is not monitored starts from the smallest monitored
+    count, which becomes its error, and only the k largest counts are kept, so every item with a
+    true count above total / k is monitored.
+    """
+    def __init__(self, k: int = 1000):
+        self.k = k
+        self.counts: dict[str, int] = {}
+        self.errors: dict[str, int] = {}
+
+    def minimum(self) -> int:
+        return min(self.counts.values()) if len(self.counts) >= self.k else 0
+
+    def add(self, items: list[str], counts: list[int]):
+        """
+        Add a batch of distinct items with their counts. The batch is merged in as an exact summary
+        of its own, which keeps the error bound of adding the items one by one at a fraction of
+        the cost when most of them are new.
+        """
+        floor = self.minimum()
+        monitored = self.counts
+        errors = self.errors
+        for item, count in zip(items, counts):
+            if item in monitored:
+                monitored[item] += count
+            else:
+                monitored[item] = floor + count
+                errors[item] = floor
+        if len(monitored) > self.k:
+            kept = nlargest(self.k, monitored.items(), key=itemgetter(1))
+            self.counts = dict(kept)
+            self.errors = {item: errors[item] for item in self.counts}
+
+    def merge(self, other: "SpaceSaving"):
+        """
+        Combine with a summary of another stream. An item missing from one summary is counted at
+        that summary's smallest count, the most it can have had there.
+        """
+        floor, other_floor = self.minimum(), other.minimum()
+        merged = {}
+        for item in self.counts.keys() | other.counts.keys():
+            merged[item] = (self.counts.get(item, floor) + other.counts.get(item, other_floor),
+                            self.errors.get(item, floor) + other.errors.get(item, other_floor))
+        kept = nlargest(self.k, merged.items(), key=lambda entry: entry[1][0])
+        self.counts = {item: count for item, (count, _) in kept}
+        self.errors = {item: error for item, (_, error) in kept}
+
+    def top(self) -> list[tuple[str, int, int]]:
+        """
+        (item, count, error) of every monitored item, largest count first.
+        """
+        return sorted(((item, count, self.errors[item]) for item, count in self.counts.items()),
+                      key=lambda entry: (-entry[1], entry[0]))
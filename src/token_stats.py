@@ -0,0 +1,156 @@
+from array import array
+from bisect import bisect_left
+from config import WORD_COUNT_EDGES
+from essay_data import EssayData, get_vocabulary
+from essay_stats import EssayFeatures, bucket_labels
+from hashlib import blake2b
+from os import replace
+from sketches import CountMinSketch, SpaceSaving
+import json
+import numpy as np
+
+TOP_TOKENS = 1000
+REPORT_TOKENS = 50
+# Pseudo-count added to every token in the log odds ratios of the report
+PRIOR = 0.5
+
+
+class TokenCounts:
+    """
+    Bounded-memory word and punctuation counts of one author's essays in one bucket.
+    """
+    def __init__(self, top_tokens: int = TOP_TOKENS):
+        self.essays = 0
+        self.sketch = CountMinSketch()
+        self.top = SpaceSaving(top_tokens)
+
+    def merge(self, other: "TokenCounts"):
+        self.essays += other.essays
+        self.sketch.merge(other.sketch)
+        self.top.merge(other.top)
+
+    def estimate(self, tokens: list[str]) -> np.ndarray:
+        """
+        Upper bounds of the counts of tokens: the count-min estimate, or the top-k count when lower.
+        """
+        counts = self.sketch.estimate(token_hashes(tokens))
+        for i, token in enumerate(tokens):
+            if token in self.top.counts:
+                counts[i] = min(counts[i], self.top.counts[token])
+        return counts
+
+
+def token_hashes(tokens: list[str]) -> np.ndarray:
+    return np.array([int.from_bytes(blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+                     for token in tokens], dtype=np.uint64)
+
+
+class CorpusTokenStats:
+    """
+    Streaming word and punctuation counts of the whole corpus per author and word count bucket, in
+    a count-min sketch and a Space-Saving top-k each, so memory stays the same however many essays
+    are added. Tokens are kept as strings, so the stats of worker processes merge into one.
+    """
+    def __init__(self, edges: list[float] = WORD_COUNT_EDGES, top_tokens: int = TOP_TOKENS):
+        self.edges = list(edges)
+        self.labels = bucket_labels(self.edges)
+        self.counts = {author: [TokenCounts(top_tokens) for _ in self.labels] for author in ("ai", "human")}
+        # Hash of every vocabulary token hashed so far, indexed by token ID. Token IDs belong to this
+        # process, so this is left out when pickling
+        self.id_hashes = np.empty(0, dtype=np.uint64)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["id_hashes"] = np.empty(0, dtype=np.uint64)
+        return state
+
+    def hashes_for(self, tokens: list[str]) -> np.ndarray:
+        if len(tokens) > len(self.id_hashes):
+            self.id_hashes = np.concatenate((self.id_hashes, token_hashes(tokens[len(self.id_hashes):])))
+        return self.id_hashes
+
+    def add_essays(self, essays: list[EssayData], features: list[EssayFeatures]):
+        """
+        Count the tokens of a chunk of parsed essays, with one aggregation per author and bucket.
+        """
+        groups: dict[tuple[str, int], list[EssayData]] = {}
+        for essay, essay_features in zip(essays, features):
+            bucket = bisect_left(self.edges, essay_features.word_count)
+            groups.setdefault(("ai" if essay.ai_author else "human", bucket), []).append(essay)
+        tokens = get_vocabulary().tokens
+        hashes = self.hashes_for(tokens)
+        for (author, bucket), group in groups.items():
+            ids = array("I")
+            counts = array("I")
+            for essay in group:
+                ids.extend(essay.word_ids)
+                ids.extend(essay.punctuation_ids)
+                counts.extend(essay.word_counts)
+                counts.extend(essay.punctuation_counts)
+            token_counts = self.counts[author][bucket]
+            token_counts.essays += len(group)
+            if not ids:
+                continue
+            unique_ids, inverse = np.unique(np.frombuffer(ids, dtype=np.uint32), return_inverse=True)
+            totals = np.bincount(inverse, weights=np.frombuffer(counts, dtype=np.uint32)).astype(np.int64)
+            token_counts.sketch.add(hashes[unique_ids], totals)
+            token_counts.top.add([tokens[token_id] for token_id in unique_ids.tolist()], totals.tolist())
+
+    def merge(self, other: "CorpusTokenStats"):
+        if self.edges != other.edges:
+            raise ValueError("Cannot merge token stats bucketed at different edges")
+        for author, buckets in self.counts.items():
+            for counts, other_counts in zip(buckets, other.counts[author]):
+                counts.merge(other_counts)
+
+    def distinguishing(self, ai: list[TokenCounts], human: list[TokenCounts], limit: int) -> dict:
+        """
+        The tokens most over-represented in the AI and in the human essays of the given buckets,
+        ranked by the z-score of their log odds ratio between the two, out of the top tokens of
+        either.
+        """
+        candidates = sorted(set().union(*(counts.top.counts for counts in ai + human)))
+        ai_total = sum(counts.sketch.total for counts in ai)
+        human_total = sum(counts.sketch.total for counts in human)
+        summary = {
+            "essays": {"ai": sum(counts.essays for counts in ai), "human": sum(counts.essays for counts in human)},
+            "tokens": {"ai": ai_total, "human": human_total}
+        }
+        if not candidates or ai_total == 0 or human_total == 0:
+            return {**summary, "ai": [], "human": []}
+        ai_counts = sum(counts.estimate(candidates) for counts in ai).astype(np.float64)
+        human_counts = sum(counts.estimate(candidates) for counts in human).astype(np.float64)
+        log_odds = (np.log((ai_counts + PRIOR) / (ai_total - ai_counts + PRIOR))
+                    - np.log((human_counts + PRIOR) / (human_total - human_counts + PRIOR)))
+        z_scores = log_odds / np.sqrt(1.0 / (ai_counts + PRIOR) + 1.0 / (human_counts + PRIOR))
+        order = np.argsort(-z_scores, kind="stable")
+
+        def entry(i: int) -> dict:
+            return {
+                "token": candidates[i],
+                "ai_count": int(ai_counts[i]),
+                "human_count": int(human_counts[i]),
+                "ai_per_1000": float(1000.0 * ai_counts[i] / ai_total),
+                "human_per_1000": float(1000.0 * human_counts[i] / human_total),
+                "log_odds_ratio": float(log_odds[i]),
+                "z_score": float(z_scores[i])
+            }
+
+        return {
+            **summary,
+            "ai": [entry(i) for i in order[:limit] if z_scores[i] > 0],
+            "human": [entry(i) for i in order[::-1][:limit] if z_scores[i] < 0]
+        }
+
+    def to_json(self, limit: int = REPORT_TOKENS) -> dict:
+        ai, human = self.counts["ai"], self.counts["human"]
+        return {
+            "overall": self.distinguishing(ai, human, limit),
+            "by_bucket": {label: self.distinguishing([ai[i]], [human[i]], limit) for i, label in enumerate(self.labels)}
+        }
+
+    def write_report(self, report_path: str, limit: int = REPORT_TOKENS):
+        temp_path = report_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as report_file:
+            json.dump(self.to_json(limit), report_file, indent=2, ensure_ascii=False)
+        replace(temp_path, report_path)
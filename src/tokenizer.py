@@ -0,0 +1,201 @@
+from collections import Counter
+from csv import reader
+from essay_data import EssayData
+from time import time
+import re
+
+PUNCTUATION = [
+    "\"", "'", ",", ".", "!", "?", "/", "-", ":", ";", "(", ")", "[", "]", "{", "}", "<", ">", "@", "#", "$", "%", "^", "&", "*",
+    "_", "+", "=", "~", "`", "|", "\\", "«", "»", "“", "”", "‘", "’", "•", "…"
+]
+SENTENCE_ENDINGS = ".!?…"
+
+PUNCTUATION_SET = frozenset(PUNCTUATION)
+PUNCTUATION_ORDER: dict[str, int] = {punc: i for i, punc in enumerate(PUNCTUATION)}
+STRIP_PUNCTUATION = str.maketrans("", "", "".join(PUNCTUATION))
+PUNCTUATION_RE = re.compile("[" + re.escape("".join(PUNCTUATION)) + "]")
+SENTENCE_RE = re.compile(f"[^{re.escape(SENTENCE_ENDINGS)}]*(?:[{re.escape(SENTENCE_ENDINGS)}]+|$)")
+
+
+def tokenize_essay(essay: str, ai_author: bool, strict: bool = True) -> EssayData:
+    """
+    Split an essay into sentences of word and punctuation counts in a single pass.
+
+    In strict mode the output is identical to the original parse_essay: sentences only end at ".",
+    a token mixing letters and punctuation counts each mark once, and the first occurrence of a
+    punctuation mark in a sentence is counted twice. Otherwise sentences end at any of
+    SENTENCE_ENDINGS and every punctuation mark is counted exactly once.
+    """
+    if strict:
+        return _tokenize_strict(essay, ai_author)
+    return _tokenize(essay, ai_author)
+
+
+def _tokenize_strict(essay: str, ai_author: bool) -> EssayData:
+    # (word count, word counts, punctuation counts) of every sentence, turned into IDs in one go
+    sentences = []
+    skipped = 0
+    for sentence in essay.split("."):
+        words: list[str] = []
+        punctuation: list[str] = []
+        for word in sentence.lower().split():
+            if word.isalpha() or word.isnumeric():
+                words.append(word)
+            elif word in PUNCTUATION_SET:
+                punctuation.append(word)
+            else:
+                found = PUNCTUATION_SET.intersection(word)
+                if found:
+                    punctuation.extend(sorted(found, key=PUNCTUATION_ORDER.__getitem__))
+                    word = word.translate(STRIP_PUNCTUATION)
+                words.append(word)
+        if words:
+            counts = {punc: count + 1 for punc, count in Counter(punctuation).items()} if punctuation else {}
+            counts["."] = 2 + skipped
+            sentences.append((len(words), Counter(words), counts))
+            skipped = 0
+        else:
+            skipped += 1
+    essay_data = EssayData(ai_author)
+    essay_data.set_sentences(sentences)
+    return essay_data
+
+
+def _tokenize(essay: str, ai_author: bool) -> EssayData:
+    sentences = []
+    carried: list[str] = []
+    for match in SENTENCE_RE.finditer(essay.lower()):
+        sentence = match.group()
+        if not sentence:
+            continue
+        punctuation = PUNCTUATION_RE.findall(sentence)
+        words = sentence.translate(STRIP_PUNCTUATION).split()
+        if words:
+            sentences.append((len(words), Counter(words), Counter(carried + punctuation)))
+            carried = []
+        else:
+            carried.extend(punctuation)
+    if carried and sentences:
+        sentences[-1][2].update(carried)
+    essay_data = EssayData(ai_author)
+    essay_data.set_sentences(sentences)
+    return essay_data
+
+
+class LegacyWords:
+    """
+    The original dict-based sentence, unchanged, so legacy_parse_essay runs at its original speed.
+    """
+    def __init__(self):
+        self.word_count = 0
+        self.unique_word_count = 0
+        self.words: dict[str,int] = {}
+        self.punctuation: dict[str,int] = {}
+
+    def add_word(self, word:str):
+        if self.words.get(word) == None:
+            self.words[word] = 1
+            self.unique_word_count += 1
+        else:
+            self.words[word] = self.words[word] + 1
+        self.word_count += 1
+
+    def add_punctuation(self, punctuation:str):
+        if self.punctuation.get(punctuation) == None:
+            self.punctuation[punctuation] = 1
+        self.punctuation[punctuation] = self.punctuation[punctuation] + 1
+
+    def to_json(self):
+        return {
+            "word_count": self.word_count,
+            "unique_word_count": self.unique_word_count,
+            "words": self.words,
+            "punctuation": self.punctuation
+        }
+
+
+class LegacyEssayData:
+    """
+    The original essay container, holding LegacyWords sentences.
+    """
+    def __init__(self, ai_author: bool):
+        self.ai_author: bool = ai_author
+        self.sentences: list[LegacyWords] = []
+
+    def to_json(self):
+        return {
+            "ai_author": self.ai_author,
+            "sentence_data": [sentence.to_json() for sentence in self.sentences]
+        }
+
+
+def legacy_parse_essay(essay: str, ai_author: bool) -> LegacyEssayData:
+    """
+    The original token-by-token parser with its original data classes, kept as the reference for
+    strict mode and as the baseline its speed is measured against.
+    """
+    sentences = essay.split(".")
+    essay_data = LegacyEssayData(ai_author)
+    skipped = 0
+    for sentence in sentences:
+        essay_sentence = LegacyWords()
+        words = sentence.split()
+        for word in words:
+            word = word.lower()
+            if word in PUNCTUATION:
+                essay_sentence.add_punctuation(word)
+            elif word.isalpha():
+                # Word is a word
+                essay_sentence.add_word(word)
+            elif word.isnumeric():
+                # Word is a number
+                essay_sentence.add_word(word)
+            else:
+                # Unidentified case
+                for punc in PUNCTUATION:
+                    if punc in word:
+                        essay_sentence.add_punctuation(punc)
+                        word = word.replace(punc, "")
+                essay_sentence.add_word(word)
+        if essay_sentence.word_count > 0:
+            essay_sentence.add_punctuation(".")
+            if skipped > 0:
+                for _ in range(skipped):
+                    essay_sentence.add_punctuation(".")
+            essay_data.sentences.append(essay_sentence)
+            skipped = 0
+        else:
+            skipped += 1
+    return essay_data
+
+
+def check_equivalence(file_path, limit: int | None = None) -> int:
+    """
+    Parse every essay in the CSV with both legacy_parse_essay and strict tokenize_essay, print the
+    rows where the output differs along with the time taken by each, and return the mismatch count.
+    """
+    mismatches = 0
+    legacy_time = 0.0
+    strict_time = 0.0
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
+        csv_reader = reader(file)
+        next(csv_reader)
+        for row_number, row in enumerate(csv_reader):
+            if limit is not None and row_number >= limit:
+                break
+            start = time()
+            expected = legacy_parse_essay(row[0], True).to_json()
+            legacy_time += time() - start
+            start = time()
+            actual = tokenize_essay(row[0], True).to_json()
+            strict_time += time() - start
+            if expected != actual:
+                mismatches += 1
+                print(f"Mismatch on row {row_number}")
+    print(f"Legacy parser: {legacy_time} seconds, strict tokenizer: {strict_time} seconds")
+    return mismatches
+
+
+if __name__ == "__main__":
+    mismatch_count = check_equivalence("../essay_data.csv")
+    print(f"{mismatch_count} mismatched essays")
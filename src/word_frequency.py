@@ -1,9 +1,14 @@
 from csv import writer, reader
+from functools import lru_cache
+from mmap import mmap, ACCESS_READ
+from zlib import crc32
+import numpy as np
+import struct
 
 RAW_PATH = "../word_frequency.txt"
 DATA_PATH = "data/word_frequency.csv"
+INDEX_PATH = "data/word_frequency.idx"
 
-word_rarity_cache: dict[str,float] = {}
 MAX_CACHE_SIZE = 10000
 WORD_RARITY_DIGIT_MULTIPLIERS: dict[str, float] ={
     "11": 1.0,
@@ -15,9 +20,16 @@ WORD_RARITY_DIGIT_MULTIPLIERS: dict[str, float] ={
     "5": 4.0,
 }
 
-def prepare_frequency_data():
+# Index layout: header, float64 score per entry, uint64 blob offset per entry (plus an end offset),
+# uint32 open-addressing hash table of entry number + 1 (0 marks an empty slot), then the words
+# as one UTF-8 blob. Slots are found with crc32 so the table is stable across processes.
+INDEX_MAGIC = b"WFIDX001"
+INDEX_HEADER = struct.Struct("<8sQQQd")
+
+
+def prepare_frequency_data(raw_path: str = RAW_PATH, data_path: str = DATA_PATH, index_path: str = INDEX_PATH):
     raw_lines: list[str] = []
-    with open(RAW_PATH, "r", encoding="utf-8") as file:
+    with open(raw_path, "r", encoding="utf-8") as file:
         raw_lines = file.readlines()
 
     cleaned_lines: list[tuple[str, str, str]] = [("Word", "Rank", "Digits")]
@@ -26,61 +38,152 @@ def prepare_frequency_data():
         word, frequency = raw_lines[i].strip().split()
         cleaned_lines.append((word, str(i + 1), str(len(frequency))))
 
-    with open(DATA_PATH, "w" , encoding="utf-8", newline="") as file:
+    with open(data_path, "w" , encoding="utf-8", newline="") as file:
         csv_writer = writer(file)
         csv_writer.writerows(cleaned_lines)
 
+    build_frequency_index(data_path, index_path)
 
 
-
-def word_rarity_score(word:str):
-    if word in word_rarity_cache:
-        return word_rarity_cache[word]
-    highest_rank = 0
-    with open(DATA_PATH, "r", encoding="utf-8") as file:
-        csv_reader = reader(file)
-        next(csv_reader)
-        for row in csv_reader:
-            highest_rank = int(row[1])
-            if row[0] == word:
-                if len(word_rarity_cache) > MAX_CACHE_SIZE:
-                    evict_cache()
-                word_rarity_cache[word] = float(row[1]) * WORD_RARITY_DIGIT_MULTIPLIERS.get(row[2], 1.0)
-                return word_rarity_cache[word]
-    return highest_rank * 5.0
-
-
-def evict_cache():
-    highest_score = 0.0
-    highest_word = ""
-
-    for word, score in word_rarity_cache.items():
-        if score > highest_score:
-            highest_score = score
-            highest_word = word
-    
-    word_rarity_cache.pop(highest_word)
-
-
-def load_word_frequency_data():
-    print("Loading word frequency data")
-    data: dict[str,float] = {}
-    data.setdefault(-1.0)
-    with open(DATA_PATH, "r", encoding="utf-8") as file:
+def build_frequency_index(csv_path: str = DATA_PATH, index_path: str = INDEX_PATH):
+    """
+    Compile the word frequency CSV into the memory-mappable index read by WordFrequencyDataManager.
+    """
+    scores: dict[str, float] = {}
+    with open(csv_path, "r", encoding="utf-8") as file:
         csv_reader = reader(file)
         next(csv_reader)
         for row in csv_reader:
-            data[row[0]] = float(row[1]) * WORD_RARITY_DIGIT_MULTIPLIERS.get(row[2])
-    print("Word frequency data loaded")
-    return data
+            scores[row[0]] = float(row[1]) * WORD_RARITY_DIGIT_MULTIPLIERS.get(row[2], 1.0)
+    # The dict-backed manager this replaces also counted a stray -1.0 key in its size, keep its penalty
+    oov_score = float(len(scores) + 1) * 5.0
+
+    words = [word.encode("utf-8") for word in scores]
+    offsets = [0]
+    for word in words:
+        offsets.append(offsets[-1] + len(word))
+    table_size = 1
+    while table_size < len(words) * 2:
+        table_size *= 2
+    table = [0] * table_size
+    for entry, word in enumerate(words):
+        slot = crc32(word) & (table_size - 1)
+        while table[slot]:
+            slot = (slot + 1) & (table_size - 1)
+        table[slot] = entry + 1
+
+    with open(index_path, "wb") as file:
+        file.write(INDEX_HEADER.pack(INDEX_MAGIC, len(words), table_size, offsets[-1], oov_score))
+        file.write(struct.pack(f"<{len(words)}d", *scores.values()))
+        file.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        file.write(struct.pack(f"<{table_size}I", *table))
+        file.write(b"".join(words))
+
+
+def word_rarity_score(word:str):
+    return get_default_manager().word_score(word)
+
+
+_default_manager: "WordFrequencyDataManager | None" = None
+_default_paths: tuple[str, str] = (INDEX_PATH, DATA_PATH)
+
+
+def configure_default_manager(index_path: str = INDEX_PATH, csv_path: str = DATA_PATH):
+    """
+    Point the shared manager at a different index. It is opened on first use, not here.
+    """
+    global _default_manager, _default_paths
+    if _default_paths != (index_path, csv_path):
+        _default_paths = (index_path, csv_path)
+        _default_manager = None
+
+
+def get_default_manager() -> "WordFrequencyDataManager":
+    """
+    The manager shared by everything in this process, opened the first time it is needed.
+    """
+    global _default_manager
+    if _default_manager is None:
+        _default_manager = WordFrequencyDataManager(*_default_paths)
+    return _default_manager
+
 
 class WordFrequencyDataManager:
-    def __init__(self):
-        self.data: dict[str,float] = load_word_frequency_data()
-        self.count = float(len(self.data.keys()))
-    def word_score(self, word:str):
-        res = self.data.get(word, -5.0)
-        if res < 0:
-            return self.count * 5.0
-        else:
-            return res
\ No newline at end of file
+    """
+    Read-only view of the compiled word frequency index. The file is memory-mapped, so opening it
+    costs no parsing, and each lookup is a hash probe into the mapped table. A bounded LRU cache
+    sits in front of the lookups; pass cache_size=0 to disable it.
+    """
+    def __init__(self, index_path: str = INDEX_PATH, csv_path: str = DATA_PATH, cache_size: int | None = MAX_CACHE_SIZE):
+        try:
+            file = open(index_path, "rb")
+        except FileNotFoundError:
+            build_frequency_index(csv_path, index_path)
+            file = open(index_path, "rb")
+        with file:
+            self.mapped = mmap(file.fileno(), 0, access=ACCESS_READ)
+        magic, entries, table_size, blob_size, oov_score = INDEX_HEADER.unpack_from(self.mapped, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{index_path} is not a word frequency index, rerun prepare_frequency_data")
+        view = memoryview(self.mapped)
+        scores_start = INDEX_HEADER.size
+        offsets_start = scores_start + entries * 8
+        table_start = offsets_start + (entries + 1) * 8
+        self.blob_start = table_start + table_size * 4
+        self.scores = view[scores_start:offsets_start].cast("d")
+        self.offsets = view[offsets_start:table_start].cast("Q")
+        self.table = view[table_start:self.blob_start].cast("I")
+        self.mask = table_size - 1
+        self.count = float(entries + 1)
+        self.oov_score = oov_score
+        # word_score is bound per instance so the cache (when enabled) is called without extra indirection
+        self.word_score = lru_cache(maxsize=cache_size)(self.lookup) if cache_size else self.lookup
+        # Score of every vocabulary token scored so far, indexed by token ID, see token_scores
+        self.id_scores = np.empty(0, dtype=np.float64)
+        self.scored_tokens = 0
+
+    def lookup(self, word: str) -> float:
+        encoded = word.encode("utf-8")
+        slot = crc32(encoded) & self.mask
+        entry = self.table[slot]
+        while entry:
+            start = self.blob_start + self.offsets[entry - 1]
+            end = self.blob_start + self.offsets[entry]
+            if self.mapped[start:end] == encoded:
+                return self.scores[entry - 1]
+            slot = (slot + 1) & self.mask
+            entry = self.table[slot]
+        return self.oov_score
+
+    def scores_for(self, words) -> list[float]:
+        """
+        Scores for a batch of words, in order.
+        """
+        word_score = self.word_score
+        return [word_score(word) for word in words]
+
+    def token_scores(self, tokens: list[str]) -> np.ndarray:
+        """
+        Scores indexed by token ID for a vocabulary's token list, out-of-vocabulary tokens getting
+        the penalty score. Tokens are looked up once, the first time they are asked for; later
+        calls only score the tokens added since.
+        """
+        if len(tokens) > self.scored_tokens:
+            if len(tokens) > len(self.id_scores):
+                grown = np.empty(max(len(tokens), 2 * len(self.id_scores)), dtype=np.float64)
+                grown[:self.scored_tokens] = self.id_scores[:self.scored_tokens]
+                self.id_scores = grown
+            lookup = self.lookup
+            self.id_scores[self.scored_tokens:len(tokens)] = [lookup(token) for token in tokens[self.scored_tokens:]]
+            self.scored_tokens = len(tokens)
+        return self.id_scores[:len(tokens)]
+
+    def forget_tokens(self, kept: int):
+        """
+        Drop the scores of every token ID from kept on, after the vocabulary handed those IDs back.
+        """
+        self.scored_tokens = min(self.scored_tokens, kept)
+
+
+if __name__ == "__main__":
+    prepare_frequency_data()
@@ -0,0 +1,224 @@
+from config import OUTPUT_FORMATS
+from essay_stats import EssayStats, EssayFeatures
+from instrumentation import get_timers
+from os import listdir, path
+from queue import Queue
+from threading import Thread
+import json
+import numpy as np
+
+
+class EssayWriter:
+    """
+    Destination for the per-essay dumps. EssayIngester in essay_reader.py hands over the essays of
+    one author in batches, numbered by the running essay count of that author.
+    """
+    def write_batch(self, author: str, start: int, end: int, essays: list[EssayStats]):
+        raise NotImplementedError
+
+    def sync(self):
+        """
+        Block until everything handed to the writer so far is on disk.
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonWriter(EssayWriter):
+    """
+    One pretty-printed JSON array per batch, the original dump format.
+    """
+    def __init__(self, data_dir: str, prefix: str = "", sentence_data: str = "full"):
+        self.data_dir = data_dir
+        self.prefix = prefix
+        self.sentence_data = sentence_data
+
+    def write_batch(self, author: str, start: int, end: int, essays: list[EssayStats]):
+        dump_data = [{"ai_author": essay.essay.ai_author, "essay": essay.to_json(self.sentence_data)} for essay in essays]
+        with open(f"{self.data_dir}/{author}/{self.prefix}essay_{start}_{end}.json", "w", encoding="utf-8") as essay_dump_file:
+            json.dump(dump_data, essay_dump_file, ensure_ascii=False, indent=2)
+
+
+class NdjsonWriter(EssayWriter):
+    """
+    One compact JSON object per line, streamed into a single essays.ndjson file per author. With
+    append the records of an earlier run are kept and new ones are added after them.
+    """
+    def __init__(self, data_dir: str, prefix: str = "", sentence_data: str = "full", append: bool = False):
+        self.data_dir = data_dir
+        self.prefix = prefix
+        self.sentence_data = sentence_data
+        self.mode = "a" if append else "w"
+        self.files = {}
+        self.encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def write_batch(self, author: str, start: int, end: int, essays: list[EssayStats]):
+        if author not in self.files:
+            self.files[author] = open(f"{self.data_dir}/{author}/{self.prefix}essays.ndjson", self.mode, encoding="utf-8")
+        encode = self.encoder.encode
+        self.files[author].write("".join(encode(essay.to_json(self.sentence_data)) + "\n" for essay in essays))
+
+    def sync(self):
+        for file in self.files.values():
+            file.flush()
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+        self.files = {}
+
+
+class NpzWriter(EssayWriter):
+    """
+    Scalar features only, one array per feature, in an uncompressed .npz file per batch.
+    """
+    def __init__(self, data_dir: str, prefix: str = ""):
+        self.data_dir = data_dir
+        self.prefix = prefix
+
+    def write_batch(self, author: str, start: int, end: int, essays: list[EssayStats]):
+        columns = list(zip(*(essay.features for essay in essays)))
+        arrays = {name: np.asarray(column) for name, column in zip(EssayFeatures._fields, columns)}
+        arrays["sentence_count"] = np.asarray([essay.essay.sentence_count() for essay in essays])
+        np.savez(f"{self.data_dir}/{author}/{self.prefix}essay_{start}_{end}.npz", **arrays)
+
+
+class BackgroundWriter(EssayWriter):
+    """
+    Runs another writer on its own thread so parsing does not wait on disk. At most queue_size
+    batches are held in memory; past that write_batch blocks until the thread catches up.
+    """
+    def __init__(self, writer: EssayWriter, queue_size: int = 4):
+        self.writer = writer
+        self.queue: Queue = Queue(maxsize=queue_size)
+        self.error: BaseException | None = None
+        self.thread = Thread(target=self.run, name="essay-writer", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            if self.error is None:
+                try:
+                    self.writer.write_batch(*job)
+                except BaseException as e:
+                    self.error = e
+            self.queue.task_done()
+        try:
+            self.writer.close()
+        except BaseException as e:
+            if self.error is None:
+                self.error = e
+
+    def write_batch(self, author: str, start: int, end: int, essays: list[EssayStats]):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((author, start, end, essays))
+
+    def sync(self):
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+        self.writer.sync()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+class TimedWriter(EssayWriter):
+    """
+    Adds the time another writer spends writing batches to the dump_write stage timer, on whichever
+    thread does the writing.
+    """
+    def __init__(self, writer: EssayWriter):
+        self.writer = writer
+
+    def write_batch(self, author: str, start: int, end: int, essays: list[EssayStats]):
+        with get_timers().stage("dump_write"):
+            self.writer.write_batch(author, start, end, essays)
+
+    def sync(self):
+        self.writer.sync()
+
+    def close(self):
+        self.writer.close()
+
+
+def make_writer(data_dir: str, output_format: str = "json", sentence_data: str = "full", queue_size: int = 4,
+                prefix: str = "", append: bool = False) -> EssayWriter:
+    """
+    Writer for the given format, on a background thread unless queue_size is 0. append keeps the
+    records an earlier run streamed into the NDJSON files.
+    """
+    if output_format == "json":
+        writer = JsonWriter(data_dir, prefix, sentence_data)
+    elif output_format == "ndjson":
+        writer = NdjsonWriter(data_dir, prefix, sentence_data, append)
+    elif output_format == "npz":
+        writer = NpzWriter(data_dir, prefix)
+    else:
+        raise ValueError(f"Unknown output format {output_format}, expected one of {OUTPUT_FORMATS}")
+    writer = TimedWriter(writer)
+    if queue_size > 0:
+        return BackgroundWriter(writer, queue_size)
+    return writer
+
+
+def ndjson_sizes(data_dir: str, shards: int | None = None) -> dict[str, int]:
+    """
+    Byte size of every NDJSON dump under data_dir, by path relative to it. With shards, the dumps of
+    shard workers numbered shards or higher, which may still be running, are left out.
+    """
+    sizes = {}
+    for author in ("ai", "human"):
+        author_dir = path.join(data_dir, author)
+        if not path.isdir(author_dir):
+            continue
+        for name in listdir(author_dir):
+            if not name.endswith("essays.ndjson"):
+                continue
+            if shards is not None and name.startswith("shard") and int(name[5:name.index("_")]) >= shards:
+                continue
+            sizes[f"{author}/{name}"] = path.getsize(path.join(author_dir, name))
+    return sizes
+
+
+def next_dump_counters(data_dir: str) -> tuple[dict[str, tuple[int, int]], int]:
+    """
+    Where the numbering of new JSON and NPZ dumps under data_dir continues so no earlier dump is
+    overwritten: per author the dump counters of a serial run, starting after the highest essay
+    number of an unprefixed dump, and the number of the first shard after every shardN_ dump.
+    """
+    counters = {"ai": (0, 0), "human": (0, 0)}
+    shards = 0
+    for author in counters:
+        author_dir = path.join(data_dir, author)
+        if not path.isdir(author_dir):
+            continue
+        for name in listdir(author_dir):
+            if name.startswith("shard") and "_" in name and name[5:name.index("_")].isdigit():
+                shards = max(shards, int(name[5:name.index("_")]) + 1)
+            elif name.startswith("essay_") and name.endswith((".json", ".npz")):
+                end = name[:name.rindex(".")].split("_")[-1]
+                if end.isdigit() and int(end) + 1 > counters[author][0]:
+                    counters[author] = (int(end) + 1, int(end))
+    return counters, shards
+
+
+def truncate_ndjson(data_dir: str, sizes: dict[str, int]):
+    """
+    Cut every NDJSON dump under data_dir back to its size in sizes, emptying those missing from it,
+    so the records written after a checkpoint are not there twice once the run resumes.
+    """
+    for name, size in ndjson_sizes(data_dir).items():
+        keep = sizes.get(name, 0)
+        if size > keep:
+            with open(path.join(data_dir, name), "r+b") as dump_file:
+                dump_file.truncate(keep)
@@ -0,0 +1,5 @@
+import sys
+from os import path
+
+# The modules in src/ import each other by their flat names, as when run from src/
+sys.path.insert(0, path.join(path.dirname(path.dirname(path.abspath(__file__))), "src"))
@@ -0,0 +1,36 @@
+from config import PipelineConfig
+from csv_index import CsvRows, print_rows
+import pytest
+
+
+def test_existing_leaves_an_outdated_index_alone(tmp_path):
+    csv_path, index_path = tmp_path / "essays.csv", tmp_path / "essays.idx"
+    csv_path.write_text('text,generated\n"One essay.",0.0\n', encoding="utf-8")
+    assert CsvRows.existing(str(csv_path), str(index_path)) is None
+    assert not index_path.exists()
+
+    rows = CsvRows(str(csv_path), str(index_path))
+    assert len(rows) == 1
+    rows.close()
+    index = index_path.read_bytes()
+
+    with open(csv_path, "a", encoding="utf-8") as file:
+        file.write('"Another\nessay.",1.0\n')
+    assert CsvRows.existing(str(csv_path), str(index_path)) is None
+    assert index_path.read_bytes() == index
+
+    rows = CsvRows(str(csv_path), str(index_path))
+    assert len(rows) == 2 and rows.row(1) == ["Another\nessay.", "1.0"]
+    rows.close()
+    rows = CsvRows.existing(str(csv_path), str(index_path))
+    assert rows is not None and len(rows) == 2
+    rows.close()
+
+
+def test_print_rows_rejects_row_numbers_out_of_range(tmp_path):
+    config = PipelineConfig(data_dir=str(tmp_path))
+    config.essay_path = str(tmp_path / "essays.csv")
+    (tmp_path / "essays.csv").write_text('text,generated\n"One essay.",0.0\n"Two.",1.0\n', encoding="utf-8")
+    for row in (-1, 2):
+        with pytest.raises(SystemExit, match="out of range"):
+            print_rows(config, [0, row])
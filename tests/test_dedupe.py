@@ -0,0 +1,47 @@
+from benchmarks.synthetic import SyntheticCorpus
+from csv import reader, writer
+from dedupe import deduplicate
+
+
+def read_rows(csv_path) -> list[list[str]]:
+    with open(csv_path, encoding="utf-8", newline="") as file:
+        return list(reader(file))
+
+
+def near_copy(text: str) -> str:
+    """
+    The essay with one word replaced, one dropped and its punctuation and spacing changed.
+    """
+    words = text.replace(",", "").split()
+    words[len(words) // 2] = "zebra"
+    del words[len(words) // 3]
+    return "  ".join(words).upper()
+
+
+def test_planted_exact_and_near_duplicates_are_dropped(tmp_path):
+    header, *rows = read_rows(SyntheticCorpus(essays=120, seed=5).write(str(tmp_path / "corpus"))[0])
+    rows = [row for row in rows if len(row[0].split()) >= 150][:40]
+    assert len(rows) == 40
+    planted = []
+    for i, row in enumerate(rows):
+        planted.append(row)
+        if i % 4 == 1:
+            planted.append(list(row))
+        elif i % 4 == 3:
+            planted.append([near_copy(row[0]), row[1]])
+    source = tmp_path / "planted.csv"
+    with open(source, "w", encoding="utf-8", newline="") as file:
+        writer(file).writerows([header, *planted])
+    exact_copies, near_copies = len(range(1, len(rows), 4)), len(range(3, len(rows), 4))
+
+    report = deduplicate(str(source), str(tmp_path / "near.csv"), "near", 0.8).to_json()
+    assert read_rows(tmp_path / "near.csv") == [header, *rows]
+    assert (report["essays"], report["kept"]) == (len(planted), len(rows))
+    by_author = report["by_author"].values()
+    assert sum(counts["exact"] for counts in by_author) == exact_copies
+    assert sum(counts["near"] for counts in by_author) == near_copies
+
+    report = deduplicate(str(source), str(tmp_path / "exact.csv"), "exact").to_json()
+    kept = read_rows(tmp_path / "exact.csv")
+    assert len(kept) == 1 + len(rows) + near_copies and kept[1:3] == planted[:2]
+    assert report["dropped"] == exact_copies
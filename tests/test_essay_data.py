@@ -0,0 +1,20 @@
+from essay_data import Vocabulary
+
+
+def test_overflow_tokens_are_released_and_their_ids_reused():
+    vocabulary = Vocabulary(limit=2)
+    assert [vocabulary.token_id(token) for token in ("a", "b", "c", "d", "a")] == [0, 1, 2, 3, 0]
+
+    assert vocabulary.release_overflow() == 2
+    assert vocabulary.tokens == ["a", "b"]
+    assert dict(vocabulary.ids) == {"a": 0, "b": 1}
+    assert vocabulary.token_id("e") == 2
+    assert vocabulary.token_id("b") == 1
+
+
+def test_unlimited_vocabulary_keeps_every_token():
+    vocabulary = Vocabulary()
+    for token in ("a", "b", "c"):
+        vocabulary.token_id(token)
+    assert vocabulary.release_overflow() == 3
+    assert len(vocabulary) == 3
@@ -0,0 +1,68 @@
+from benchmarks.synthetic import SyntheticCorpus
+from csv import reader
+from essay_data import get_vocabulary
+from essay_stats import FloatStat, IntegerStat, word_totals
+import numpy as np
+from opted_reader import configure_default_dictionary, get_default_dictionary, prepare_dictionary_data
+from tokenizer import tokenize_essay
+from word_frequency import configure_default_manager, get_default_manager, prepare_frequency_data
+
+
+def test_merged_stats_match_one_stat_over_all_values():
+    values = np.random.default_rng(5).lognormal(3, 2, 10_000)
+    serial = FloatStat("values")
+    for value in values.tolist():
+        serial.add_value(value)
+    merged = FloatStat("values")
+    for shard in np.array_split(values, 7):
+        part = FloatStat("values")
+        part.add_values(shard)
+        merged.merge(part)
+    assert merged.to_json() == serial.to_json()
+    assert merged.get_average() == float(values.sum()) / len(values)
+
+
+def test_median_of_even_length_input_averages_the_middle_values():
+    stat = IntegerStat("values")
+    for value in (7, 1, 4, 10):
+        stat.add_value(value)
+    assert stat.get_median() == 5.5
+    stat.add_value(2)
+    assert stat.get_median() == 4.0
+    assert np.isnan(IntegerStat("empty").get_median())
+
+
+def test_word_totals_match_a_word_by_word_loop(tmp_path):
+    corpus = SyntheticCorpus(essays=60, seed=11)
+    csv_path, list_path, dictionary_path = corpus.write(str(tmp_path))
+    frequency_csv, frequency_index = str(tmp_path / "frequency.csv"), str(tmp_path / "frequency.idx")
+    dictionary_csv, dictionary_index = str(tmp_path / "dictionary.csv"), str(tmp_path / "dictionary.idx")
+    prepare_frequency_data(list_path, frequency_csv, frequency_index)
+    prepare_dictionary_data(dictionary_path, dictionary_csv, dictionary_index)
+    configure_default_manager(frequency_index, frequency_csv)
+    configure_default_dictionary(dictionary_index, dictionary_csv)
+    try:
+        with open(csv_path, encoding="utf-8", newline="") as file:
+            rows = list(reader(file))[1:]
+        rows.append(["Tyop 42 times, in 3.5 days: the end!", "0.0"])
+        essays = [tokenize_essay(text, generated == "1.0") for text, generated in rows]
+        totals = word_totals(essays)
+
+        manager, dictionary = get_default_manager(), get_default_dictionary()
+        tokens = get_vocabulary().tokens
+        for essay, row in zip(essays, totals):
+            rarity, dictionary_words, misspelled_words = 0.0, 0, 0
+            for sentence in essay.sentences:
+                for token_id, count in zip(sentence.word_ids, sentence.word_counts):
+                    word = tokens[token_id]
+                    score = manager.word_score(word)
+                    rarity += score * float(count)
+                    if word in dictionary:
+                        dictionary_words += count
+                    elif any(char.isalpha() for char in word) and score == manager.oov_score:
+                        misspelled_words += count
+            assert row.tolist() == [rarity, dictionary_words, misspelled_words]
+        assert totals[:, 1].sum() > 0 and totals[:, 2].sum() > 0
+    finally:
+        configure_default_manager()
+        configure_default_dictionary()
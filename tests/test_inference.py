@@ -0,0 +1,43 @@
+from inference import adjust_p_values, sorted_mann_whitney_u
+import numpy as np
+import pytest
+from scipy.stats import mannwhitneyu
+
+
+@pytest.mark.parametrize("correction", ["holm", "bh"])
+def test_nan_p_value_is_left_out_of_the_family(correction):
+    p_values = np.array([0.001, np.nan, 0.002, 0.003, 0.04])
+    adjusted = adjust_p_values(p_values, correction)
+    expected = adjust_p_values(np.array([0.001, 0.002, 0.003, 0.04]), correction)
+    assert np.isnan(adjusted[1])
+    np.testing.assert_allclose(adjusted[[0, 2, 3, 4]], expected)
+    assert (adjusted[[0, 2, 3]] < 0.01).all()
+
+
+def test_holm_family_size_counts_finite_p_values_only():
+    adjusted = adjust_p_values(np.array([0.01, np.nan, 0.02]), "holm")
+    np.testing.assert_allclose(adjusted[[0, 2]], [0.02, 0.02])
+
+
+def test_all_nan_stays_nan():
+    assert np.isnan(adjust_p_values(np.array([np.nan, np.nan]), "bh")).all()
+
+
+@pytest.mark.parametrize("ties", [False, True])
+def test_sorted_mann_whitney_u_matches_scipy(ties):
+    rng = np.random.default_rng(7)
+    for size_one, size_two, shift in [(40, 55, 0.0), (300, 250, 0.2), (1000, 1200, 0.05), (1, 9, 1.0)]:
+        one = rng.normal(shift, 1.0, size_one)
+        two = rng.normal(0.0, 1.0, size_two)
+        if ties:
+            # Few distinct values, so nearly every value is tied with others on both sides
+            one, two = np.round(one * 2), np.round(two * 2)
+        expected = mannwhitneyu(one, two, alternative="two-sided", method="asymptotic").pvalue
+        result = sorted_mann_whitney_u(np.sort(one), np.sort(two))
+        assert result["p-value"] == pytest.approx(expected, rel=1e-9, abs=1e-15)
+        assert result["reject-null"] == ("yes" if expected < 0.01 else "no")
+
+
+def test_sorted_mann_whitney_u_all_values_tied():
+    result = sorted_mann_whitney_u(np.full(5, 3.0), np.full(7, 3.0))
+    assert result["p-value"] == 1.0 and result["reject-null"] == "no"
@@ -0,0 +1,131 @@
+from benchmarks.synthetic import SyntheticCorpus
+from cli import main
+from csv import reader, writer
+from essay_stats import BatchManager
+import json
+import numpy as np
+from os import listdir, makedirs, path
+import pytest
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    """
+    Paths of a small synthetic essay CSV and of a data directory with its frequency list and
+    dictionary prepared.
+    """
+    corpus_dir = tmp_path_factory.mktemp("corpus")
+    csv_path, list_path, dictionary_path = SyntheticCorpus(essays=600, seed=3).write(str(corpus_dir))
+    data_dir = make_data_dir(corpus_dir / "prepared")
+    main(["--data-dir", data_dir, "prepare", "--raw-frequency", list_path, "--raw-dictionary", dictionary_path])
+    return csv_path, data_dir
+
+
+def make_data_dir(directory) -> str:
+    for folder in ("ai", "human", "batches"):
+        makedirs(path.join(directory, folder), exist_ok=True)
+    return str(directory)
+
+
+def copy_prepared(prepared: str, directory) -> str:
+    data_dir = make_data_dir(directory)
+    for name in listdir(prepared):
+        if path.isfile(path.join(prepared, name)):
+            with open(path.join(prepared, name), "rb") as source, open(path.join(data_dir, name), "wb") as target:
+                target.write(source.read())
+    return data_dir
+
+
+def write_rows(csv_path, rows):
+    with open(csv_path, "w", encoding="utf-8", newline="") as file:
+        writer(file).writerows(rows)
+
+
+def ingest(data_dir: str, essays: str, *args: str):
+    main(["--data-dir", data_dir, "ingest", "--essays", essays, "--skip-inference", "--batch-size", "50", *args])
+
+
+def dumps(data_dir: str) -> dict[str, bytes]:
+    files = {}
+    for author in ("ai", "human"):
+        for name in listdir(path.join(data_dir, author)):
+            with open(path.join(data_dir, author, name), "rb") as file:
+                files[f"{author}/{name}"] = file.read()
+    return files
+
+
+def essay_ranges(names) -> dict[str, list[tuple[int, int]]]:
+    """
+    Essay number ranges of the dump files, by author and shard prefix.
+    """
+    ranges = {}
+    for name in names:
+        prefix, start, end = name[:name.rindex(".")].rsplit("_", 2)
+        ranges.setdefault(prefix, []).append((int(start), int(end)))
+    return ranges
+
+
+def dump_records(data_dir: str, author: str) -> list:
+    """
+    Essay records of one author's JSON dumps, in essay order: shard by shard, and by first essay
+    within a shard.
+    """
+    def order(name: str):
+        prefix, start, _ = name[:name.rindex(".")].rsplit("_", 2)
+        shard = prefix[len("shard"):-len("_essay")] if prefix.startswith("shard") else "0"
+        return int(shard), int(start)
+    records = []
+    for name in sorted(listdir(path.join(data_dir, author)), key=order):
+        with open(path.join(data_dir, author, name), encoding="utf-8") as file:
+            records.extend(json.load(file))
+    return records
+
+
+def test_parallel_ingest_matches_serial(corpus, tmp_path):
+    csv_path, prepared = corpus
+    serial = copy_prepared(prepared, tmp_path / "serial")
+    parallel = copy_prepared(prepared, tmp_path / "parallel")
+    ingest(serial, csv_path, "--output-format", "json")
+    ingest(parallel, csv_path, "--output-format", "json", "--workers", "2")
+
+    batch_files = sorted(listdir(path.join(serial, "batches")))
+    assert batch_files == sorted(listdir(path.join(parallel, "batches")))
+    for name in batch_files:
+        if name.endswith(".json"):
+            with open(path.join(serial, "batches", name), "rb") as expected, \
+                    open(path.join(parallel, "batches", name), "rb") as actual:
+                assert actual.read() == expected.read(), name
+    for ai_author in (True, False):
+        name = f"{'ai' if ai_author else 'human'}_state.pkl"
+        expected = BatchManager.load(path.join(serial, "batches", name))
+        actual = BatchManager.load(path.join(parallel, "batches", name))
+        for (label, expected_batch), (actual_label, actual_batch) in zip(expected.get_batches(),
+                                                                         actual.get_batches()):
+            assert actual_label == label
+            assert np.array_equal(actual_batch.feature_matrix(), expected_batch.feature_matrix())
+
+    assert any(name.startswith("shard") for name in listdir(path.join(parallel, "ai")))
+    for author in ("ai", "human"):
+        assert dump_records(parallel, author) == dump_records(serial, author)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_feature_cache_rerun_keeps_earlier_json_dumps(corpus, tmp_path, workers):
+    csv_path, prepared = corpus
+    data_dir = copy_prepared(prepared, tmp_path / "data")
+    with open(csv_path, encoding="utf-8", newline="") as file:
+        rows = list(reader(file))
+    essays = tmp_path / "essays.csv"
+    write_rows(essays, rows[:300])
+    ingest(data_dir, str(essays), "--feature-cache", "--output-format", "json", "--workers", str(workers))
+    first = dumps(data_dir)
+
+    write_rows(essays, rows)
+    ingest(data_dir, str(essays), "--feature-cache", "--output-format", "json", "--workers", str(workers))
+    second = dumps(data_dir)
+
+    assert {name: second[name] for name in first} == first
+    assert len(second) > len(first)
+    for ranges in essay_ranges(second).values():
+        ranges.sort()
+        assert all(end < next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
@@ -0,0 +1,32 @@
+from csv import writer
+import numpy as np
+from opted_reader import ALPHABETIC, IN_DICTIONARY, DictionaryLookup, prepare_dictionary_data
+
+
+def test_lookup_agrees_with_the_word_set(tmp_path):
+    rng = np.random.default_rng(4)
+    letters = list("abcdefghijklmnopqrstuvwxyzé")
+    words = {"".join(rng.choice(letters, size=rng.integers(1, 12))) for _ in range(5000)}
+    raw_path, csv_path, index_path = tmp_path / "raw.csv", tmp_path / "words.csv", tmp_path / "words.idx"
+    with open(raw_path, "w", encoding="utf-8", newline="") as file:
+        csv_writer = writer(file)
+        csv_writer.writerow(["Word", "Count", "POS", "Definition"])
+        # Headwords are capitalised and repeated once per sense, as in OPTED
+        csv_writer.writerows((word.capitalize(), "1", "n.", f"Sense {sense}.") for word in words for sense in (1, 2))
+        csv_writer.writerow(["  ", "1", "n.", "No headword."])
+    prepare_dictionary_data(str(raw_path), str(csv_path), str(index_path))
+
+    others = ["".join(rng.choice(letters, size=rng.integers(1, 12))) for _ in range(20000)]
+    others += ["", "42", "it's", "x-ray", *(word.upper() for word in list(words)[:50])]
+    queries = [*words, *others]
+    expected = np.array([query in words for query in queries])
+    for use_bloom in (True, False):
+        dictionary = DictionaryLookup(str(index_path), str(csv_path), use_bloom=use_bloom)
+        assert len(dictionary) == len(words)
+        assert np.array_equal(dictionary.contains(queries), expected)
+        assert all(word in dictionary for word in list(words)[:100])
+        flags = dictionary.token_flags(queries)
+        assert np.array_equal(flags & IN_DICTIONARY != 0, expected)
+        assert np.array_equal(flags & ALPHABETIC != 0, [any(char.isalpha() for char in query) for query in queries])
+    # Short random strings are sometimes dictionary words too, so the queries mix both answers
+    assert not expected[len(words):].all() and expected[len(words):].any()
@@ -0,0 +1,54 @@
+from essay_stats import RESERVOIR_SIZE, EssayBatchStats
+from random import Random
+from sampling import Reservoir
+
+
+def rows(count, start=0):
+    return [(float(value),) for value in range(start, start + count)]
+
+
+def test_reservoir_keeps_at_most_its_size():
+    reservoir = Reservoir(100, seed=1)
+    for row in rows(10):
+        reservoir.add(row)
+    assert reservoir.rows == rows(10)
+    for row in rows(990, 10):
+        reservoir.add(row)
+    assert reservoir.seen == 1000 and len(reservoir.rows) == 100
+    assert len(set(reservoir.rows)) == 100 and set(reservoir.rows) <= set(rows(1000))
+    assert len(reservoir.sample(Random(0), 30)) == 30
+    assert reservoir.sample(Random(0), 500) == reservoir.rows
+
+
+def test_merged_reservoir_keeps_its_size_and_both_streams():
+    first, second = Reservoir(100, seed=1), Reservoir(100, seed=2)
+    for row in rows(1000):
+        first.add(row)
+    for row in rows(1000, 1000):
+        second.add(row)
+    first.merge(second)
+    assert first.seen == 2000 and len(first.rows) == 100
+    assert any(row[0] < 1000 for row in first.rows) and any(row[0] >= 1000 for row in first.rows)
+
+
+def test_reservoir_is_deterministic_under_a_seed():
+    def kept(seed):
+        reservoir = Reservoir(50, seed=seed)
+        for row in rows(5000):
+            reservoir.add(row)
+        return reservoir.rows
+
+    assert kept(3) == kept(3)
+    assert kept(3) != kept(4)
+
+
+def test_batch_reservoirs_follow_the_batch_seed():
+    def sample(seed):
+        batch = EssayBatchStats(True, "sketch", seed)
+        for value in range(2 * RESERVOIR_SIZE):
+            batch.add_row((value, value, value) + (float(value),) * 6)
+        assert len(batch.reservoir.rows) == RESERVOIR_SIZE
+        return batch.get_random_sample(10, Random(0)).word_counts.values().tolist()
+
+    assert sample(1) == sample(1)
+    assert sample(1) != sample(2)
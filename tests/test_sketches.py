@@ -0,0 +1,88 @@
+from collections import Counter
+from essay_stats import BatchManager, EssayFeatures
+from sketches import CountMinSketch, QuantileSketch, SpaceSaving
+from token_stats import TokenCounts, token_hashes
+import numpy as np
+
+
+def sketch_medians(seed, rows):
+    batches = BatchManager(True, "sketch", seed=seed)
+    for row in rows:
+        batches.add_features(row)
+    return [[stat.get_median() for stat in batch.stats()] for _, batch in batches.get_batches()]
+
+
+def test_sketch_batches_are_reproducible_for_a_seed():
+    rng = np.random.default_rng(3)
+    rows = [EssayFeatures(int(count), int(count) // 2, 5, *rng.random(6).tolist())
+            for count in rng.integers(1, 1500, size=20000)]
+    assert sketch_medians(7, rows) == sketch_medians(7, rows)
+    assert sketch_medians(None, rows) == sketch_medians(None, rows)
+
+
+def test_merged_sketches_are_reproducible():
+    values = np.random.default_rng(5).random(30000).tolist()
+
+    def merged():
+        first, second = QuantileSketch(seed=1), QuantileSketch(seed=1)
+        for value in values[:15000]:
+            first.add_value(value)
+        for value in values[15000:]:
+            second.add_value(value)
+        first.merge(second)
+        return first.compactors
+
+    assert merged() == merged()
+
+
+def token_batches(seed: int, batches: int = 40) -> list[Counter]:
+    """
+    Essay-sized batches of Zipf-distributed tokens, counted per batch.
+    """
+    rng = np.random.default_rng(seed)
+    return [Counter(f"t{rank}" for rank in rng.zipf(1.3, 400).tolist()) for _ in range(batches)]
+
+
+def test_count_min_never_undercounts():
+    batches = token_batches(1)
+    truth = sum(batches, Counter())
+    tokens = list(truth)
+    hashes = token_hashes(tokens)
+    whole, first, second = CountMinSketch(256, 4), CountMinSketch(256, 4), CountMinSketch(256, 4)
+    for i, batch in enumerate(batches):
+        batch_hashes, batch_counts = token_hashes(list(batch)), np.array(list(batch.values()))
+        whole.add(batch_hashes, batch_counts)
+        (first if i % 2 else second).add(batch_hashes, batch_counts)
+    first.merge(second)
+    true_counts = np.array([truth[token] for token in tokens])
+    estimates = whole.estimate(hashes)
+    assert (estimates >= true_counts).all()
+    assert (estimates > true_counts).any()
+    assert np.array_equal(first.estimate(hashes), estimates)
+    assert whole.total == first.total == true_counts.sum()
+
+
+def test_space_saving_keeps_the_heavy_hitters():
+    batches = token_batches(2)
+    truth = sum(batches, Counter())
+    k = 50
+    whole, first, second = SpaceSaving(k), SpaceSaving(k), SpaceSaving(k)
+    for i, batch in enumerate(batches):
+        whole.add(list(batch), list(batch.values()))
+        (first if i % 2 else second).add(list(batch), list(batch.values()))
+    first.merge(second)
+    total = sum(truth.values())
+    heavy = {token for token, count in truth.items() if count > total / k}
+    assert len(truth) > 10 * k and len(heavy) > 5
+    for summary in (whole, first):
+        assert len(summary.counts) <= k
+        assert heavy <= summary.counts.keys()
+        for token, count, error in summary.top():
+            assert count - error <= truth[token] <= count
+
+    counts = TokenCounts(top_tokens=k)
+    for batch in batches:
+        counts.sketch.add(token_hashes(list(batch)), np.array(list(batch.values())))
+        counts.top.add(list(batch), list(batch.values()))
+    tokens = list(truth)
+    assert (counts.estimate(tokens) >= np.array([truth[token] for token in tokens])).all()
@@ -0,0 +1,48 @@
+from benchmarks.synthetic import SyntheticCorpus
+from csv import writer
+from itertools import islice
+from tokenizer import check_equivalence, legacy_parse_essay, tokenize_essay
+import pytest
+
+EDGE_CASES = [
+    "",
+    "   \n\t  ",
+    "Wait... what happened... here.",
+    "Really?! No way?! Yes!?",
+    "\"Quoted,\" she said. 'Single quotes' too. It's the students' choice, isn't it.",
+    "Trailing text without any punctuation",
+    "Unicode ellipsis… and more… then an end.",
+    "Curly “quotes” and ‘apostrophes’ — dashes - and (brackets) [too].",
+    "First line of a quoted essay,\n\"second line\" with quotes.\n\nA new paragraph... ends",
+    "Numbers 42 and 3.14 and 1,000 count too.",
+    "...leading dots. Double.. dots... . . spaced",
+    "Mixed--punctuation!? #tags @handles & 50% off... ok",
+]
+
+
+def assert_equivalent(text: str):
+    for ai_author in (True, False):
+        expected = legacy_parse_essay(text, ai_author)
+        actual = tokenize_essay(text, ai_author)
+        assert actual.ai_author == expected.ai_author
+        assert [sentence.to_json() for sentence in actual.sentences] == \
+            [sentence.to_json() for sentence in expected.sentences]
+
+
+@pytest.mark.parametrize("text", EDGE_CASES)
+def test_strict_tokenizer_matches_legacy_parser(text):
+    assert_equivalent(text)
+
+
+def test_strict_tokenizer_matches_legacy_parser_on_synthetic_essays():
+    for text, _ in islice(SyntheticCorpus(essays=300, seed=7).essay_rows(), 300):
+        assert_equivalent(text)
+
+
+def test_check_equivalence_reads_multi_line_quoted_rows(tmp_path):
+    csv_path = tmp_path / "essays.csv"
+    with open(csv_path, "w", encoding="utf-8", newline="") as file:
+        csv_writer = writer(file)
+        csv_writer.writerow(["text", "generated"])
+        csv_writer.writerows((text, "1.0") for text in EDGE_CASES)
+    assert check_equivalence(str(csv_path)) == 0
@@ -0,0 +1,27 @@
+from csv import reader
+from word_frequency import WORD_RARITY_DIGIT_MULTIPLIERS, WordFrequencyDataManager, prepare_frequency_data
+
+
+def test_index_agrees_with_the_csv_lookup(tmp_path):
+    raw_path, csv_path, index_path = tmp_path / "raw.txt", tmp_path / "words.csv", tmp_path / "words.idx"
+    words = [f"word{i}" for i in range(300)] + ["the", "naïve", "café", "日本", "it's", "a"]
+    raw_path.write_text("".join(f"{word} {10 ** (11 - i % 7)}\n" for i, word in enumerate(words)), encoding="utf-8")
+    prepare_frequency_data(str(raw_path), str(csv_path), str(index_path))
+
+    # The dict the manager used to build from the CSV, with its out-of-vocabulary penalty
+    expected: dict[str, float] = {}
+    with open(csv_path, encoding="utf-8") as file:
+        rows = reader(file)
+        next(rows)
+        for word, rank, digits in rows:
+            expected[word] = float(rank) * WORD_RARITY_DIGIT_MULTIPLIERS.get(digits, 1.0)
+    oov_score = float(len(expected) + 1) * 5.0
+
+    unknown = ["word300", "word", "word1 ", "The", "naive", "日", "", "it"]
+    for cache_size in (0, 16):
+        manager = WordFrequencyDataManager(str(index_path), str(csv_path), cache_size=cache_size)
+        for word in [*words, *unknown, *words]:
+            assert manager.word_score(word) == expected.get(word, oov_score), word
+        assert manager.scores_for(unknown) == [oov_score] * len(unknown)
+        tokens = [*unknown, *words]
+        assert list(manager.token_scores(tokens)) == [expected.get(token, oov_score) for token in tokens]
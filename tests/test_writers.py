@@ -0,0 +1,25 @@
+from writers import ndjson_sizes, truncate_ndjson
+import os
+
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(text)
+
+
+def test_truncate_ndjson_drops_records_after_the_checkpoint(tmp_path):
+    for author in ("ai", "human"):
+        os.makedirs(tmp_path / author)
+    write(tmp_path / "ai" / "essays.ndjson", '{"a":1}\n')
+    write(tmp_path / "human" / "shard0_essays.ndjson", '{"h":1}\n')
+    sizes = ndjson_sizes(str(tmp_path))
+    assert sizes == {"ai/essays.ndjson": 8, "human/shard0_essays.ndjson": 8}
+
+    with open(tmp_path / "ai" / "essays.ndjson", "a", encoding="utf-8") as file:
+        file.write('{"a":2}\n')
+    write(tmp_path / "human" / "shard1_essays.ndjson", '{"h":2}\n')
+    assert "human/shard1_essays.ndjson" not in ndjson_sizes(str(tmp_path), shards=1)
+
+    truncate_ndjson(str(tmp_path), sizes)
+    assert (tmp_path / "ai" / "essays.ndjson").read_text(encoding="utf-8") == '{"a":1}\n'
+    assert (tmp_path / "human" / "shard1_essays.ndjson").read_text(encoding="utf-8") == ""